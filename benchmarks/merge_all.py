@@ -0,0 +1,55 @@
+"""
+Compare merging many layers of configuration one at a time using
+Config.merge with merging them in one pass using Config.merge_all.
+
+Run from an environment with configurator installed:
+
+    python benchmarks/merge_all.py [--layers N] [--width N] [--depth N]
+"""
+from argparse import ArgumentParser
+from timeit import Timer
+
+from configurator import Config
+
+
+def make_layer(index, width, depth):
+    if depth == 0:
+        return {'key{}'.format(i): index for i in range(width)}
+    layer = {'key{}'.format(i): make_layer(index, width, depth-1) for i in range(width)}
+    layer['list'] = [index]
+    return layer
+
+
+def pairwise(layers):
+    config = Config()
+    for layer in layers:
+        config.merge(layer)
+    return config
+
+
+def single_pass(layers):
+    config = Config()
+    config.merge_all(*layers)
+    return config
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--layers', type=int, default=10)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    layers = [make_layer(i, args.width, args.depth) for i in range(args.layers)]
+    assert pairwise(layers).data == single_pass(layers).data
+
+    for function in pairwise, single_pass:
+        timer = Timer(lambda: function(layers))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(args.repeat, number)) / number
+        print('{:12} {:10.3f}ms'.format(function.__name__, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""
+Benchmarks for parsing, merging, mapping, access, cloning and pushing using
+synthetic configuration of a configurable shape.
+
+Run from an environment with configurator installed:
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --compare results.json
+
+Results are written as JSON, with the best time per call in seconds for each
+benchmark, so that runs from different commits can be compared.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from tempfile import TemporaryDirectory
+from timeit import Timer
+
+from configurator import Config, source, target, compile_mapping
+from configurator.path import parse_text, clear_parse_cache
+
+
+def make_data(width, depth, list_size, seed=0):
+    """
+    Return a nested dictionary with ``width`` keys at each of ``depth`` levels.
+    The leaves are a mixture of strings, numbers, booleans and lists of
+    ``list_size`` items. Different ``seed`` values give the same keys but
+    different values.
+    """
+    def level(remaining, prefix):
+        data = {}
+        for i in range(width):
+            key = 'key{}'.format(i)
+            if remaining > 1:
+                data[key] = level(remaining - 1, prefix + (i,))
+            elif i % 4 == 0:
+                data[key] = 'value-{}-{}'.format(seed, '.'.join(map(str, prefix + (i,))))
+            elif i % 4 == 1:
+                data[key] = seed * 1000 + i
+            elif i % 4 == 2:
+                data[key] = bool((seed + i) % 2)
+            else:
+                data[key] = [seed * 100 + j for j in range(list_size)]
+        data['items'] = [{'name': 'item{}'.format(j), 'value': seed + j}
+                         for j in range(list_size)]
+        return data
+    return level(depth, ())
+
+
+def leaf_paths(data, prefix=''):
+    """
+    Return the dotted paths of all the leaves in ``data``, ignoring lists.
+    """
+    paths = []
+    for key, value in data.items():
+        path = prefix + key
+        if isinstance(value, dict):
+            paths.extend(leaf_paths(value, path + '.'))
+        elif not isinstance(value, list):
+            paths.append(path)
+    return paths
+
+
+def _toml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, list):
+        return '[' + ', '.join(_toml_value(item) for item in value) + ']'
+    return '{' + ', '.join(
+        '{} = {}'.format(key, _toml_value(item)) for key, item in value.items()
+    ) + '}'
+
+
+def dump_toml(data):
+    return ''.join('{} = {}\n'.format(key, _toml_value(value))
+                   for key, value in data.items())
+
+
+def dump_yaml(data):
+    import yaml
+    return yaml.safe_dump(data)
+
+
+dumpers = {
+    'json': json.dumps,
+    'toml': dump_toml,
+    'yaml': dump_yaml,
+}
+
+
+@contextmanager
+def environ(variables):
+    saved = os.environ.copy()
+    os.environ.update(variables)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+def benchmarks(args, directory):
+    """
+    Yield ``(name, function)`` pairs for each benchmark, where ``function``
+    takes no parameters.
+    """
+    base = make_data(args.width, args.depth, args.list_size, seed=0)
+    layer = make_data(args.width, args.depth, args.list_size, seed=1)
+    paths = leaf_paths(base)
+
+    for extension, dump in sorted(dumpers.items()):
+        try:
+            Config.parsers[extension]
+            text = dump(base)
+        except ImportError:
+            continue
+        path = os.path.join(directory, 'config.' + extension)
+        with open(path, 'w') as stream:
+            stream.write(text)
+        yield 'from_path_' + extension, lambda path=path: Config.from_path(path)
+
+    def merge():
+        config = Config(base)
+        config.merge(layer)
+    yield 'merge', merge
+
+    def merge_in_place():
+        # includes the cost of making a target that can be modified:
+        config = Config(make_data(args.width, args.depth, args.list_size))
+        config.merge(layer, in_place=True)
+    yield 'merge_in_place', merge_in_place
+
+    def merge_all():
+        config = Config(base)
+        config.merge_all(layer, base, layer)
+    yield 'merge_all', merge_all
+
+    mapping = {path: 'mapped.' + path for path in paths}
+    def merge_mapping():
+        config = Config()
+        config.merge(layer, mapping)
+    yield 'merge_mapping', merge_mapping
+
+    compiled = compile_mapping(mapping)
+    def merge_mapping_compiled():
+        config = Config()
+        config.merge(layer, compiled)
+    yield 'merge_mapping_compiled', merge_mapping_compiled
+
+    generated = compile_mapping(mapping, generate=True)
+    def merge_mapping_generated():
+        config = Config()
+        config.merge(layer, generated)
+    yield 'merge_mapping_generated', merge_mapping_generated
+
+    def generative(root, path):
+        for key in path.split('.'):
+            root = root[key]
+        return root
+    paths_mapping = {generative(source, path): generative(target['mapped'], path)
+                     for path in paths}
+    def merge_mapping_paths():
+        config = Config()
+        config.merge(layer, paths_mapping)
+    yield 'merge_mapping_paths', merge_mapping_paths
+
+    values = {'mapped.' + path: index for index, path in enumerate(paths)}
+    def set_many():
+        Config().set_many(values)
+    yield 'set_many', set_many
+
+    variables = {'BENCH_' + path.replace('.', '_').upper(): 'value'
+                 for path in paths[:args.width * args.width]}
+    def from_env():
+        with environ(variables):
+            Config.from_env('BENCH_', types={'_KEY1': str})
+    yield 'from_env', from_env
+
+    def parse_text_uncached():
+        clear_parse_cache()
+        for path in paths:
+            parse_text(path)
+    yield 'parse_text_uncached', parse_text_uncached
+
+    def parse_text_cached():
+        for path in paths:
+            parse_text(path)
+    yield 'parse_text_cached', parse_text_cached
+
+    config = Config(base)
+    deepest = paths[-1]
+    def node_access():
+        for path in paths:
+            config.node(path)
+    yield 'node_access', node_access
+
+    keys = deepest.split('.')[:-1]
+    def attribute_access():
+        node = config
+        for key in keys:
+            node = getattr(node, key)
+        for value in node.items():
+            pass
+    yield 'attribute_access', attribute_access
+
+    yield 'clone', config.clone
+
+    def push_pop():
+        with config.push(layer):
+            pass
+    yield 'push_pop', push_pop
+
+    def push_pop_empty():
+        with config.push(layer, empty=True):
+            pass
+    yield 'push_pop_empty', push_pop_empty
+
+
+def time(function, repeat):
+    timer = Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Print a comparison of ``results`` with ``baseline``, returning the names of
+    benchmarks that are more than ``threshold`` times slower.
+    """
+    slower = []
+    print('{:24} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline', 'current', 'ratio'))
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print('{:24} {:>12} {:12.3f}us'.format(name, '-', seconds * 1e6))
+            continue
+        ratio = seconds / before
+        print('{:24} {:10.3f}us {:10.3f}us {:8.2f}'.format(
+            name, before * 1e6, seconds * 1e6, ratio
+        ))
+        if ratio > threshold:
+            slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=8,
+                        help='number of keys at each level of nesting')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='number of levels of nesting')
+    parser.add_argument('--list-size', type=int, default=5,
+                        help='number of items in each list')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of repeats, the best of which is reported')
+    parser.add_argument('--filter', default='*',
+                        help='glob pattern of the benchmarks to run')
+    parser.add_argument('--output', help='path to write JSON results to')
+    parser.add_argument('--compare', help='path of JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio above which a comparison fails')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with TemporaryDirectory() as directory:
+        for name, function in benchmarks(args, directory):
+            if fnmatch(name, args.filter):
+                results[name] = time(function, args.repeat)
+                if not args.compare:
+                    print('{:24} {:10.3f}us'.format(name, results[name] * 1e6))
+
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump({
+                'commit': commit(),
+                'python': sys.version,
+                'platform': platform.platform(),
+                'parameters': {
+                    'width': args.width,
+                    'depth': args.depth,
+                    'list_size': args.list_size,
+                    'repeat': args.repeat,
+                },
+                'results': results,
+            }, stream, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)['results']
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print('slower than threshold: ' + ', '.join(slower))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,8 @@
 from .config import Config
 from .merge import default_mergers
-from .mapping import source, target, convert, required, if_supplied, value
+from .mapping import (
+    source, target, convert, required, if_supplied, value, compile_mapping, compile_path
+)
 
 __all__ = (
     'Config',
@@ -10,5 +12,7 @@ __all__ = (
     'required',
     'if_supplied',
     'value',
+    'compile_mapping',
+    'compile_path',
     'default_mergers',
 )
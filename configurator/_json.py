@@ -0,0 +1,23 @@
+import json
+import re
+
+from orjson import loads as _loads, JSONDecodeError
+
+# orjson turns integers that don't fit in 64 bits into floats, so any run of digits
+# long enough to be one of those sends the document to the standard library instead
+_long_digits = {
+    bytes: re.compile(rb'\d{19}').search,
+    str: re.compile(r'\d{19}').search,
+}
+
+
+def load(stream):
+    # orjson is also stricter than the standard library, rejecting things like NaN,
+    # so fall back to json for anything it won't parse
+    data = stream.read()
+    if _long_digits[type(data)](data) is None:
+        try:
+            return _loads(data)
+        except JSONDecodeError:
+            pass
+    return json.loads(data)
@@ -0,0 +1,8 @@
+import json
+
+
+def load(stream):
+    # JSON Lines: one document per line, blank lines ignored
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
@@ -0,0 +1,11 @@
+from yaml import load as _load, load_all as _load_all, CSafeLoader
+
+
+def load(stream):
+    # the equivalent of yaml.safe_load, but using libyaml
+    return _load(stream, Loader=CSafeLoader)
+
+
+def load_all(stream):
+    # the equivalent of yaml.safe_load_all, but using libyaml
+    return _load_all(stream, Loader=CSafeLoader)
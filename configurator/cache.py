@@ -0,0 +1,156 @@
+import os
+import pickle
+from hashlib import sha256
+from os.path import realpath, join
+from tempfile import NamedTemporaryFile
+from time import time
+
+
+def stat_key(path):
+    """
+    Return a tuple of the resolved ``path`` along with the modification time and
+    size of the file it refers to, suitable for detecting when that file changes.
+    """
+    path = realpath(path)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def parser_key(parser):
+    """
+    Return a textual name for the supplied ``parser`` callable that is the same
+    in every process. Callable instances are named by their class, and functions
+    defined within other functions are also named by the line they start on.
+    """
+    if not hasattr(parser, '__qualname__'):
+        parser = type(parser)
+    name = '{}.{}'.format(parser.__module__, parser.__qualname__)
+    code = getattr(parser, '__code__', None)
+    if code is not None and '<' in name:
+        # a local function or lambda, which may share its name with others:
+        name = '{}:{}'.format(name, code.co_firstlineno)
+    return name
+
+
+class ParseCache:
+    """
+    An on-disk cache of parsed configuration files, for use with
+    :meth:`Config.from_path <configurator.Config.from_path>`.
+
+    Entries are keyed by the resolved path, modification time and size of each
+    file, along with the parser and encoding used, and are ignored if any of these
+    no longer match.
+
+    :param directory:
+      The directory in which cached results will be stored. It will be created
+      if it does not exist.
+    :param max_size:
+      If supplied, the oldest entries will be evicted once the total size of the
+      cache, in bytes, exceeds this.
+    :param max_age:
+      If supplied, entries that have not been written within this many seconds
+      will be evicted.
+    """
+
+    suffix = '.pickle'
+
+    def __init__(self, directory, max_size=None, max_age=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _digest(text):
+        return sha256(text.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def _entry_path(self, path, parser, encoding):
+        # entries for the same file made by different parsers or with different
+        # encodings must not overwrite each other, but must all start with the
+        # same prefix for invalidate():
+        return join(self.directory, '{}-{}{}'.format(
+            self._digest(path),
+            self._digest('{}\0{}'.format(parser, encoding))[:16],
+            self.suffix,
+        ))
+
+    def get(self, path, parser, load, encoding=None):
+        """
+        Return the parsed content of the file at ``path`` using the cached result
+        if it is still valid, otherwise calling ``load`` and caching what it returns.
+        ``encoding`` is the encoding ``load`` will use to read the file, if any.
+        """
+        key = stat_key(path) + (parser_key(parser), encoding)
+        entry_path = self._entry_path(key[0], key[3], encoding)
+        try:
+            with open(entry_path, 'rb') as entry:
+                cached_key, data = pickle.load(entry)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # corrupt or from an incompatible version:
+            self._remove(entry_path)
+        else:
+            if cached_key == key:
+                return data
+        data = load()
+        self._write(entry_path, key, data)
+        return data
+
+    def _write(self, entry_path, key, data):
+        with NamedTemporaryFile(
+                'wb', dir=self.directory, suffix='.tmp', delete=False
+        ) as entry:
+            pickle.dump((key, data), entry, pickle.HIGHEST_PROTOCOL)
+        os.replace(entry.name, entry_path)
+        self.evict()
+
+    @staticmethod
+    def _remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                entry_path = join(self.directory, name)
+                try:
+                    stat = os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, entry_path
+
+    def evict(self):
+        """
+        Remove entries that are older than ``max_age`` and then, oldest first,
+        as many as are needed to bring the cache within ``max_size``.
+        """
+        if self.max_size is None and self.max_age is None:
+            return
+        entries = sorted(self._entries())
+        if self.max_age is not None:
+            cutoff = time() - self.max_age
+            while entries and entries[0][0] < cutoff:
+                self._remove(entries.pop(0)[2])
+        if self.max_size is not None:
+            total = sum(size for _, size, _ in entries)
+            while entries and total > self.max_size:
+                _, size, entry_path = entries.pop(0)
+                self._remove(entry_path)
+                total -= size
+
+    def invalidate(self, path=None):
+        """
+        Remove the cached entry for the file at ``path`` or, if no ``path`` is
+        supplied, every entry in the cache.
+        """
+        if path is None:
+            for _, _, entry_path in list(self._entries()):
+                self._remove(entry_path)
+        else:
+            prefix = self._digest(realpath(path)) + '-'
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    self._remove(join(self.directory, name))
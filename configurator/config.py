@@ -1,13 +1,20 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from fnmatch import fnmatch
 from io import open, StringIO
-from os.path import exists, expanduser
+from os.path import exists, expanduser, isfile, join
+from threading import Lock
 
-from .mapping import load, store, target, convert, if_supplied
-from .merge import MergeContext
-from .node import ConfigNode
-from .parsers import Parsers
-from .path import parse_text
+from .mapping import (
+    target, convert, if_supplied, compile_mapping, CompiledMapping, _load, _store,
+)
+from .merge import ChangeSet, MergeContext, in_place_mergers
+from .node import ConfigNode, TrackedNode
+from .origins import Origins, path_keys
+from .parsers import Parsers, DocumentParsers, LoadError
+from .path import parse_text, NotPresent
+from .snapshot import load_snapshot, save_snapshot
 
 
 class Config(ConfigNode):
@@ -15,13 +22,45 @@ class Config(ConfigNode):
     The root of the configuration store.
     """
 
-    __slots__ = ConfigNode.__slots__+('_previous',)
+    __slots__ = ConfigNode.__slots__+(
+        '_previous', '_loader', '_origins', '_previous_origins'
+    )
 
     parsers = Parsers()
+    document_parsers = DocumentParsers()
 
     def __init__(self, data=None):
         super(Config, self).__init__(data)
         self._previous = []
+        self._previous_origins = []
+        self._loader = None
+        self._origins = None
+
+    @classmethod
+    def _lazy(cls, loader):
+        config = cls()
+        object.__delattr__(config, 'data')
+        # the lock is held while loading, so that the data is only loaded once:
+        config._loader = loader, Lock()
+        return config
+
+    def __getattr__(self, name):
+        if name == 'data':
+            # only reached when the data of a lazy config has not been loaded yet
+            lazy = self._loader
+            if lazy is None:
+                # either not lazy or just loaded by another thread:
+                return object.__getattribute__(self, name)
+            loader, lock = lazy
+            with lock:
+                if self._loader is None:
+                    # loaded by another thread while waiting for the lock:
+                    return object.__getattribute__(self, name)
+                data = loader()
+                self.data = data
+                self._loader = None
+            return data
+        return super(Config, self).__getattr__(name)
 
     @classmethod
     def from_text(cls, text, parser, encoding='ascii'):
@@ -35,27 +74,56 @@ class Config(ConfigNode):
         return cls.from_stream(StringIO(text), parser)
 
     @classmethod
-    def from_stream(cls, stream, parser=None):
+    def from_stream(cls, stream, parser=None, lazy=False):
         """
         Construct a :class:`Config` from a stream such as a :func:`file <open>`.
         If the stream does not have a ``name`` attribute from which the correct
         parser can be guessed, :ref:`parser <parsers>` must be specified.
         If ``text`` is provided as :class:`bytes`, then the ``encoding``
         specified will be used to decode it.
+
+        If ``lazy`` is ``True``, the stream will not be parsed until the
+        :class:`Config` is first used, so it must remain open until then.
         """
-        if parser is None:
-            name = getattr(stream, 'name', None)
-            if name is not None:
-                try:
-                    _, parser = name.rsplit('.', 1)
-                except ValueError:
-                    pass
-        if not callable(parser):
-            parser = cls.parsers[parser]
+        if lazy:
+            return cls._lazy(lambda: cls.from_stream(stream, parser).data)
+        parser = cls._parser(parser, getattr(stream, 'name', None))
         return cls(parser(stream))
 
     @classmethod
-    def from_path(cls, path, parser=None, encoding=None, optional=False):
+    def _parser(cls, parser, name, parsers=None):
+        if parser is None and name is not None:
+            try:
+                _, parser = name.rsplit('.', 1)
+            except ValueError:
+                pass
+        if not callable(parser):
+            parser = (cls.parsers if parsers is None else parsers)[parser]
+        return parser
+
+    @classmethod
+    def from_documents(cls, stream, parser=None, mergers=None):
+        """
+        Construct a :class:`Config` from a stream containing many documents,
+        such as a multi-document YAML file or a JSON Lines file.
+        Documents are parsed one at a time and each is :meth:`merged <merge>`
+        into the :class:`Config`, using any ``mergers`` supplied, before the
+        next is read.
+
+        If the stream does not have a ``name`` attribute from which the correct
+        parser can be guessed, :ref:`parser <parsers>` must be specified. A callable
+        parser should return an iterable of documents, ideally a generator.
+        """
+        parser = cls._parser(parser, getattr(stream, 'name', None), cls.document_parsers)
+        config = cls()
+        for document in parser(stream):
+            if document is not None:
+                config.merge(document, mergers=mergers)
+        return config
+
+    @classmethod
+    def from_path(cls, path, parser=None, encoding=None, optional=False, cache=None,
+                  lazy=False, track_origins=False):
         """
         Construct a :class:`Config` from file specified as either a string path or a
         :class:`pathlib.Path`.
@@ -66,15 +134,135 @@ class Config(ConfigNode):
 
         If ``optional`` is ``True``, then an empty :class:`Config` will be
         returned if the file does not exist.
+
+        When no ``encoding`` is specified and the parser accepts binary
+        streams, the file is opened in binary mode and the parser is left
+        to decode the bytes itself. For the ``json``, ``toml`` and ``yaml``
+        parsers, this means UTF-8, or the encoding indicated by a byte order
+        mark, is used rather than the locale's preferred encoding.
+
+        If a :class:`~configurator.cache.ParseCache` is passed as ``cache``, the
+        parsed content of the file will be taken from there if it is still valid
+        and stored there otherwise.
+
+        If ``lazy`` is ``True``, the file will not be read until the :class:`Config`
+        is first used, such as by accessing an attribute, item or :meth:`node` or by
+        :meth:`merging <merge>` into it. Any errors, including the file not being
+        found, will also only be raised at that point.
+
+        If ``track_origins`` is ``True``, :meth:`origins are tracked <track_origins>`
+        with ``path`` as the origin of everything loaded from it.
         """
-        full_path = expanduser(path)
-        if optional and not exists(full_path):
-            return cls()
-        with open(full_path, encoding=encoding) as stream:
-            return cls.from_stream(stream, parser)
+        if lazy:
+            config = cls._lazy(
+                lambda: cls.from_path(path, parser, encoding, optional, cache).data
+            )
+        else:
+            full_path = expanduser(path)
+            if optional and not exists(full_path):
+                config = cls()
+            else:
+                parser = cls._parser(parser, full_path)
+                if cache is None:
+                    config = cls(cls._parse_path(full_path, parser, encoding))
+                else:
+                    config = cls(cache.get(
+                        full_path, parser,
+                        lambda: cls._parse_path(full_path, parser, encoding),
+                        encoding,
+                    ))
+        if track_origins:
+            config.track_origins(path)
+        return config
+
+    @classmethod
+    def from_paths(cls, paths, parser=None, encoding=None, optional=False,
+                   mergers=None, workers=None, executor=None, track_origins=False):
+        """
+        Construct a :class:`Config` by reading and parsing each of the supplied
+        ``paths`` in parallel and then :meth:`merging <merge>` the results in the
+        order in which the ``paths`` were given, using any ``mergers`` supplied.
+        The result is the same as loading each path with :meth:`from_path` and
+        merging them one after the other.
+
+        ``parser``, ``encoding`` and ``optional`` are used for every path as
+        described in :meth:`from_path`.
+
+        The files are read using a :class:`~concurrent.futures.ThreadPoolExecutor`
+        with at most ``workers`` threads. Alternatively, an existing
+        :class:`~concurrent.futures.Executor`, such as a
+        :class:`~concurrent.futures.ProcessPoolExecutor`, may be passed as
+        ``executor``.
+
+        If any file cannot be loaded, a :class:`~configurator.parsers.LoadError`
+        naming that file is raised.
+
+        If ``track_origins`` is ``True``, :meth:`origins are tracked <track_origins>`
+        with each path as the origin of the values merged from it.
+        """
+        paths = list(paths)
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return cls.from_paths(paths, parser, encoding, optional, mergers,
+                                      executor=executor, track_origins=track_origins)
+        futures = [executor.submit(cls._load_path, path, parser, encoding, optional)
+                   for path in paths]
+        config = cls()
+        if track_origins:
+            config.track_origins()
+        for path, future in zip(paths, futures):
+            try:
+                data = future.result()
+            except Exception as e:
+                raise LoadError(path, e) from e
+            config.merge(data, mergers=mergers, origin=path)
+        return config
+
+    @classmethod
+    def from_directory(cls, path, pattern=None, parser=None, encoding=None,
+                       mergers=None, workers=None, executor=None, track_origins=False):
+        """
+        Construct a :class:`Config` from the files in the directory at ``path``,
+        such as a ``conf.d`` directory, using :meth:`from_paths`.
+        Files are merged in the order of their names.
+
+        If ``pattern`` is supplied, only files with names matching that glob pattern
+        will be loaded. Otherwise, only files with an extension for which a
+        :ref:`parser <parsers>` is available will be loaded.
+        """
+        directory = expanduser(path)
+        paths = []
+        for name in sorted(os.listdir(directory)):
+            if pattern is None:
+                _, dot, extension = name.rpartition('.')
+                if not dot or not (
+                        extension in cls.parsers or extension in cls.parsers.supported
+                ):
+                    continue
+            elif not fnmatch(name, pattern):
+                continue
+            full_path = join(directory, name)
+            if isfile(full_path):
+                paths.append(full_path)
+        return cls.from_paths(paths, parser, encoding, mergers=mergers,
+                              workers=workers, executor=executor,
+                              track_origins=track_origins)
+
+    @classmethod
+    def _load_path(cls, path, parser, encoding, optional):
+        return cls.from_path(path, parser, encoding, optional).data
+
+    @classmethod
+    def _parse_path(cls, path, parser, encoding):
+        if encoding is None and cls.parsers.accepts_binary(parser):
+            mode = 'rb'
+        else:
+            mode = 'r'
+        with open(path, mode, encoding=encoding) as stream:
+            return parser(stream)
 
     @classmethod
-    def from_env(cls, prefix, types=None):
+    def from_env(cls, prefix, types=None, track_origins=False):
         """
         Construct a :class:`Config` from :data:`os.environ` entries
         that matches the specified ``prefix``.
@@ -84,12 +272,17 @@ class Config(ConfigNode):
         ``types`` is an optional :class:`dict` mapping string suffixes
         to callables used to convert matching environment values to the
         correct type.
+
+        If ``track_origins`` is ``True``, :meth:`origins are tracked <track_origins>`
+        with the name of each environment variable as the origin of its value.
         """
         if not isinstance(prefix, dict):
             prefixes = {prefix: target}
         else:
             prefixes = prefix
-        mapping = {}
+        # a list rather than a dict, as the same variable may match more than
+        # one prefix and so produce equal source paths:
+        mapping = []
         for key, value in os.environ.items():
             for prefix, prefix_target in prefixes.items():
                 if key.startswith(prefix):
@@ -99,35 +292,182 @@ class Config(ConfigNode):
                         for suffix, type_ in types.items():
                             if key.endswith(suffix):
                                 prefix_source = convert(prefix_source, type_)
-                    mapping[prefix_source] = prefix_target
+                    mapping.append((key, prefix_source, prefix_target))
 
         config = cls()
-        config.merge(os.environ, mapping)
+        if track_origins:
+            config.track_origins()
+            for key, source, target_path in mapping:
+                config.merge(os.environ, [(source, target_path)], origin=key)
+        else:
+            config.merge(os.environ, [(source, target_path)
+                                      for _, source, target_path in mapping])
         return config
 
-    def merge(self, source=None, mapping=None, mergers=None):
+    def merge(self, source=None, mapping=None, mergers=None, in_place=False,
+              changes=False, origin=None):
         """
         Modify this :class:`Config` by merging the provided ``source`` into
-        it using any ``mapping`` or ``mergers`` provided.
+        it using any ``mapping`` or ``mergers`` provided. A ``mapping`` that will
+        be used many times can be compiled first using
+        :func:`~configurator.mapping.compile_mapping`.
+
+        If ``changes`` is ``True``, a :class:`~configurator.merge.ChangeSet` of
+        the paths that the merge added or replaced is returned. The changes are
+        recorded as the merge happens, so this is much cheaper than comparing
+        the data before and after. This cannot be combined with a ``mapping``.
+
+        If :meth:`origins are being tracked <track_origins>`, ``origin`` is
+        recorded as the origin of the values that the merge adds or replaces.
+        If ``source`` is a :class:`Config` that is also tracking origins, the origins
+        it has recorded are used in preference.
+
+        If ``in_place`` is ``True`` and no ``mergers`` are provided, the
+        :attr:`~configurator.merge.in_place_mergers` are used, so that the existing
+        dictionaries and lists in :attr:`data` are modified rather than copied.
+        This cannot be combined with a ``mapping``.
+
+        .. warning::
+
+          In-place merging is only safe when the :attr:`data` of this :class:`Config`
+          is not shared, for example with another :class:`Config` created from the
+          same data, with data obtained before an earlier :meth:`merge`, or with
+          :class:`~configurator.node.ConfigNode` objects that are expected not to
+          change. Data saved by :meth:`push` is never shared with the pushed data.
+          Dictionaries and lists merged in from a ``source`` are copied rather
+          than stored, so are never modified by a later in-place merge, but
+          values stored by a ``mapping`` without ``merge()`` are not copied.
 
         See :doc:`mapping` for more detail.
         """
+        origins = self._origins
+        source_origins = None
         if isinstance(source, ConfigNode):
+            source_origins = getattr(source, '_origins', None)
             source = source.data
-        context = MergeContext(mergers)
+        if in_place:
+            if mapping is not None:
+                raise TypeError('in_place cannot be used with a mapping')
+            if mergers is None:
+                mergers = in_place_mergers
+        change_set = None
+        if changes:
+            if mapping is not None:
+                raise TypeError('changes cannot be used with a mapping')
+            change_set = ChangeSet()
+        elif origins is not None and mapping is None:
+            change_set = ChangeSet()
+        context = MergeContext(mergers, change_set)
         if mapping is None:
-            self.data = context.merge(source, self.data)
+            data = self.data
+            self.data = context.merge(source, data)
+            if change_set is not None:
+                # changes are only recorded within dictionaries, so anything
+                # else that was changed is recorded as the whole configuration:
+                if not change_set and (self.data is not data or (
+                    in_place and source and not isinstance(data, dict)
+                )):
+                    change_set.replaced.append(())
+                if origins is not None:
+                    for path in change_set.added + change_set.replaced:
+                        if source_origins is None:
+                            origins.record(path, origin)
+                        else:
+                            origins.graft(path, source_origins)
+                if changes:
+                    return change_set
         else:
-            for source_path, target_path in mapping.items():
-                value = load(source, source_path)
-                self.data = store(self.data, target_path, value, context)
+            if isinstance(mapping, CompiledMapping) and origins is None:
+                self.data = mapping.apply(source, self.data, context)
+            else:
+                # a mapping that is only used once is applied entry by entry,
+                # but only once all of its paths have been checked:
+                data = self.data
+                for source_path, target_path in compile_mapping(mapping).entries:
+                    value = _load(source, source_path.ops)
+                    data = _store(data, target_path.ops, value, context)
+                    if origins is not None and not isinstance(value, NotPresent):
+                        origins.record(path_keys(target_path), origin)
+                self.data = data
+
+    def track_origins(self, origin=None):
+        """
+        Start tracking the origin of each value in this :class:`Config`, with
+        ``origin`` recorded as the origin of all of the existing data. Origins can
+        then be passed to :meth:`merge`, and nodes returned by
+        :meth:`~configurator.node.ConfigNode.node` and
+        :meth:`~configurator.node.ConfigNode.nodes` will be
+        :class:`~configurator.node.TrackedNode` objects with the ``origin`` of
+        their value. Until this is called, neither merging nor access is slowed down.
+
+        Origins are saved by :meth:`push` and restored by :meth:`pop` along with
+        the data.
+        """
+        self._track(Origins(origin))
+
+    def _track(self, origins):
+        self._origins = origins
+        cls = type(self)
+        if not issubclass(cls, _Tracking):
+            object.__setattr__(self, '__class__', _tracking_class(cls))
+
+    def __setstate__(self, data):
+        # pickles from earlier versions have none of the newer attributes:
+        state = {'_loader': None, '_origins': None,
+                 '_previous_origins': [None] * len(data.get('_previous', ()))}
+        state.update(data)
+        super(Config, self).__setstate__(state)
+        if self._origins is not None:
+            self._track(self._origins)
+
+    def merge_all(self, *sources, mergers=None):
+        """
+        Modify this :class:`Config` by merging each of the provided ``sources``
+        into it in turn, using any ``mergers`` provided.
+
+        This gives the same result as calling :meth:`merge` for each source but,
+        with the default mergers, walks all of the sources together and builds
+        each merged container once rather than once per source. This is faster
+        when three or more sources change the same containers; with fewer, it
+        takes about as long as calling :meth:`merge`.
+        """
+        if self._origins is not None:
+            for source in sources:
+                self.merge(source, mergers=mergers)
+            return
+        sources = [source.data if isinstance(source, ConfigNode) else source
+                   for source in sources]
+        self.data = MergeContext(mergers).merge_all(sources, self.data)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """
+        Construct a :class:`Config` from a snapshot written by :meth:`save_snapshot`.
+        A :class:`~configurator.snapshot.SnapshotError` is raised if the snapshot is
+        corrupt, was written by an incompatible version or is stale.
+        """
+        return cls(load_snapshot(path))
+
+    def save_snapshot(self, path, sources=()):
+        """
+        Write the :attr:`data` of this :class:`Config` to a compact binary snapshot
+        at ``path`` that can be loaded by :meth:`load_snapshot` much faster than the
+        original sources can be parsed and merged.
+
+        If the paths of the files the config was built from are passed as
+        ``sources``, the snapshot will be rejected as stale once any of them change.
+        """
+        save_snapshot(self.data, path, sources)
 
     def clone(self):
         """
         Clone this :class:`Config` creating copies of all mutable objects
         it contains.
         """
-        return Config(deepcopy(self.data))
+        config = Config(deepcopy(self.data))
+        if self._origins is not None:
+            config._track(self._origins.copy())
+        return config
 
     def __add__(self, other):
         """
@@ -166,8 +506,15 @@ class Config(ConfigNode):
         if not isinstance(config, Config):
             config = Config(config)
         self._previous.append(self.data)
+        self._previous_origins.append(self._origins)
         context = PushContext(self, self.data)
-        self.data = (base + config).data
+        result = base + config
+        self.data = result.data
+        if self._origins is not None:
+            origins = result._origins
+            if origins is None:
+                origins = Origins() if config._origins is None else config._origins.copy()
+            self._origins = origins
         return context
 
     def pop(self):
@@ -176,6 +523,9 @@ class Config(ConfigNode):
         on to this :class:`Config`.
         """
         self.data = self._previous.pop()
+        origins = self._previous_origins.pop()
+        if origins is not None:
+            self._origins = origins
 
 
 class PushContext:
@@ -190,3 +540,60 @@ class PushContext:
     def __exit__(self, exc_type, exc_val, exc_tb):
         while self.config.data is not self.data:
             self.config.pop()
+
+
+class _Tracking:
+    # Mixed in to the class of a Config by Config.track_origins(), so that nodes
+    # are only wrapped with their origins, and pay for looking them up, once
+    # origins are being tracked.
+
+    __slots__ = ()
+
+    def node(self, path=None, create=False):
+        """
+        As for :meth:`ConfigNode.node <configurator.node.ConfigNode.node>` but
+        returning a :class:`~configurator.node.TrackedNode` with the ``origin``
+        of its value.
+        """
+        node = super(_Tracking, self).node(path, create)
+        keys = () if path is None else path_keys(parse_text(path))
+        return TrackedNode(node.data, node._container, node._accessor,
+                           self._origins.lookup(keys))
+
+    def nodes(self, path):
+        """
+        As for :meth:`ConfigNode.nodes <configurator.node.ConfigNode.nodes>` but
+        returning :class:`~configurator.node.TrackedNode` objects.
+        """
+        origins = self._origins
+        for keys, node in self._nodes(path):
+            yield TrackedNode(node.data, node._container, node._accessor,
+                              origins.lookup(keys))
+
+    def __reduce_ex__(self, protocol):
+        # pickle and copy as the class that tracking was mixed in to, with
+        # Config.__setstate__ mixing it in again:
+        return _new, (self._untracked,), self.__getstate__()
+
+
+def _new(cls):
+    return cls.__new__(cls)
+
+
+_tracking_classes = {}
+
+
+def _tracking_class(cls):
+    tracking = _tracking_classes.get(cls)
+    if tracking is None:
+        tracking = type(cls.__name__, (_Tracking, cls), {
+            '__slots__': (),
+            '__module__': cls.__module__,
+            '__qualname__': cls.__qualname__,
+            '__doc__': cls.__doc__,
+            '_untracked': cls,
+        })
+        # ConfigNode.__getstate__ uses the slots of the class of the instance:
+        tracking.__slots__ = cls.__slots__
+        _tracking_classes[cls] = tracking
+    return tracking
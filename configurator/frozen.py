@@ -0,0 +1,324 @@
+"""
+A compact, read-only binary representation of configuration data that can be
+used in place without being unpacked, such as from shared memory or a mapped file.
+"""
+import pickle
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from struct import Struct
+
+MAGIC = b'CFGFRZN\0'
+VERSION = 1
+
+_header = Struct('<8sHI')  # magic, version, root offset
+_u32 = Struct('<I')
+_pair = Struct('<II')
+_int = Struct('<q')
+_float = Struct('<d')
+
+NONE, TRUE, FALSE, INT, FLOAT, STR, DICT, LIST, PICKLE = b'NTFifsdlp'
+_INT_MIN, _INT_MAX = -2**63, 2**63-1
+
+
+def _encode_key(key):
+    return key.encode('utf-8', 'surrogatepass')
+
+
+class _Writer:
+
+    def __init__(self):
+        self.buffer = bytearray(_header.size)
+        self.strings = {}
+
+    def _add(self, *parts):
+        offset = len(self.buffer)
+        for part in parts:
+            self.buffer += part
+        return offset
+
+    def write(self, value):
+        type_ = type(value)
+        if value is None:
+            return self._add(bytes((NONE,)))
+        elif value is True:
+            return self._add(bytes((TRUE,)))
+        elif value is False:
+            return self._add(bytes((FALSE,)))
+        elif type_ is int and _INT_MIN <= value <= _INT_MAX:
+            return self._add(bytes((INT,)), _int.pack(value))
+        elif type_ is float:
+            return self._add(bytes((FLOAT,)), _float.pack(value))
+        elif type_ is str:
+            offset = self.strings.get(value)
+            if offset is None:
+                encoded = _encode_key(value)
+                offset = self._add(bytes((STR,)), _u32.pack(len(encoded)), encoded)
+                self.strings[value] = offset
+            return offset
+        elif type_ is dict:
+            entries = [(self.write(k), self.write(v)) for k, v in value.items()]
+            if all(type(k) is str for k in value):
+                keys = [_encode_key(k) for k in value]
+                index = sorted(range(len(keys)), key=keys.__getitem__)
+            else:
+                index = ()
+            return self._add(
+                bytes((DICT,)), _u32.pack(len(entries)), _u32.pack(len(index)),
+                b''.join(_pair.pack(*entry) for entry in entries),
+                b''.join(_u32.pack(i) for i in index),
+            )
+        elif type_ is list:
+            offsets = [self.write(item) for item in value]
+            return self._add(
+                bytes((LIST,)), _u32.pack(len(offsets)),
+                b''.join(_u32.pack(o) for o in offsets),
+            )
+        else:
+            pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            return self._add(bytes((PICKLE,)), _u32.pack(len(pickled)), pickled)
+
+
+def freeze(data):
+    """
+    Return :class:`bytes` containing ``data`` in the frozen format. Dictionaries,
+    lists, strings, numbers, booleans and ``None`` are stored natively; anything
+    else is pickled.
+    """
+    writer = _Writer()
+    root = writer.write(data)
+    _header.pack_into(writer.buffer, 0, MAGIC, VERSION, root)
+    return bytes(writer.buffer)
+
+
+def view(buffer):
+    """
+    Return a read-only view of the frozen data in ``buffer``, which may be any
+    object supporting the buffer protocol, such as :class:`bytes`, a
+    :class:`memoryview` or an :class:`~mmap.mmap`. Containers are returned as
+    :class:`FrozenDict` or :class:`FrozenList` instances that read directly from
+    ``buffer``, which must remain open and unchanged while they are in use.
+    """
+    magic, version, root = _header.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not frozen configuration data')
+    return _read(buffer, root)
+
+
+def _read_str(buffer, offset):
+    length, = _u32.unpack_from(buffer, offset+1)
+    start = offset+5
+    return str(buffer[start:start+length], 'utf-8', 'surrogatepass')
+
+
+def _read(buffer, offset):
+    tag = buffer[offset]
+    if tag == STR:
+        return _read_str(buffer, offset)
+    elif tag == DICT:
+        return FrozenDict(buffer, offset)
+    elif tag == LIST:
+        return FrozenList(buffer, offset)
+    elif tag == INT:
+        return _int.unpack_from(buffer, offset+1)[0]
+    elif tag == FLOAT:
+        return _float.unpack_from(buffer, offset+1)[0]
+    elif tag == NONE:
+        return None
+    elif tag == TRUE:
+        return True
+    elif tag == FALSE:
+        return False
+    elif tag == PICKLE:
+        length, = _u32.unpack_from(buffer, offset+1)
+        start = offset+5
+        return pickle.loads(buffer[start:start+length])
+    raise ValueError('corrupt frozen data at {}'.format(offset))
+
+
+def thaw(value):
+    """
+    Return a copy of ``value`` with all :class:`FrozenDict` and :class:`FrozenList`
+    instances it contains turned into normal :class:`dict` and :class:`list`
+    instances.
+    """
+    if isinstance(value, FrozenDict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, FrozenList):
+        return [thaw(v) for v in value]
+    return value
+
+
+class FrozenDict:
+    """
+    A read-only mapping over a dictionary stored in the frozen format.
+    Lookups of string keys use a binary search over a sorted index, while
+    iteration preserves the original order of keys.
+    """
+
+    __slots__ = ('_buffer', '_count', '_indexed', '_entries', '_index')
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._count, indexed = _pair.unpack_from(buffer, offset+1)
+        self._indexed = bool(indexed) or not self._count
+        self._entries = offset + 9
+        self._index = self._entries + self._count*_pair.size
+
+    def _entry(self, i):
+        return _pair.unpack_from(self._buffer, self._entries + i*_pair.size)
+
+    def _key_bytes(self, i):
+        key_offset = self._entry(i)[0]
+        length, = _u32.unpack_from(self._buffer, key_offset+1)
+        start = key_offset+5
+        return bytes(self._buffer[start:start+length])
+
+    def __getitem__(self, key):
+        buffer = self._buffer
+        if self._indexed:
+            if type(key) is str:
+                target = _encode_key(key)
+                index = self._index
+                keys = _SortedKeys(self)
+                position = bisect_left(keys, target)
+                if position < self._count and keys[position] == target:
+                    i, = _u32.unpack_from(buffer, index + position*4)
+                    return _read(buffer, self._entry(i)[1])
+        else:
+            for i in range(self._count):
+                key_offset, value_offset = self._entry(i)
+                if _read(buffer, key_offset) == key:
+                    return _read(buffer, value_offset)
+        raise KeyError(key)
+
+    def __iter__(self):
+        buffer = self._buffer
+        for i in range(self._count):
+            yield _read(buffer, self._entry(i)[0])
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        buffer = self._buffer
+        for i in range(self._count):
+            key_offset, value_offset = self._entry(i)
+            yield _read(buffer, key_offset), _read(buffer, value_offset)
+
+    def values(self):
+        for _, value in self.items():
+            yield value
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, FrozenDict)):
+            return len(self) == len(other) and dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(thaw(self))
+
+    def __reduce__(self):
+        return dict, (thaw(self),)
+
+
+class _SortedKeys:
+    # the encoded keys of a FrozenDict in sorted order, for bisection
+
+    __slots__ = ('_dict',)
+
+    def __init__(self, frozen_dict):
+        self._dict = frozen_dict
+
+    def __len__(self):
+        return self._dict._count
+
+    def __getitem__(self, position):
+        frozen_dict = self._dict
+        i, = _u32.unpack_from(frozen_dict._buffer, frozen_dict._index + position*4)
+        return frozen_dict._key_bytes(i)
+
+
+class FrozenList:
+    """
+    A read-only sequence over a list stored in the frozen format.
+    """
+
+    __slots__ = ('_buffer', '_count', '_items')
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._count, = _u32.unpack_from(buffer, offset+1)
+        self._items = offset + 5
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('list index out of range')
+        offset, = _u32.unpack_from(self._buffer, self._items + index*4)
+        return _read(self._buffer, offset)
+
+    def __iter__(self):
+        buffer = self._buffer
+        for i in range(self._count):
+            offset, = _u32.unpack_from(buffer, self._items + i*4)
+            yield _read(buffer, offset)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, value):
+        return any(item == value for item in self)
+
+    def index(self, value):
+        for i, item in enumerate(self):
+            if item == value:
+                return i
+        raise ValueError('{!r} is not in list'.format(value))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, FrozenList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(thaw(self))
+
+    def __reduce__(self):
+        return list, (thaw(self),)
+
+
+# these are registered rather than inherited as isinstance checks against
+# abstract base classes are slow, and every node access does one:
+Mapping.register(FrozenDict)
+Sequence.register(FrozenList)
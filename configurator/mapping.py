@@ -1,18 +1,63 @@
+from collections.abc import Mapping
+
 from .path import (
-    Path, parse_text, ConvertOp, RequiredOp, NotPresent, IfSuppliedOp, ValueOp
+    Path, parse_text, Op, ItemOp, AttrOp, TextOp, ConvertOp, RequiredOp, NotPresent,
+    IfSuppliedOp, ValueOp, MergeOp, EachOp,
 )
 
+_each = EachOp()
+# shared by generated path resolvers to spot missing attributes:
+_miss = object()
 
-def load(data, path):
-    path = parse_text(path)
-    for op in path.ops:
+
+class _Matches(dict):
+    # The values found for a path containing each(), keyed by the index or key
+    # at which they were found.
+
+    __slots__ = ('sequence',)
+
+    def __init__(self, sequence):
+        super().__init__()
+        self.sequence = sequence
+
+
+def _plain(value):
+    # turn any matches into the lists or dictionaries they represent
+    if not isinstance(value, _Matches):
+        return value
+    if value.sequence:
+        return [_plain(item) for item in value.values()]
+    return {key: _plain(item) for key, item in value.items()}
+
+
+def _load(data, ops):
+    for op in ops:
         if isinstance(data, NotPresent):
             op.not_present(data)
+        elif type(op) is EachOp:
+            # the first each() is the first op equal to this one:
+            return _load_each(data, op, ops[ops.index(op)+1:])
         else:
             data = op.get(data)
     return data
 
 
+def _load_each(data, op, ops):
+    children = op.children(data)
+    if children is None:
+        return NotPresent(op.str(''))
+    matches = _Matches(not isinstance(data, Mapping))
+    for key, child in children:
+        value = _load(child, ops)
+        if not isinstance(value, NotPresent):
+            matches[key] = value
+    return matches
+
+
+def load(data, path):
+    return _plain(_load(data, parse_text(path).ops))
+
+
 def convert(source, callable_):
     """
     A :doc:`mapping <mapping>` operation that indicates the source value
@@ -51,23 +96,466 @@ def value(value):
     return Path('', ValueOp(value))
 
 
-def store(data, path, value, merge_context=None):
-    path = parse_text(path)
-    if not path.ops:
-        raise TypeError('Cannot store at root')
+def _store(data, ops, value, merge_context):
+    if isinstance(value, _Matches):
+        # checked before anything is ensured, as the container for
+        # the matches may need to be created as a list:
+        for op in ops:
+            if type(op) is EachOp:
+                return _store_each(data, ops, value, merge_context)
+        value = _plain(value)
     stack = [data]
-    for op in path.ops[:-1]:
+    for op in ops[:-1]:
+        if type(op) is EachOp:
+            return _store_each(data, ops, value, merge_context)
         stack.append(op.ensure(stack[-1]))
+    if type(ops[-1]) is EachOp:
+        return _store_each(data, ops, value, merge_context)
     if not isinstance(value, NotPresent):
-        data = path.ops[-1].set(stack[-1], value, merge_context)
+        data = ops[-1].set(stack[-1], value, merge_context)
         if data is not None:
             # uh oh, we have to replace the upstream object:
             if len(stack) < 2:
                 stack[0] = data
             else:
-                path.ops[-2].set(stack[-2], data, merge_context)
+                ops[-2].set(stack[-2], data, merge_context)
     return stack[0]
 
 
+def _store_each(data, ops, value, merge_context):
+    # the first each() is the first op equal to this one:
+    index = ops.index(_each)
+    prefix = ops[:index]
+    rest = ops[index+1:]
+    sequence = isinstance(value, _Matches) and value.sequence
+    container = data
+    for op in prefix[:-1]:
+        container = op.ensure(container)
+    if prefix:
+        op = prefix[-1]
+        if sequence and type(op) in _keyed_ops:
+            # values found in a list are stored in a new list if needed:
+            parent = container
+            container = op.get(parent)
+            if isinstance(container, NotPresent):
+                container = []
+                op.set(parent, container, merge_context)
+        else:
+            container = op.ensure(container)
+    extend = isinstance(container, list)
+    if isinstance(value, _Matches):
+        # each value found by a source path with each() is stored in the
+        # child with the same key or index:
+        if extend and not sequence:
+            raise TypeError('Cannot store values found in a dictionary in a list')
+        pairs = value.items()
+    elif isinstance(value, NotPresent):
+        return data
+    else:
+        children = _each.children(container)
+        if children is None:
+            raise TypeError('Cannot use each() on {!r}'.format(container))
+        pairs = [(key, value) for key, _ in children]
+    for key, child_value in pairs:
+        if extend and key >= len(container):
+            # lists are extended up to the index of each value, with None
+            # filling any gaps, so that values keep their positions:
+            container.extend([None] * (key - len(container)))
+            container.append({} if rest else None)
+        if rest:
+            try:
+                child = container[key]
+            except KeyError:
+                child = container[key] = {}
+            result = _store(child, rest, child_value, merge_context)
+            if result is not child:
+                container[key] = result
+        else:
+            container[key] = _plain(child_value)
+    return data
+
+
+def _parent(text):
+    # the dotted path of the container for a dotted path, None being the root
+    parent, dot, _ = text.rpartition('.')
+    return parent if dot else None
+
+
+def _store_many(data, entries, merge_context):
+    # Stores each (text, path, value) in entries in turn, as _store would.
+    # Containers ensured for dotted paths are cached by their dotted text, along
+    # with all the containers above them, so each is only looked up or created
+    # once. Other paths are stored from the root and empty the cache, as they
+    # may replace containers in it.
+    containers = {None: data}
+    for text, path, value in entries:
+        ops = path.ops
+        if text is None:
+            data = containers[None]
+            containers = {None: _store(data, ops, value, merge_context)}
+            continue
+        parent = _parent(text)
+        container = containers.get(parent)
+        if container is None:
+            missing = []
+            while parent not in containers:
+                missing.append(parent)
+                parent = _parent(parent)
+            container = containers[parent]
+            for op, parent in zip(ops[len(ops)-1-len(missing):-1], reversed(missing)):
+                container = containers[parent] = op.ensure(container)
+        if not isinstance(value, NotPresent):
+            ops[-1].set(container, value, merge_context)
+            if text in containers:
+                prefix = text + '.'
+                for cached in list(containers):
+                    if cached == text or cached is not None and cached.startswith(prefix):
+                        del containers[cached]
+    return containers[None]
+
+
+def store(data, path, value, merge_context=None):
+    path = parse_text(path)
+    if not path.ops:
+        raise TypeError('Cannot store at root')
+    return _store(data, path.ops, value, merge_context)
+
+
+# These raise the same exceptions as using the path would:
+
+def _check_source(path):
+    for op in path.ops:
+        if type(op).get is Op.get:
+            op.get(None)
+
+
+def _check_target(path):
+    if not path.ops:
+        raise TypeError('Cannot store at root')
+    for op in path.ops[:-1]:
+        if isinstance(op, MergeOp) or type(op).ensure is Op.ensure:
+            op.ensure(None)
+    op = path.ops[-1]
+    if type(op).set is Op.set:
+        op.set(None)
+
+
+_unset = object()
+
+
+class _Trie:
+    # A trie of path operations. Nodes are identified by their index, with
+    # the root being 0, so that values for them can be kept in a list.
+
+    def __init__(self):
+        self.parents = [None]
+        self.ops = [None]
+        self.children = [{}]
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add(self, node, key, op):
+        child = self.children[node].get(key)
+        if child is None:
+            child = len(self.parents)
+            self.parents.append(node)
+            self.ops.append(op)
+            self.children.append({})
+            self.children[node][key] = child
+        return child
+
+    def descendants(self, node):
+        nodes = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(self.children[node].values())
+        return nodes
+
+
+# operations that only look something up, so can be shared between paths
+_source_ops = (ItemOp, AttrOp, TextOp)
+# operations that ensure a container exists by key, keyed by that key alone as
+# they find the same container in the dictionaries and lists of a target:
+_target_ops = (ItemOp, TextOp)
+_keyed_ops = (ItemOp, AttrOp, TextOp)
+
+
+def _interpreter(ops):
+    def resolve(data):
+        return _load(data, ops)
+    return resolve
+
+
+def _plan_source(trie, path):
+    node = 0
+    ops = path.ops
+    for i, op in enumerate(ops):
+        if type(op) not in _source_ops:
+            return node, ops[i:]
+        node = trie.add(node, op, op)
+    return node, ()
+
+
+def _plan_target(trie, path):
+    # returns the node for the container the final op is applied to along
+    # with that op or, if the container can't be cached, None and all the ops
+    ops = path.ops
+    node = 0
+    for op in ops[:-1]:
+        if type(op) not in _target_ops:
+            return None, ops
+        node = trie.add(node, op.text, op)
+    return node, ops[-1]
+
+
+class CompiledMapping:
+    """
+    A :doc:`mapping <mapping>` that has been parsed and checked by
+    :func:`compile_mapping` so that it can be applied to many sources
+    without repeating that work.
+
+    When applied, each distinct source path prefix is only traversed once and
+    containers in the target are only looked up or created once, no matter
+    how many entries in the mapping share them.
+    """
+
+    __slots__ = ('entries', 'generate', '_source_trie', '_target_trie', '_plan')
+
+    def __init__(self, entries, generate=False):
+        #: A :class:`tuple` of ``(source, target)`` :class:`~configurator.path.Path`
+        #: pairs, in the order in which they are applied.
+        self.entries = entries
+        #: Whether source paths are loaded using functions generated by
+        #: :func:`compile_path` rather than by sharing their prefixes.
+        self.generate = generate
+        self._source_trie = self._target_trie = self._plan = None
+
+    def _prepare(self):
+        # The tries are only built when first applied, as building them costs
+        # more than applying the mapping once without them.
+        self._source_trie = source_trie = _Trie()
+        self._target_trie = target_trie = _Trie()
+        planned = []
+        for source_path, target_path in self.entries:
+            resolve = _generate(source_path) if self.generate else None
+            if resolve is None:
+                source_node, source_ops = _plan_source(source_trie, source_path)
+                if source_ops:
+                    resolve = _interpreter(source_ops)
+            else:
+                source_node = 0
+            target_node, target_op = _plan_target(target_trie, target_path)
+            planned.append((source_node, resolve, target_node, target_op, target_path))
+        # The containers that may be replaced by setting a value are only known
+        # once all the paths are in the trie:
+        plan = []
+        for source_node, resolve, target_node, target_op, target_path in planned:
+            stale = ()
+            if target_node is not None:
+                if isinstance(target_op, _keyed_ops):
+                    child = target_trie.children[target_node].get(target_op.text)
+                    if child is not None:
+                        stale = tuple(target_trie.descendants(child))
+                elif isinstance(target_op, (MergeOp, EachOp)):
+                    # the container itself, or any of its children, may be
+                    # replaced, so fall back to a normal store:
+                    target_node, target_op = None, target_path.ops
+                else:
+                    # inserting and appending can change what items are at
+                    # which indexes in the container:
+                    stale = tuple(target_trie.descendants(target_node)[1:])
+            plan.append((source_node, resolve, target_node, target_op, stale))
+        self._plan = tuple(plan)
+
+    def apply(self, source, data, merge_context=None):
+        """
+        Apply this mapping, loading each source path from ``source`` and
+        storing the result at the corresponding target path in ``data``.
+        The resulting data is returned, as the root object may have been replaced.
+        """
+        if self._plan is None:
+            self._prepare()
+        source_parents = self._source_trie.parents
+        source_ops = self._source_trie.ops
+        target_parents = self._target_trie.parents
+        target_ops = self._target_trie.ops
+        values = [_unset] * len(source_parents)
+        values[0] = source
+        containers = [_unset] * len(target_parents)
+        containers[0] = data
+
+        for source_node, resolve, target_node, target_op, stale in self._plan:
+
+            value = values[source_node]
+            if value is _unset:
+                node = source_node
+                chain = []
+                while value is _unset:
+                    chain.append(node)
+                    node = source_parents[node]
+                    value = values[node]
+                for node in reversed(chain):
+                    if not isinstance(value, NotPresent):
+                        value = source_ops[node].get(value)
+                    values[node] = value
+            if resolve is not None:
+                value = resolve(value)
+
+            if target_node is None:
+                data = _store(data, target_op, value, merge_context)
+                containers = [_unset] * len(target_parents)
+                containers[0] = data
+                continue
+
+            container = containers[target_node]
+            if container is _unset:
+                node = target_node
+                chain = []
+                while container is _unset:
+                    chain.append(node)
+                    node = target_parents[node]
+                    container = containers[node]
+                for node in reversed(chain):
+                    container = containers[node] = target_ops[node].ensure(container)
+            if isinstance(value, _Matches):
+                value = _plain(value)
+            if not isinstance(value, NotPresent):
+                target_op.set(container, value, merge_context)
+                for node in stale:
+                    containers[node] = _unset
+
+        return data
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return '<CompiledMapping {}>'.format(', '.join(
+            '{}: {}'.format(source_path, target_path)
+            for source_path, target_path in self.entries
+        ))
+
+
+def compile_mapping(mapping, generate=False):
+    """
+    Parse and check the supplied ``mapping`` of source paths to target paths,
+    returning a :class:`CompiledMapping` that can be passed to
+    :meth:`Config.merge <configurator.Config.merge>` in place of the original.
+    A :class:`TypeError` is raised for any path that could not be used,
+    such as a target of the root or a source that uses
+    :meth:`~configurator.path.Path.append`.
+
+    If ``generate`` is ``True``, each source path is loaded using a function
+    generated by :func:`compile_path`.
+
+    ``mapping`` may also be a sequence of ``(source, target)`` pairs, which
+    allows equal source paths to be mapped to more than one target.
+    If ``mapping`` is already a :class:`CompiledMapping`, it is returned unchanged.
+    """
+    if isinstance(mapping, CompiledMapping):
+        return mapping
+    if isinstance(mapping, dict):
+        mapping = mapping.items()
+    entries = []
+    for source_path, target_path in mapping:
+        source_path = parse_text(source_path)
+        target_path = parse_text(target_path)
+        _check_source(source_path)
+        _check_target(target_path)
+        entries.append((source_path, target_path))
+    return CompiledMapping(tuple(entries), generate)
+
+
+def _generate(path):
+    # returns a generated function that loads path or None if it can't be generated
+    ops = path.ops
+    namespace = {'NotPresent': NotPresent, '_miss': _miss}
+    lines = ['def resolve(data):']
+
+    for i, op in enumerate(ops):
+        arg = 'a{}'.format(i)
+        if any(type(later) is RequiredOp for later in ops[i+1:]):
+            miss = 'raise NotPresent({})'
+        else:
+            miss = 'return NotPresent({})'
+        type_ = type(op)
+        if type_ is ItemOp:
+            namespace[arg] = op.text
+            lines.extend((
+                '    try:',
+                '        data = data[{}]'.format(arg),
+                '    except (KeyError, IndexError):',
+                '        ' + miss.format(arg),
+            ))
+        elif type_ is AttrOp:
+            namespace[arg] = op.text
+            lines.extend((
+                '    data = getattr(data, {}, _miss)'.format(arg),
+                '    if data is _miss:',
+                '        ' + miss.format(arg),
+            ))
+        elif type_ is TextOp:
+            namespace[arg] = op.text
+            lines.extend((
+                # plain dictionaries are by far the most common:
+                '    if type(data) is dict:',
+                '        data = data.get({}, _miss)'.format(arg),
+                '        if data is _miss:',
+                '            ' + miss.format(arg),
+                '    else:',
+                "        getitem = getattr(data, '__getitem__', None)",
+                '        if getitem is None:',
+                '            data = getattr(data, {}, _miss)'.format(arg),
+                '            if data is _miss:',
+                '                ' + miss.format(arg),
+                '        else:',
+                '            try:',
+                '                data = getitem({})'.format(arg),
+                '            except KeyError:',
+                '                ' + miss.format(arg),
+            ))
+        elif type_ is ConvertOp:
+            namespace[arg] = op.callable
+            lines.append('    data = {}(data)'.format(arg))
+        elif type_ is IfSuppliedOp:
+            namespace[arg] = op.false_values
+            lines.extend((
+                '    if data in {}:'.format(arg),
+                '        ' + miss.format('data'),
+            ))
+        elif type_ is ValueOp:
+            namespace[arg] = op.value
+            lines.append('    data = {}'.format(arg))
+        elif type_ is not RequiredOp:
+            return None
+
+    lines.append('    return data')
+    code = compile('\n'.join(lines), '<path {}>'.format(path), 'exec')
+    exec(code, namespace)
+    return namespace['resolve']
+
+
+def compile_path(path):
+    """
+    Return a function that takes a source and returns the value found in it at
+    ``path``, as a :doc:`mapping <mapping>` would load it, or a
+    :class:`~configurator.path.NotPresent` if it is not there.
+
+    The function is generated from the operations in the path, so it avoids the
+    overhead of interpreting them one by one. Paths that contain
+    :meth:`~configurator.path.Path.each` or custom operations are interpreted.
+    """
+    path = parse_text(path)
+    _check_source(path)
+    resolve = _generate(path)
+    if resolve is None:
+        def resolve(data):
+            return _plain(_load(data, path.ops))
+    return resolve
+
+
 source = Path('source')
 target = Path('target')
@@ -1,26 +1,495 @@
 
 
+_missing = object()
+
+
+def _fresh(context, value):
+    # A copy of a value that can be merged, made by merging it into a new instance
+    # of its type, so that merging into it in place later won't change the original.
+    try:
+        return context.merge(value, type(value)())
+    except TypeError:
+        return value
+
+
+def _merged_value(context, source_value, target_value):
+    lookup = context.mergers.lookup
+    source_type = type(source_value)
+    merger = lookup(source_type)
+    if merger is None:
+        return source_value
+    if (
+        target_value is not _missing
+        and type(target_value) is not source_type
+        and lookup(type(target_value)) is not merger
+    ):
+        # can't merge, so overwrite with a copy, as the result may later be
+        # merged into in place:
+        return _fresh(context, source_value)
+    try:
+        if target_value is _missing:
+            target_value = source_type()
+        return context.merge(source_value, target_value)
+    except TypeError:
+        # can't merge, so overwrite
+        return source_value
+
+
+def _path(stack, *key):
+    # the keys leading to the frame on the top of a _merge_dict stack, plus any key
+    return tuple(frame[3] for frame in stack) + key
+
+
+def _merge_dict(context, source, target, dict_merger, copy):
+    # Merge source into target using an explicit stack rather than recursion
+    # wherever a nested value would be merged using dict_merger, so that the
+    # depth of the dictionaries being merged is not limited by the recursion
+    # limit. When copying, only copy a dictionary if the source changes it,
+    # so that untouched subtrees, and the target itself if nothing changes,
+    # are shared with the result.
+    lookup = context.mergers.lookup
+    changes = context.changes
+    # record is false inside dictionaries that are being added, as only the
+    # addition of the dictionary itself is recorded:
+    record = changes is not None
+    stack = []
+    items = iter(source.items())
+    result = None if copy else target
+    while True:
+        for key, source_value in items:
+            target_value = target.get(key, _missing)
+            source_type = type(source_value)
+            merger = lookup(source_type)
+            if merger is None or (
+                target_value is not _missing
+                and type(target_value) is not source_type
+                and lookup(type(target_value)) is not merger
+            ):
+                # can't merge, so overwrite
+                value = source_value
+                if record and type(value) is type(target_value) and value == target_value:
+                    # an equal value, such as from reloading the same file,
+                    # is not a change:
+                    value = target_value
+                elif merger is not None:
+                    # the value may later be merged into in place, so
+                    # must not be the one from the source:
+                    value = _fresh(context, source_value)
+            elif merger is dict_merger:
+                nested_target = target_value
+                if nested_target is _missing:
+                    try:
+                        nested_target = source_type()
+                    except TypeError:
+                        nested_target = None
+                if nested_target is not None:
+                    stack.append((items, target, result, key, target_value, record))
+                    if record and target_value is _missing:
+                        changes.added.append(_path(stack))
+                        record = False
+                    items = iter(source_value.items())
+                    target = nested_target
+                    result = None if copy else target
+                    break
+                # can't merge, so overwrite
+                value = source_value
+            else:
+                value = _merged_value(context, source_value, target_value)
+                if (record and not copy and source_value
+                        and value is target_value and value is not source_value):
+                    # merged in place, so changed even though it's the same object
+                    changes.replaced.append(_path(stack, key))
+            if value is target_value:
+                continue
+            if record:
+                if target_value is _missing:
+                    changes.added.append(_path(stack, key))
+                else:
+                    changes.replaced.append(_path(stack, key))
+            if result is None:
+                result = target.copy()
+            result[key] = value
+        else:
+            value = target if result is None else result
+            if not stack:
+                return value
+            items, target, result, key, target_value, record = stack.pop()
+            if value is not target_value:
+                if result is None:
+                    result = target.copy()
+                result[key] = value
+
+
 def merge_dict(context, source, target):
+    return _merge_dict(context, source, target, merge_dict, copy=True)
+
+
+def merge_list(context, source, target):
+    if not source:
+        return target
+    return target + source
+
+
+def _gather(context, sources, target, owned):
+    # Merge each of the sources in turn into target, as merge_dict would, except
+    # for values that have an n-way merger. Those are gathered, along with the
+    # value each would be merged into, to be merged once all the sources have
+    # been seen, so that each merged container is only built once. Returns the
+    # result, or None if target is unchanged, along with the gathered values.
+    # If target is owned, it's new and so is changed rather than copied.
+    lookup = context.mergers.lookup
+    result = target if owned else None
+    pending = {}
+    for source in sources:
+        for key, value in source.items():
+            merger = lookup(type(value))
+            current = (target if result is None else result).get(key, _missing)
+            if merger is None:
+                if value is current:
+                    continue
+                if pending:
+                    pending.pop(key, None)
+            else:
+                entry = pending.get(key)
+                if entry is not None:
+                    if merger is entry[0]:
+                        entry[2].append(value)
+                        continue
+                    # can't merge with what's gathered so far, so overwrite
+                    # with a copy, as for _merged_value:
+                    del pending[key]
+                    value = _fresh(context, value)
+                    if merger in multi_mergers:
+                        pending[key] = [merger, value, [], True]
+                elif merger in multi_mergers:
+                    if current is _missing:
+                        try:
+                            current = type(value)()
+                        except TypeError:
+                            # can't merge, so overwrite
+                            pending[key] = [merger, value, [], False]
+                        else:
+                            pending[key] = [merger, current, [value], True]
+                            value = current
+                    elif type(current) is type(value) or lookup(type(current)) is merger:
+                        pending[key] = [merger, current, [value], False]
+                        continue
+                    else:
+                        # can't merge, so overwrite with a copy:
+                        value = _fresh(context, value)
+                        pending[key] = [merger, value, [], True]
+                else:
+                    value = _merged_value(context, value, current)
+                    if value is current:
+                        continue
+            if result is None:
+                result = target.copy()
+            result[key] = value
+    return result, pending
+
+
+def merge_dicts(context, sources, target):
+    """
+    The n-way equivalent of :func:`merge_dict`, merging each of the ``sources``
+    in turn into ``target`` in a single pass over their keys.
+    """
+    # As with _merge_dict, nested dictionaries are merged using an explicit stack
+    # rather than recursion, so their depth is not limited by the recursion limit.
+    stack = []
+    result, pending = _gather(context, sources, target, False)
+    items = iter(pending.items())
+    while True:
+        for key, entry in items:
+            value = entry[1]
+            values = entry[2]
+            if values:
+                merger = entry[0]
+                if merger is merge_dict:
+                    stack.append((items, target, result, key))
+                    target = value
+                    result, pending = _gather(context, values, target, entry[3])
+                    items = iter(pending.items())
+                    break
+                value = multi_mergers[merger](context, values, value)
+            if value is not (target if result is None else result).get(key, _missing):
+                if result is None:
+                    result = target.copy()
+                result[key] = value
+        else:
+            value = target if result is None else result
+            if not stack:
+                return value
+            items, target, result, key = stack.pop()
+            if value is not (target if result is None else result).get(key, _missing):
+                if result is None:
+                    result = target.copy()
+                result[key] = value
+
+
+def merge_lists(context, sources, target):
+    """
+    The n-way equivalent of :func:`merge_list`.
+    """
+    if not sources:
+        return target
     result = target.copy()
-    for key, source_value in source.items():
-        if key in result:
-            target_value = result[key]
+    for source in sources:
+        result.extend(source)
+    return result
+
+
+def merge_dict_in_place(context, source, target):
+    """
+    Merge ``source`` into ``target`` by modifying ``target``, which is returned.
+    """
+    return _merge_dict(context, source, target, merge_dict_in_place, copy=False)
+
+
+def merge_list_in_place(context, source, target):
+    """
+    Merge ``source`` into ``target`` by extending ``target``, which is returned.
+    """
+    target.extend(source)
+    return target
+
+
+def _hashable(value):
+    # A hashable stand-in for value that is equal to the stand-in for any value
+    # equal to it, or _missing if there isn't one.
+    try:
+        hash(value)
+    except TypeError:
+        pass
+    else:
+        return value
+    if isinstance(value, dict):
+        items = []
+        for key, item in value.items():
+            item = _hashable(item)
+            if item is _missing:
+                return _missing
+            items.append((key, item))
+        return dict, frozenset(items)
+    if isinstance(value, (list, tuple)):
+        items = []
+        for item in value:
+            item = _hashable(item)
+            if item is _missing:
+                return _missing
+            items.append(item)
+        return list, tuple(items)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return _missing
+
+
+def merge_list_unique(context, source, target):
+    """
+    Merge ``source`` into ``target`` by appending only the items in ``source``
+    that are not already present, either in ``target`` or earlier in ``source``.
+    Items are indexed by value so that merging is linear in the length of the
+    lists, so items that are not hashable, such as dictionaries, are compared
+    using a hashable equivalent.
+    """
+    seen = set()
+    unhashable = []
+    for item in target:
+        key = _hashable(item)
+        if key is _missing:
+            unhashable.append(item)
         else:
-            target_value = type(source_value)()
-        try:
-            value = context.merge(source_value, target_value)
-        except TypeError:
-            # can't merge, so overwrite
-            value = source_value
-        result[key] = value
+            seen.add(key)
+    result = None
+    for item in source:
+        key = _hashable(item)
+        if key is _missing:
+            if item in unhashable:
+                continue
+            unhashable.append(item)
+        elif key in seen:
+            continue
+        else:
+            seen.add(key)
+        if result is None:
+            result = target.copy()
+        result.append(item)
+    if result is None:
+        return target
     return result
 
 
-def merge_list(context, source, target):
-    return target + source
+def merge_list_by_key(key):
+    """
+    Return a merger for lists of dictionaries that merges each dictionary in
+    the source list into the dictionary in the target list that has the same
+    value for ``key``, or appends it if there isn't one. Items that are not
+    dictionaries, or have no value for ``key``, are always appended.
+
+    Items are indexed by their value for ``key`` so that merging is linear in the
+    length of the lists::
+
+        mergers = default_mergers + {list: merge_list_by_key('name')}
+    """
+    def merge_list_by_key(context, source, target):
+        index = {}
+        for i, item in enumerate(target):
+            if isinstance(item, dict):
+                value = _hashable(item.get(key, _missing))
+                if value is not _missing and value not in index:
+                    index[value] = i
+        result = None
+        for item in source:
+            i = None
+            value = _missing
+            if isinstance(item, dict):
+                value = _hashable(item.get(key, _missing))
+                if value is not _missing:
+                    i = index.get(value)
+            current = target if result is None else result
+            if i is None:
+                if result is None:
+                    result = target.copy()
+                if value is not _missing:
+                    index[value] = len(result)
+                result.append(item)
+            else:
+                existing = current[i]
+                merged = _merged_value(context, item, existing)
+                if merged is not existing:
+                    if result is None:
+                        result = target.copy()
+                    result[i] = merged
+        if result is None:
+            return target
+        return result
+    return merge_list_by_key
+
+
+def _dotted(path):
+    return '.'.join(str(key) for key in path)
+
+
+class ChangeSet:
+    """
+    The paths changed by a merge, as returned by :meth:`Config.merge
+    <configurator.Config.merge>` when ``changes`` is requested. Each path is a
+    tuple of the keys leading to the changed value, with the empty tuple
+    standing for the whole configuration.
+
+    Iterating over a :class:`ChangeSet` gives each path as a dotted string.
+    A path is ``in`` a :class:`ChangeSet` if it, anything within it or anything
+    containing it has changed. Paths may be given as dotted strings or as tuples
+    of keys.
+    """
+
+    __slots__ = ('added', 'replaced')
+
+    def __init__(self):
+        #: A :class:`list` of the paths where a value was added.
+        #: Only the outermost path of a newly added dictionary is included.
+        self.added = []
+        #: A :class:`list` of the paths where an existing value was replaced
+        #: or, in the case of non-dictionary containers such as lists,
+        #: merged with.
+        self.replaced = []
+
+    def __iter__(self):
+        for path in self.added:
+            yield _dotted(path)
+        for path in self.replaced:
+            yield _dotted(path)
+
+    def __len__(self):
+        return len(self.added) + len(self.replaced)
+
+    def __contains__(self, path):
+        if isinstance(path, str):
+            path = tuple(path.split('.')) if path else ()
+        else:
+            path = tuple(path)
+        length = len(path)
+        for changed in self.added + self.replaced:
+            if changed[:length] == path or path[:len(changed)] == changed:
+                return True
+        return False
+
+    def __repr__(self):
+        return '<ChangeSet added={!r} replaced={!r}>'.format(
+            [_dotted(path) for path in self.added],
+            [_dotted(path) for path in self.replaced],
+        )
 
 
 class MergeableDict(dict):
+    """
+    A mapping of type to merger. Mergers are found for a type by looking for
+    each class in its method resolution order, so a merger registered for
+    :class:`dict` will also be used for subclasses such as
+    :class:`~collections.OrderedDict`. The results of these lookups are cached
+    until the mapping is next changed.
+    """
+
+    _cache = None
+
+    def lookup(self, type_):
+        """
+        Return the merger to use for ``type_``, or ``None`` if there isn't one.
+        """
+        cache = self._cache
+        if cache is None:
+            cache = self._cache = {}
+        try:
+            return cache[type_]
+        except KeyError:
+            pass
+        merger = None
+        for base in type_.__mro__:
+            merger = self.get(base)
+            if merger is not None:
+                break
+        cache[type_] = merger
+        return merger
+
+    def _changed(self):
+        self._cache = None
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def update(self, *args, **kw):
+        super().update(*args, **kw)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self._changed()
+        return result
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self):
+        return type(self)(self)
 
     def __add__(self, other):
         result = self.copy()
@@ -33,21 +502,66 @@ default_mergers = MergeableDict({
     list: merge_list,
 })
 
+#: A mapping of pairwise merger to the equivalent merger that takes a sequence
+#: of sources, for use by :meth:`MergeContext.merge_all`.
+multi_mergers = {
+    merge_dict: merge_dicts,
+    merge_list: merge_lists,
+}
+
+in_place_mergers = MergeableDict({
+    dict: merge_dict_in_place,
+    list: merge_list_in_place,
+})
+
 
 class MergeContext:
 
     mergers = default_mergers
+    #: A :class:`ChangeSet` to record changes made by merging in, if any.
+    changes = None
 
-    def __init__(self, mergers=None):
+    def __init__(self, mergers=None, changes=None):
         if mergers is not None:
+            if not isinstance(mergers, MergeableDict):
+                mergers = MergeableDict(mergers)
             self.mergers = mergers
+        if changes is not None:
+            self.changes = changes
 
     def merge(self, source, target):
         source_type = type(source)
         target_type = type(target)
-        merger = self.mergers.get(target_type)
-        if source_type is not target_type or merger is None:
+        merger = self.mergers.lookup(target_type)
+        if merger is None or (
+            source_type is not target_type and self.mergers.lookup(source_type) is not merger
+        ):
             raise TypeError('Cannot merge {} with {}'.format(
                 source_type, target_type
             ))
         return merger(self, source, target)
+
+    def merge_all(self, sources, target):
+        """
+        Merge each of the ``sources`` in turn into ``target``, giving the same
+        result as calling :meth:`merge` for each of them, but building each
+        merged container only once where the merger in use has an entry in
+        :data:`multi_mergers`.
+        """
+        lookup = self.mergers.lookup
+        target_type = type(target)
+        merger = lookup(target_type)
+        for source in sources:
+            source_type = type(source)
+            if merger is None or (
+                source_type is not target_type and lookup(source_type) is not merger
+            ):
+                raise TypeError('Cannot merge {} with {}'.format(
+                    source_type, target_type
+                ))
+        multi_merger = multi_mergers.get(merger)
+        if multi_merger is not None:
+            return multi_merger(self, sources, target)
+        for source in sources:
+            target = merger(self, source, target)
+        return target
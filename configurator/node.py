@@ -1,6 +1,12 @@
 from pprint import pformat
 
-from .path import parse_text, NotPresent
+from .frozen import FrozenDict, FrozenList
+from .mapping import _check_target, _store_many
+from .merge import MergeContext
+from .path import parse_text, NotPresent, EachOp
+
+_containers = (dict, list)
+_frozen = (FrozenDict, FrozenList)
 
 
 class ConfigNode:
@@ -29,7 +35,10 @@ class ConfigNode:
         self._accessor = accessor
 
     def _wrap(self, accessor, value):
-        if isinstance(value, (dict, list)):
+        # only frozen data has frozen children, so plain data skips that check:
+        if isinstance(value, _containers) or (
+            isinstance(self.data, _frozen) and isinstance(value, _frozen)
+        ):
             value = ConfigNode(value, self.data, accessor)
         return value
 
@@ -175,6 +184,73 @@ class ConfigNode:
 
         return ConfigNode(data, container, op.text)
 
+    def _nodes(self, path):
+        # yields the keys for, and node of, each match of a path with each()
+        path = parse_text(path)
+        for op in path.ops:
+            if getattr(op, 'text', None) is None and not isinstance(op, EachOp):
+                raise TypeError('invalid path: '+str(path))
+        stack = [((), self.data, self._container, self._accessor, path.ops)]
+        while stack:
+            keys, data, container, accessor, ops = stack.pop()
+            for i, op in enumerate(ops):
+                if isinstance(op, EachOp):
+                    children = op.children(data)
+                    if children is not None:
+                        rest = ops[i+1:]
+                        # reversed so that matches are found in order:
+                        for key, child in reversed(children):
+                            stack.append((keys+(key,), child, data, key, rest))
+                    break
+                container = data
+                data = op.get(container)
+                if isinstance(data, NotPresent):
+                    break
+                accessor = op.text
+                keys += (accessor,)
+            else:
+                yield keys, ConfigNode(data, container, accessor)
+
+    def nodes(self, path):
+        """
+        Obtain a :class:`ConfigNode` for each match of a dotted path or
+        :class:`~configurator.path.Path` containing wildcards, such as
+        ``'servers.*.port'``, in a single traversal. Each node can be used as
+        returned by :meth:`node`, so :meth:`set` can be used to replace values.
+
+        Matches where the rest of the path is not present are skipped.
+        """
+        for _, node in self._nodes(path):
+            yield node
+
+    def set_many(self, values, mergers=None):
+        """
+        Store each value in the supplied :class:`dict` at the dotted path or
+        :class:`~configurator.path.Path` it is keyed by, relative to this node.
+        Paths are interpreted as :doc:`mapping <mapping>` targets, so missing
+        containers are created as dictionaries and
+        :meth:`~configurator.path.Path.insert`,
+        :meth:`~configurator.path.Path.append` and
+        :meth:`~configurator.path.Path.merge`, using any ``mergers`` provided,
+        can be used. All of the paths are checked before any value is stored.
+
+        The values are stored in order, as if each had been stored on its own,
+        but each container on the dotted paths is only looked up or created once.
+        """
+        entries = []
+        for path, value in values.items():
+            parsed = parse_text(path)
+            if isinstance(path, str) and '*' not in path:
+                # dotted paths without wildcards are always valid targets:
+                entries.append((path, parsed, value))
+            else:
+                _check_target(parsed)
+                entries.append((None, parsed, value))
+        data = _store_many(self.data, entries, MergeContext(mergers))
+        if data is not self.data:
+            self.set(data)
+            self.data = data
+
     def set(self, value):
         """
         Replace the :attr:`data` of this node with the supplied ``value``.
@@ -201,3 +277,18 @@ class ConfigNode:
     def __setstate__(self, data):
         for name, value in data.items():
             setattr(self, name, value)
+
+
+class TrackedNode(ConfigNode):
+    """
+    A :class:`ConfigNode` returned by :meth:`Config.node <ConfigNode.node>`
+    when :meth:`origins are being tracked <configurator.Config.track_origins>`.
+    """
+
+    __slots__ = ConfigNode.__slots__+('origin',)
+
+    def __init__(self, data=None, container=None, accessor=None, origin=None):
+        super(TrackedNode, self).__init__(data, container, accessor)
+        #: The origin passed when the value of this node was last merged in,
+        #: such as the path of the file it was loaded from.
+        self.origin = origin
@@ -0,0 +1,113 @@
+"""
+Tracking of where the values in a :class:`~configurator.Config` came from.
+"""
+
+
+class _Inherited:
+    # marks nodes whose origin is that of the nearest node above them with one
+
+    def __reduce__(self):
+        return '_inherited'
+
+
+_inherited = _Inherited()
+
+
+class Origins:
+    """
+    An index of the origins of the values in a configuration, kept as a tree
+    that parallels the configuration data but only has nodes where the
+    origin of a value differs from that of the value containing it.
+    """
+
+    __slots__ = ('origin', 'children')
+
+    def __init__(self, origin=_inherited):
+        self.origin = origin
+        self.children = None
+
+    def record(self, path, origin):
+        """
+        Record that the value at ``path``, a sequence of keys, and everything
+        it contains, came from ``origin``.
+        """
+        node = self._ensure(path)
+        node.origin = origin
+        node.children = None
+
+    def graft(self, path, other):
+        """
+        Record the origins for the value at ``path`` as being whatever they
+        are for the same ``path`` in the ``other`` :class:`Origins`.
+        """
+        node, origin = other._find(path)
+        target = self._ensure(path)
+        if node is None:
+            target.origin = origin
+            target.children = None
+        else:
+            copy = node.copy()
+            target.origin = origin
+            target.children = copy.children
+
+    def lookup(self, path):
+        """
+        Return the origin of the value at ``path``, a sequence of keys.
+        """
+        return self._find(path)[1]
+
+    def copy(self):
+        """
+        Return a copy of this :class:`Origins` that can be changed independently.
+        """
+        result = Origins(self.origin)
+        stack = [(self, result)]
+        while stack:
+            node, copy = stack.pop()
+            if node.children is not None:
+                copy.children = {}
+                for key, child in node.children.items():
+                    child_copy = copy.children[key] = Origins(child.origin)
+                    stack.append((child, child_copy))
+        return result
+
+    def _ensure(self, path):
+        node = self
+        for key in path:
+            children = node.children
+            if children is None:
+                children = node.children = {}
+            child = children.get(key)
+            if child is None:
+                child = children[key] = Origins()
+            node = child
+        return node
+
+    def _find(self, path):
+        # returns the node at path, if there is one, and the origin that applies there
+        node = self
+        origin = None
+        if node.origin is not _inherited:
+            origin = node.origin
+        for key in path:
+            children = node.children
+            node = None if children is None else children.get(key)
+            if node is None:
+                break
+            if node.origin is not _inherited:
+                origin = node.origin
+        return node, origin
+
+
+def path_keys(path):
+    """
+    Return the keys of a target :class:`~configurator.path.Path` up to the first
+    operation that does not use one, such as :meth:`~configurator.path.Path.merge`.
+    """
+    keys = []
+    for op in path.ops:
+        text = getattr(op, 'text', None)
+        if text is None:
+            break
+        keys.append(text)
+    return tuple(keys)
@@ -9,21 +9,91 @@ class ParseError(Exception):
     """
 
 
+class LoadError(Exception):
+    """
+    The exception raised when one of several files being loaded together
+    cannot be read or parsed. The ``path`` attribute gives the file that failed
+    and the original exception is available as ``__cause__``.
+    """
+
+    def __init__(self, path, error):
+        super(LoadError, self).__init__('{}: {!r}'.format(path, error))
+        self.path = path
+
+
 class Parsers(defaultdict):
 
-    # file extension: module name, method name
+    # file extension: backends in order of preference, each being a tuple of
+    # module name, method name
     supported = {
-        'json': ('json', 'load'),
-        'toml': ('configurator._toml', 'load'),
-        'yml': ('yaml', 'safe_load'),
-        'yaml': ('yaml', 'safe_load'),
+        'json': (('configurator._json', 'load'), ('json', 'load')),
+        'toml': (('configurator._toml', 'load'),),
+        'yml': (('configurator._yaml', 'load'), ('yaml', 'safe_load')),
+        'yaml': (('configurator._yaml', 'load'), ('yaml', 'safe_load')),
     }
 
+    # file extensions whose supported parsers can read binary streams
+    binary_supported = {'json', 'toml', 'yml', 'yaml'}
+
+    def __init__(self):
+        super(Parsers, self).__init__()
+        #: The parsers that have been found to accept binary streams.
+        self.binary = set()
+        #: A mapping of file extension to the ``module.method`` name of the
+        #: backend selected for it.
+        self.backends = {}
+
     def __missing__(self, extension):
         try:
-            module_name, parser_name = self.supported[extension]
+            backends = self.supported[extension]
         except KeyError:
             raise ParseError('No parser found for {!r}'.format(extension))
+        if isinstance(backends[0], str):
+            backends = (backends,)
+        error = None
+        for module_name, parser_name in backends:
+            try:
+                module = import_module(module_name)
+                parser = getattr(module, parser_name)
+            except (ImportError, AttributeError) as e:
+                error = e
+            else:
+                break
         else:
-            module = import_module(module_name)
-            return getattr(module, parser_name)
+            raise error
+        if extension in self.binary_supported:
+            self.binary.add(parser)
+        self.backends[extension] = '{}.{}'.format(module_name, parser_name)
+        self[extension] = parser
+        return parser
+
+    def backend(self, extension):
+        """
+        Returns the ``module.method`` name of the backend that will be used to
+        parse files with the supplied ``extension``, selecting it if necessary.
+        """
+        self[extension]
+        return self.backends.get(extension)
+
+    def accepts_binary(self, parser):
+        """
+        Returns ``True`` if the supplied ``parser`` callable is known to
+        accept a stream of :class:`bytes`.
+        """
+        return parser in self.binary
+
+
+class DocumentParsers(Parsers):
+    """
+    Parsers that return an iterable of the documents found in a stream,
+    parsing each one only when it is needed.
+    """
+
+    supported = {
+        'jsonl': (('configurator._jsonl', 'load'),),
+        'ndjson': (('configurator._jsonl', 'load'),),
+        'yml': (('configurator._yaml', 'load_all'), ('yaml', 'safe_load_all')),
+        'yaml': (('configurator._yaml', 'load_all'), ('yaml', 'safe_load_all')),
+    }
+
+    binary_supported = {'jsonl', 'ndjson', 'yml', 'yaml'}
@@ -1,9 +1,82 @@
+from collections.abc import Mapping, Sequence
+from functools import lru_cache
+
+from .merge import _fresh
+
+
 class NotPresent(Exception): pass
 
 
+_set = object.__setattr__
+
+
+class _Identity:
+    # stands in for parameters that can't be hashed, which are compared by identity
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is _Identity and other.value is self.value
+
+    def __hash__(self):
+        return id(self.value)
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return _Identity(value)
+    return value
+
+
 class Op:
+    """
+    The base class for operations in a :class:`Path`. Operations are immutable,
+    with the parameters they are created with stored in the attributes named
+    by ``fields``, and compare equal when of the same type with equal parameters.
+    """
+
+    __slots__ = ('_hash',)
 
     name = 'op'
+    fields = ()
+
+    def __init__(self, *args):
+        for field, arg in zip(self.fields, args):
+            _set(self, field, arg)
+        _set(self, '_hash', None)
+
+    def _args(self):
+        return tuple(getattr(self, field) for field in self.fields)
+
+    def _key(self):
+        return (type(self),) + tuple(_hashable(arg) for arg in self._args())
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        # computed when first needed, as most paths are never hashed
+        if self._hash is None:
+            _set(self, '_hash', hash(self._key()))
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+    def __reduce__(self):
+        return type(self), self._args()
 
     def get(self, data):
         raise TypeError('Cannot use %s() in source' % self.name)
@@ -17,10 +90,20 @@ class Op:
         return data
 
 
-class ItemOp(Op):
+class _KeyOp(Op):
+    # the operations that use a key, which are the most common, so have
+    # their own __init__ for speed
+
+    __slots__ = fields = ('text',)
 
     def __init__(self, text):
-        self.text = text
+        _set(self, 'text', text)
+        _set(self, '_hash', None)
+
+
+class ItemOp(_KeyOp):
+
+    __slots__ = ()
 
     def get(self, data):
         try:
@@ -42,10 +125,9 @@ class ItemOp(Op):
         return '{}[{!r}]'.format(base, self.text)
 
 
-class AttrOp(Op):
+class AttrOp(_KeyOp):
 
-    def __init__(self, text):
-        self.text = text
+    __slots__ = ()
 
     def get(self, data):
         return getattr(data, self.text, NotPresent(self.text))
@@ -60,10 +142,9 @@ class AttrOp(Op):
         return '{}.{}'.format(base, self.text)
 
 
-class TextOp(Op):
+class TextOp(_KeyOp):
 
-    def __init__(self, text):
-        self.text = text
+    __slots__ = ()
 
     def get(self, data):
         getitem = getattr(data, '__getitem__', None)
@@ -94,18 +175,18 @@ class TextOp(Op):
             return setitem(self.text, value)
 
     def str(self, base):
+        text = '\\*' if self.text == '*' else self.text
         if base:
-            return base+'.'+self.text
+            return base+'.'+text
         else:
-            return self.text
+            return text
 
 
 class ConvertOp(Op):
 
-    name = 'convert'
+    __slots__ = fields = ('callable',)
 
-    def __init__(self, callable_):
-        self.callable = callable_
+    name = 'convert'
 
     def get(self, data):
         return self.callable(data)
@@ -117,6 +198,8 @@ class ConvertOp(Op):
 
 class RequiredOp(Op):
 
+    __slots__ = ()
+
     name = 'required'
 
     def get(self, data):
@@ -131,10 +214,9 @@ class RequiredOp(Op):
 
 class IfSuppliedOp(Op):
 
-    name = 'if_supplied'
+    __slots__ = fields = ('false_values',)
 
-    def __init__(self, false_values):
-        self.false_values = false_values
+    name = 'if_supplied'
 
     def get(self, data):
         if data in self.false_values:
@@ -147,10 +229,9 @@ class IfSuppliedOp(Op):
 
 class InsertOp(Op):
 
-    name = 'insert'
+    __slots__ = fields = ('index',)
 
-    def __init__(self, index):
-        self.index = index
+    name = 'insert'
 
     def ensure(self, data):
         value = {}
@@ -166,6 +247,8 @@ class InsertOp(Op):
 
 class AppendOp(Op):
 
+    __slots__ = ()
+
     name = 'append'
 
     def ensure(self, data):
@@ -182,24 +265,58 @@ class AppendOp(Op):
 
 class MergeOp(Op):
 
+    __slots__ = ()
+
     name = 'merge'
 
     def ensure(self, data):
         raise TypeError('merge() must be final operation')
 
     def set(self, data, value, context):
-        return context.merge(data, value)
+        result = context.merge(data, value)
+        if result is value and not data:
+            # there was nothing to merge in, so store a copy rather than the
+            # source's own container, which later changes to the target would modify:
+            result = _fresh(context, value)
+        return result
 
     def str(self, base):
         return '{}.{}()'.format(base, self.name)
 
 
+class EachOp(Op):
+
+    __slots__ = ()
+
+    name = 'each'
+
+    def children(self, data):
+        """
+        Return an iterable of ``(key, value)`` pairs for the children of ``data``
+        or ``None`` if it is not a mapping or sequence.
+        """
+        if isinstance(data, Mapping):
+            return list(data.items())
+        if isinstance(data, Sequence) and not isinstance(data, (str, bytes)):
+            return list(enumerate(data))
+        return None
+
+    def get(self, *args):
+        raise TypeError('Cannot use each() where a single value is required')
+
+    ensure = set = get
+
+    def str(self, base):
+        if base:
+            return base+'.*'
+        return '*'
+
+
 class ValueOp(Op):
 
-    name = 'value'
+    __slots__ = fields = ('value',)
 
-    def __init__(self, value):
-        self.value = value
+    name = 'value'
 
     def get(self, data):
         return self.value
@@ -212,11 +329,44 @@ class Path:
     """
     A generative object used for constructing source or target mappings.
     See :doc:`mapping` for details.
+
+    Paths are immutable and compare equal when they have the same name and
+    operations, so they can be used as dictionary keys.
     """
 
+    __slots__ = ('name', 'ops', '_hash')
+
     def __init__(self, name, *ops):
-        self.name = name
-        self.ops = ops
+        _set(self, 'name', name)
+        _set(self, 'ops', ops)
+        _set(self, '_hash', None)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.name == other.name and self.ops == other.ops
+
+    def __hash__(self):
+        if self._hash is None:
+            _set(self, '_hash', hash((self.name, self.ops)))
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Path is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Path is immutable')
+
+    def __reduce__(self):
+        return type(self), (self.name,) + self.ops
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def _extend(self, op):
         return type(self)(self.name, *(self.ops + (op,)))
@@ -252,6 +402,14 @@ class Path:
         """
         return self._extend(MergeOp())
 
+    def each(self):
+        """
+        Indicate that the rest of the path should be applied to each item of a
+        list or each value of a dictionary. In dotted paths, this is written
+        as ``*``, for example ``servers.*.port``.
+        """
+        return self._extend(EachOp())
+
     def __str__(self):
         str = self.name
         for op in self.ops:
@@ -262,9 +420,62 @@ class Path:
         return 'Path:{}'.format(str(self))
 
 
+def _parse_dotted_part(part):
+    if part == '*':
+        return EachOp()
+    if part == '\\*':
+        # an escaped literal '*' key:
+        return TextOp('*')
+    return TextOp(part)
+
+
+def _parse_dotted(text):
+    return Path('', *(_parse_dotted_part(part) for part in text.split('.')))
+
+
+#: The default maximum number of compiled dotted paths kept by :func:`parse_text`.
+DEFAULT_PARSE_CACHE_SIZE = 1024
+
+
+def set_parse_cache_size(maxsize=DEFAULT_PARSE_CACHE_SIZE):
+    """
+    Set the maximum number of compiled dotted paths that :func:`parse_text`
+    will keep. The existing cache, along with its statistics, is discarded.
+    ``None`` means the cache is unbounded while ``0`` disables caching.
+    """
+    global _parse_dotted_cached
+    _parse_dotted_cached = lru_cache(maxsize)(_parse_dotted)
+
+
+def parse_cache_info():
+    """
+    Return a :func:`~functools.lru_cache` info tuple giving the ``hits``,
+    ``misses``, ``maxsize`` and ``currsize`` of the :func:`parse_text` cache.
+    """
+    return _parse_dotted_cached.cache_info()
+
+
+def clear_parse_cache():
+    """
+    Remove all compiled dotted paths from the :func:`parse_text` cache and
+    reset its statistics.
+    """
+    _parse_dotted_cached.cache_clear()
+
+
+set_parse_cache_size()
+
+
 def parse_text(segment):
+    """
+    Turn the supplied ``segment`` into a :class:`Path`.
+
+    Dotted strings are compiled once and then served from a bounded,
+    thread-safe cache, so the returned :class:`Path` may be shared and must
+    not be modified.
+    """
     if isinstance(segment, str):
-        segment = Path('', *(TextOp(part) for part in segment.split('.')))
+        segment = _parse_dotted_cached(segment)
     elif not isinstance(segment, Path):
         segment = Path('', ItemOp(segment))
     return segment
@@ -1,7 +1,9 @@
+from os.path import expanduser, realpath
+
 from . import Config
 
 
-def load_with_extends(path, key='extends', root=None):
+def load_with_extends(path, key='extends', root=None, track_origins=False):
     """
     Helper for the :ref:`"extends" <extends-pattern>` pattern.
 
@@ -13,16 +15,73 @@ def load_with_extends(path, key='extends', root=None):
       If supplied, configuration is extracted from this key at the root of
       each configuration file that is loaded, provided it is present. If missing
       from any file, the whole configuration from that file is used instead.
+    :param track_origins:
+      If ``True``, the :class:`~configurator.Config` returned will
+      :meth:`track the origins <configurator.Config.track_origins>` of its values,
+      with the path of the file each was loaded from as its origin.
+    """
+    return ExtendsResolver(key, root, track_origins).load(path)
+
+
+class ExtendsResolver:
+    """
+    Resolves configuration files using the :ref:`"extends" <extends-pattern>`
+    pattern, as :func:`load_with_extends` does, for use when many files extend
+    the same base files.
+
+    Each file is parsed at most once for the lifetime of the resolver, and the
+    result of merging each file with all of the files it extends is kept, so
+    chains that share base files only merge those bases once.
+
+    ``key``, ``root`` and ``track_origins`` are as described in
+    :func:`load_with_extends`.
+    A :class:`ValueError` is raised if files extend each other in a cycle.
     """
-    configs = []
-    while path:
+
+    def __init__(self, key='extends', root=None, track_origins=False):
+        self.key = key
+        self.root = root
+        self.track_origins = track_origins
+        self._merged = {}
+
+    def _layer(self, path):
         config = Config.from_path(path)
-        if root is not None and root in config:
-            config = config[root]
-        configs.append(config)
-        path = config.get(key)
-    config = Config()
-    for layer in reversed(configs):
-        config.merge(layer)
-    config.data.pop(key, None)
-    return config
+        if self.root is not None and self.root in config:
+            config = config[self.root]
+        return config
+
+    def load(self, path):
+        """
+        Return a new :class:`~configurator.Config` for the file at ``path``,
+        merged on top of all of the files that it extends.
+        """
+        paths = []
+        layers = []
+        base = None
+        while path:
+            full_path = realpath(expanduser(path))
+            base = self._merged.get(full_path)
+            if base is not None:
+                break
+            if full_path in paths:
+                raise ValueError('extends cycle: '+' -> '.join(paths+[full_path]))
+            layer = self._layer(full_path)
+            paths.append(full_path)
+            layers.append(layer)
+            path = layer.get(self.key)
+        for full_path, layer in reversed(list(zip(paths, layers))):
+            config = Config()
+            if self.track_origins:
+                config.track_origins()
+            if base is not None:
+                config.merge(base)
+            config.merge(layer, origin=full_path)
+            self._merged[full_path] = base = config
+        if base is None:
+            config = Config()
+            if self.track_origins:
+                config.track_origins()
+            return config
+        config = base.clone()
+        config.data.pop(self.key, None)
+        return config
@@ -0,0 +1,129 @@
+"""
+Read-only configuration that can be shared between processes without each one
+holding its own copy.
+"""
+import mmap
+import sys
+
+from .config import Config
+from .frozen import freeze, view
+from .node import ConfigNode
+
+
+def _data(config):
+    if isinstance(config, ConfigNode):
+        return config.data
+    return config
+
+
+class SharedConfig:
+    """
+    A read-only :class:`~configurator.Config` stored in a
+    :class:`multiprocessing.shared_memory.SharedMemory` segment in the
+    :mod:`frozen <configurator.frozen>` format.
+
+    Processes forked after it is created, or that :meth:`attach` to it by
+    :attr:`name`, read the same memory through the normal
+    :class:`~configurator.node.ConfigNode` interface without unpickling or copying it.
+    Pickling a :class:`SharedConfig`, such as when passing it to a process pool,
+    only sends its name.
+
+    Use :meth:`create` or :meth:`attach` to obtain instances.
+    """
+
+    def __init__(self, memory):
+        self._memory = memory
+        self._config = None
+
+    @classmethod
+    def create(cls, config, name=None):
+        """
+        Create a new shared memory segment, named ``name`` if supplied,
+        containing the data of ``config``, which may be a
+        :class:`~configurator.node.ConfigNode` or plain python data.
+        """
+        from multiprocessing.shared_memory import SharedMemory
+        payload = freeze(_data(config))
+        memory = SharedMemory(name=name, create=True, size=len(payload))
+        memory.buf[:len(payload)] = payload
+        return cls(memory)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attach to an existing shared memory segment created by :meth:`create`.
+        """
+        from multiprocessing.shared_memory import SharedMemory
+        if sys.version_info >= (3, 13):
+            memory = SharedMemory(name=name, track=False)
+        else:
+            memory = SharedMemory(name=name)
+            # stop the resource tracker unlinking the segment when this process exits,
+            # it registers the name with the leading slash that .name strips:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister('/' + memory.name, 'shared_memory')
+        return cls(memory)
+
+    @property
+    def name(self):
+        """
+        The name of the shared memory segment.
+        """
+        return self._memory.name
+
+    @property
+    def config(self):
+        """
+        A read-only :class:`~configurator.Config` over the shared data.
+        """
+        if self._config is None:
+            buffer = self._memory.buf
+            if buffer is None:
+                raise ValueError('{} is closed'.format(self.name))
+            self._config = Config(view(buffer))
+        return self._config
+
+    def close(self):
+        """
+        Stop using the shared memory from this process. Any nodes or data obtained
+        from :attr:`config` must no longer be used.
+        """
+        self._config = None
+        self._memory.close()
+
+    def unlink(self):
+        """
+        Request that the shared memory segment be destroyed once all processes
+        have closed it. This should be called once, by the creating process.
+        """
+        self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __reduce__(self):
+        return type(self).attach, (self.name,)
+
+
+def save_frozen(config, path):
+    """
+    Write the data of ``config``, which may be a :class:`~configurator.node.ConfigNode`
+    or plain python data, to a file at ``path`` in the
+    :mod:`frozen <configurator.frozen>` format for use with :func:`load_mapped`.
+    """
+    with open(path, 'wb') as f:
+        f.write(freeze(_data(config)))
+
+
+def load_mapped(path):
+    """
+    Return a read-only :class:`~configurator.Config` over a file written by
+    :func:`save_frozen`. The file is memory mapped, so all processes loading it
+    share the same pages.
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Config(view(buffer))
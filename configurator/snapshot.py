@@ -0,0 +1,80 @@
+import os
+import pickle
+from os.path import dirname, abspath
+from struct import Struct
+from tempfile import NamedTemporaryFile
+from zlib import crc32
+
+from .cache import stat_key
+
+MAGIC = b'CFGSNAP\0'
+
+#: The version of the snapshot format written by :func:`save_snapshot`. Snapshots
+#: of any other version are rejected by :func:`load_snapshot`.
+VERSION = 1
+
+# magic, version, payload length, payload checksum
+_header = Struct('>8sHQI')
+
+
+class SnapshotError(Exception):
+    """
+    The exception raised when a snapshot cannot be loaded because it is corrupt,
+    was written with a different format version or is stale.
+    """
+
+
+def save_snapshot(data, path, sources=()):
+    """
+    Write ``data`` to a snapshot file at ``path``.
+
+    ``sources`` may be a sequence of paths to the files that ``data`` was built
+    from. Their modification times and sizes are recorded so that
+    :func:`load_snapshot` can reject the snapshot once any of them change.
+    """
+    payload = pickle.dumps(
+        ([stat_key(source) for source in sources], data), pickle.HIGHEST_PROTOCOL
+    )
+    header = _header.pack(MAGIC, VERSION, len(payload), crc32(payload))
+    path = abspath(path)
+    with NamedTemporaryFile('wb', dir=dirname(path), suffix='.tmp', delete=False) as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(f.name, path)
+
+
+def load_snapshot(path):
+    """
+    Return the data stored in the snapshot file at ``path``, raising a
+    :class:`SnapshotError` if the snapshot is corrupt, has a different format
+    version or was built from source files that have since changed.
+
+    .. warning::
+
+      Snapshots are unpickled, so should only be loaded from trusted locations.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if len(content) < _header.size:
+        raise SnapshotError('{}: truncated header'.format(path))
+    magic, version, length, checksum = _header.unpack_from(content)
+    if magic != MAGIC:
+        raise SnapshotError('{}: not a snapshot'.format(path))
+    if version != VERSION:
+        raise SnapshotError('{}: version {} is not {}'.format(path, version, VERSION))
+    payload = memoryview(content)[_header.size:]
+    if len(payload) != length or crc32(payload) != checksum:
+        raise SnapshotError('{}: checksum mismatch'.format(path))
+    try:
+        sources, data = pickle.loads(payload)
+    except Exception as e:
+        # unpicklable, from an unsupported pickle protocol or of the wrong shape:
+        raise SnapshotError('{}: invalid payload: {!r}'.format(path, e)) from e
+    for source in sources:
+        try:
+            current = stat_key(source[0])
+        except OSError:
+            current = None
+        if current != source:
+            raise SnapshotError('{}: stale as {} has changed'.format(path, source[0]))
+    return data
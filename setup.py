@@ -24,6 +24,7 @@ setup(
     include_package_data=True,
     python_requires=">=3.6",
     extras_require=dict(
+        json=['orjson'],
         yaml=['pyyaml'],
         toml=['tomli; python_version < "3.11"'],
         test=[
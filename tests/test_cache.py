@@ -0,0 +1,169 @@
+import json
+import os
+
+from testfixtures import compare
+
+from configurator import Config
+from configurator.cache import ParseCache, parser_key
+
+
+class CountingParser:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, stream):
+        self.calls += 1
+        return json.load(stream)
+
+
+class TestParseCache:
+
+    def test_hit(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        parser = CountingParser()
+        compare(Config.from_path(path, parser, cache=cache).data, expected={'x': 1})
+        compare(Config.from_path(path, parser, cache=cache).data, expected={'x': 1})
+        compare(parser.calls, expected=1)
+
+    def test_guessed_parser(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        Config.from_path(path, cache=cache)
+        compare(Config.from_path(path, cache=cache).data, expected={'x': 1})
+        compare(len(os.listdir(dir.getpath('cache'))), expected=1)
+
+    def test_file_changed(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        parser = CountingParser()
+        Config.from_path(path, parser, cache=cache)
+        dir.write('file.json', '{"x": 22}')
+        compare(Config.from_path(path, parser, cache=cache).data, expected={'x': 22})
+        compare(parser.calls, expected=2)
+
+    def test_different_parser(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        Config.from_path(path, cache=cache)
+
+        def other(stream):
+            return {'other': json.load(stream)}
+
+        config = Config.from_path(path, other, cache=cache)
+        compare(config.data, expected={'other': {'x': 1}})
+
+    def test_different_parsers_same_file(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        parser = CountingParser()
+        calls = []
+
+        def other(stream):
+            calls.append(stream)
+            return {'other': json.load(stream)}
+
+        for _ in range(2):
+            compare(Config.from_path(path, parser, cache=cache).data, expected={'x': 1})
+            compare(Config.from_path(path, other, cache=cache).data,
+                    expected={'other': {'x': 1}})
+        compare(parser.calls, expected=1)
+        compare(len(calls), expected=1)
+        compare(len(os.listdir(dir.getpath('cache'))), expected=2)
+        cache.invalidate(path)
+        compare(os.listdir(dir.getpath('cache')), expected=[])
+
+    def test_different_encodings(self, dir):
+        path = dir.write('file.json', u'{"x": "\u00a3"}', encoding='utf-8')
+        cache = ParseCache(dir.getpath('cache'))
+        for _ in range(2):
+            compare(Config.from_path(path, cache=cache, encoding='latin-1').data,
+                    expected={'x': u'\u00c2\u00a3'})
+            compare(Config.from_path(path, cache=cache).data, expected={'x': u'\u00a3'})
+        compare(len(os.listdir(dir.getpath('cache'))), expected=2)
+
+    def test_corrupt_entry(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        parser = CountingParser()
+        Config.from_path(path, parser, cache=cache)
+        entry, = os.listdir(dir.getpath('cache'))
+        dir.write(('cache', entry), 'junk')
+        compare(Config.from_path(path, parser, cache=cache).data, expected={'x': 1})
+        compare(parser.calls, expected=2)
+
+    def test_invalidate_path(self, dir):
+        path1 = dir.write('file1.json', '{"x": 1}')
+        path2 = dir.write('file2.json', '{"x": 2}')
+        cache = ParseCache(dir.getpath('cache'))
+        parser = CountingParser()
+        Config.from_path(path1, parser, cache=cache)
+        Config.from_path(path2, parser, cache=cache)
+        cache.invalidate(path1)
+        Config.from_path(path1, parser, cache=cache)
+        Config.from_path(path2, parser, cache=cache)
+        compare(parser.calls, expected=3)
+
+    def test_invalidate_all(self, dir):
+        path = dir.write('file.json', '{"x": 1}')
+        cache = ParseCache(dir.getpath('cache'))
+        Config.from_path(path, cache=cache)
+        cache.invalidate()
+        compare(os.listdir(dir.getpath('cache')), expected=[])
+
+    def test_evict_by_size(self, dir):
+        cache = ParseCache(dir.getpath('cache'), max_size=1)
+        path1 = dir.write('file1.json', '{"x": 1}')
+        path2 = dir.write('file2.json', '{"x": 2}')
+        Config.from_path(path1, cache=cache)
+        Config.from_path(path2, cache=cache)
+        compare(os.listdir(dir.getpath('cache')), expected=[])
+
+    def test_evict_by_age(self, dir):
+        cache = ParseCache(dir.getpath('cache'), max_age=60)
+        path1 = dir.write('file1.json', '{"x": 1}')
+        path2 = dir.write('file2.json', '{"x": 2}')
+        Config.from_path(path1, cache=cache)
+        entry, = os.listdir(dir.getpath('cache'))
+        os.utime(dir.getpath(('cache', entry)), (0, 0))
+        Config.from_path(path2, cache=cache)
+        remaining = os.listdir(dir.getpath('cache'))
+        compare(len(remaining), expected=1)
+        assert entry not in remaining
+
+    def test_optional_missing(self, dir):
+        cache = ParseCache(dir.getpath('cache'))
+        config = Config.from_path(dir.getpath('nope.json'), optional=True, cache=cache)
+        compare(config.data, expected={})
+
+
+def make_parser(wrapped):
+    def parser(stream):
+        return wrapped(stream)
+    return parser
+
+
+def make_other_parser(wrapped):
+    def parser(stream):
+        return {'other': wrapped(stream)}
+    return parser
+
+
+class TestParserKey:
+
+    def test_function(self):
+        compare(parser_key(json.load), expected='json.load')
+
+    def test_instance(self):
+        compare(parser_key(CountingParser()), expected='tests.test_cache.CountingParser')
+
+    def test_bound_method(self):
+        compare(parser_key(CountingParser().__call__),
+                expected='tests.test_cache.CountingParser.__call__')
+
+    def test_local_functions(self):
+        key = parser_key(make_parser(json.load))
+        compare(key, expected=parser_key(make_parser(json.load)))
+        assert key != parser_key(make_other_parser(json.load))
+        assert key.startswith('tests.test_cache.make_parser.<locals>.parser:')
@@ -1,13 +1,19 @@
+import json
 from ast import literal_eval
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tempfile import NamedTemporaryFile
+from threading import Event
+from time import sleep
 
 import pickle
 import pytest
 
 from configurator import Config, default_mergers
+from configurator.merge import merge_dict, in_place_mergers
 from io import StringIO
-from configurator.parsers import ParseError
+from configurator.parsers import ParseError, Parsers, LoadError
 from configurator.mapping import source, target, convert, value
 from testfixtures import compare, ShouldRaise, TempDirectory, Replace
 
@@ -106,6 +112,60 @@ class TestInstantiation:
             config = Config.from_path(Path(source.name), 'json', encoding='latin-1')
         compare(config.x, expected=u'\xa3')
 
+    def test_path_binary_parser(self):
+        streams = []
+        def parser(stream):
+            streams.append(stream)
+            return json.load(stream)
+        parsers = Parsers()
+        parsers.binary.add(parser)
+        with NamedTemporaryFile() as source:
+            source.write('{"x": "\u00a3"}'.encode('utf-8'))
+            source.flush()
+            with Replace('configurator.config.Config.parsers', parsers):
+                config = Config.from_path(source.name, parser)
+        compare(config.x, expected=u'\xa3')
+        compare(streams[0].mode, expected='rb')
+
+    def test_path_binary_parser_with_encoding(self):
+        with NamedTemporaryFile(suffix='.json') as source:
+            source.write(b'{"x": "\xa3"}')
+            source.flush()
+            config = Config.from_path(source.name, encoding='latin-1')
+        compare(config.x, expected=u'\xa3')
+
+    def test_path_binary_parser_decodes_utf8(self):
+        with NamedTemporaryFile(suffix='.json') as source:
+            source.write('{"x": "\u00a3"}'.encode('utf-8'))
+            source.flush()
+            config = Config.from_path(source.name)
+        compare(config.x, expected=u'\xa3')
+
+    def test_path_binary_parser_decodes_byte_order_mark(self):
+        with NamedTemporaryFile(suffix='.json') as source:
+            source.write('{"x": "\u00a3"}'.encode('utf-16'))
+            source.flush()
+            config = Config.from_path(source.name)
+        compare(config.x, expected=u'\xa3')
+
+    def test_path_text_only_parser(self):
+        streams = []
+        def parser(stream):
+            streams.append(stream)
+            return python_literal(stream)
+        with NamedTemporaryFile() as source:
+            source.write(b'{"x": 1}')
+            source.flush()
+            config = Config.from_path(source.name, parser)
+        compare(config.x, expected=1)
+        compare(streams[0].mode, expected='r')
+
+    def test_path_default_parsers_accept_binary(self):
+        parsers = Parsers()
+        assert parsers.accepts_binary(parsers['json'])
+        assert parsers.accepts_binary(parsers['toml'])
+        assert not parsers.accepts_binary(python_literal)
+
     def test_stream_with_name_guess_parser(self):
         with NamedTemporaryFile(suffix='.json') as source:
             source.write(b'{"x": 1}')
@@ -129,6 +189,110 @@ class TestInstantiation:
         config = Config.from_stream(source, python_literal)
         compare(config.x, expected=1)
 
+    def test_documents_yaml(self, skip_no_yaml):
+        source = StringIO(u'x: 1\ny: [1]\n---\n---\ny: [2]\nz: 3\n')
+        config = Config.from_documents(source, 'yaml')
+        compare(config.data, expected={'x': 1, 'y': [1, 2], 'z': 3})
+
+    def test_documents_jsonl_guess_parser(self):
+        with NamedTemporaryFile(suffix='.jsonl') as source:
+            source.write(b'{"x": 1, "y": {"a": 1}}\n\n{"y": {"b": 2}}\n')
+            source.flush()
+            source.seek(0)
+            config = Config.from_documents(source)
+        compare(config.data, expected={'x': 1, 'y': {'a': 1, 'b': 2}})
+
+    def test_documents_merged_as_they_arrive(self):
+        events = []
+        def parser(stream):
+            for line in stream:
+                events.append('read')
+                yield literal_eval(line)
+        def merge(context, source, target):
+            events.append('merge')
+            return merge_dict(context, source, target)
+        config = Config.from_documents(
+            StringIO(u"{'x': 1}\n{'y': 2}\n"), parser, mergers={dict: merge}
+        )
+        compare(events, expected=['read', 'merge', 'read', 'merge'])
+        compare(config.data, expected={'x': 1, 'y': 2})
+
+    def test_documents_mergers(self):
+        def replace(context, source, target):
+            return source
+        config = Config.from_documents(
+            StringIO(u'{"x": [1]}\n{"x": [2]}\n'), 'jsonl',
+            mergers=default_mergers+{list: replace}
+        )
+        compare(config.data, expected={'x': [2]})
+
+    def test_documents_no_parser(self):
+        with ShouldRaise(ParseError("No parser found for 'json'")):
+            Config.from_documents(StringIO(u'{}'), 'json')
+
+    def test_paths(self, dir):
+        path1 = dir.write('a.json', '{"x": 1, "y": [1]}')
+        path2 = dir.write('b.json', '{"x": 2, "y": [2]}')
+        path3 = dir.write('c.json', '{"z": 3, "y": [3]}')
+        config = Config.from_paths([path1, path2, path3], workers=2)
+        compare(config.data, expected={'x': 2, 'y': [1, 2, 3], 'z': 3})
+
+    def test_paths_same_as_sequential(self, dir):
+        paths = [dir.write('{}.json'.format(i), json.dumps({'x': i, 'l': [i]}))
+                 for i in range(20)]
+        expected = Config()
+        for path in paths:
+            expected.merge(Config.from_path(path))
+        compare(Config.from_paths(paths).data, expected=expected.data)
+
+    def test_paths_empty(self):
+        compare(Config.from_paths([]).data, expected={})
+
+    def test_paths_optional(self, dir):
+        path = dir.write('a.json', '{"x": 1}')
+        config = Config.from_paths([path, dir.getpath('b.json')], optional=True)
+        compare(config.data, expected={'x': 1})
+
+    def test_paths_mergers(self, dir):
+        path1 = dir.write('a.json', '{"y": [1]}')
+        path2 = dir.write('b.json', '{"y": [2]}')
+        def replace(context, source, target):
+            return source
+        config = Config.from_paths([path1, path2], mergers=default_mergers+{list: replace})
+        compare(config.data, expected={'y': [2]})
+
+    def test_paths_error(self, dir):
+        path1 = dir.write('a.json', '{"x": 1}')
+        path2 = dir.write('b.json', '{"x": ')
+        with ShouldRaise(LoadError) as s:
+            Config.from_paths([path1, path2])
+        compare(s.raised.path, expected=path2)
+        assert str(s.raised).startswith(path2+': JSONDecodeError(')
+        assert isinstance(s.raised.__cause__, ValueError)
+
+    def test_paths_executor(self, dir):
+        path = dir.write('a.json', '{"x": 1}')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            config = Config.from_paths([path], executor=executor)
+            compare(config.data, expected={'x': 1})
+            # the executor is not shut down:
+            executor.submit(int).result()
+
+    def test_directory(self, dir):
+        dir.write('20-b.json', '{"x": 2, "y": [2]}')
+        dir.write('10-a.json', '{"x": 1, "y": [1]}')
+        dir.write('README', 'ignored')
+        dir.write('notes.txt', 'ignored')
+        dir.makedir('30-sub.json')
+        config = Config.from_directory(dir.path)
+        compare(config.data, expected={'x': 2, 'y': [1, 2]})
+
+    def test_directory_pattern(self, dir):
+        dir.write('a.conf', '{"x": 1}')
+        dir.write('b.json', '{"x": 2}')
+        config = Config.from_directory(dir.path, pattern='*.conf', parser='json')
+        compare(config.data, expected={'x': 1})
+
     @pytest.fixture()
     def env(self):
         env = {}
@@ -150,6 +314,14 @@ class TestInstantiation:
             'bob': {'bar': 'two'}
         })
 
+    def test_from_env_overlapping_prefixes(self, env):
+        env['APP_DB_HOST'] = 'h'
+        config = Config.from_env({'APP_': 'a', 'APP_DB_': 'db'})
+        compare(config.data, expected={
+            'a': {'db_host': 'h'},
+            'db': {'host': 'h'},
+        })
+
     def test_from_env_target_dotted_string(self, env):
         env['FOO_BAR'] = 'one'
         env['FOO_BAZ'] = 'two'
@@ -179,6 +351,133 @@ class TestInstantiation:
         compare(config.data, expected={})
 
 
+class TestLazy:
+
+    @pytest.fixture()
+    def calls(self):
+        return []
+
+    @pytest.fixture()
+    def parser(self, calls):
+        def parser(stream):
+            calls.append(stream)
+            return json.load(stream)
+        return parser
+
+    @pytest.fixture()
+    def path(self, dir):
+        return dir.write('config.json', '{"x": {"y": 1}, "z": [1]}')
+
+    def test_path_attribute_access(self, path, parser, calls):
+        config = Config.from_path(path, parser, lazy=True)
+        compare(calls, expected=[])
+        compare(config.x.y, expected=1)
+        compare(config.z[0], expected=1)
+        compare(len(calls), expected=1)
+
+    def test_path_item_access(self, path, parser, calls):
+        config = Config.from_path(path, parser, lazy=True)
+        compare(config['x']['y'], expected=1)
+        compare(len(calls), expected=1)
+
+    def test_path_node(self, path, parser, calls):
+        config = Config.from_path(path, parser, lazy=True)
+        compare(config.node('x.y').data, expected=1)
+        compare(len(calls), expected=1)
+
+    def test_path_data(self, path):
+        config = Config.from_path(path, lazy=True)
+        compare(config.data, expected={'x': {'y': 1}, 'z': [1]})
+
+    def test_path_merge(self, path, parser, calls):
+        config = Config.from_path(path, parser, lazy=True)
+        config.merge({'z': [2]})
+        compare(config.data, expected={'x': {'y': 1}, 'z': [1, 2]})
+        compare(len(calls), expected=1)
+
+    def test_path_merged_into_another(self, path):
+        config = Config({'a': 1})
+        config.merge(Config.from_path(path, lazy=True))
+        compare(config.data, expected={'a': 1, 'x': {'y': 1}, 'z': [1]})
+
+    def test_path_setitem(self, path):
+        config = Config.from_path(path, lazy=True)
+        config['a'] = 1
+        compare(config.data, expected={'a': 1, 'x': {'y': 1}, 'z': [1]})
+
+    def test_path_never_used(self, dir):
+        Config.from_path(dir.getpath('missing.json'), lazy=True)
+
+    def test_path_missing(self, dir):
+        config = Config.from_path(dir.getpath('missing.json'), lazy=True)
+        with ShouldRaise(FileNotFoundError):
+            config.data
+        with ShouldRaise(FileNotFoundError):
+            config.x
+
+    def test_path_optional(self, dir):
+        config = Config.from_path(dir.getpath('missing.json'), optional=True, lazy=True)
+        compare(config.data, expected={})
+
+    def test_stream(self, parser, calls):
+        source = StringIO(u'{"x": 1}')
+        config = Config.from_stream(source, parser, lazy=True)
+        compare(calls, expected=[])
+        compare(config.x, expected=1)
+        compare(config.x, expected=1)
+        compare(calls, expected=[source])
+
+    def test_first_access_from_many_threads(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            sleep(0.01)
+            return {'x': 1}
+
+        config = Config._lazy(loader)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: config.x, range(4)))
+        compare(results, expected=[1, 1, 1, 1])
+        compare(calls, expected=[1])
+
+    def test_unrelated_configs_load_independently(self):
+        started = Event()
+        release = Event()
+        timed_out = []
+
+        def slow():
+            started.set()
+            timed_out.append(not release.wait(1))
+            return {'x': 1}
+
+        slow_config = Config._lazy(slow)
+        other = Config._lazy(lambda: {'y': 2})
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(lambda: slow_config.x)
+            started.wait(1)
+            compare(other.y, expected=2)
+            release.set()
+            compare(future.result(), expected=1)
+        compare(timed_out, expected=[False])
+
+    def test_repr(self, path):
+        config = Config.from_path(path, lazy=True)
+        compare(repr(config), expected=(
+            "configurator.config.Config({'x': {'y': 1}, 'z': [1]})"
+        ))
+
+    def test_pickle(self, path):
+        config = Config.from_path(path, lazy=True)
+        compare(pickle.loads(pickle.dumps(config)).data, expected={'x': {'y': 1}, 'z': [1]})
+
+    def test_push_pop(self, path):
+        config = Config.from_path(path, lazy=True)
+        with config.push({'a': 1}):
+            compare(config.data, expected={'a': 1, 'x': {'y': 1}, 'z': [1]})
+        compare(config.data, expected={'x': {'y': 1}, 'z': [1]})
+
+
 class TestPushPop:
 
     def test_push_pop(self):
@@ -366,6 +665,205 @@ class TestMergeTests:
         config1.merge(config2, mergers=default_mergers+{tuple: concat})
         compare(config1.data, expected={'x': (1, 2, 3, 4)})
 
+    def test_untouched_subtrees_shared(self):
+        base = {'big': {'a': {'b': 1}}, 'small': {'x': 1}, 'other': {'y': 2}}
+        config = Config(base)
+        config.merge({'small': {'x': 2}})
+        compare(config.data, expected={
+            'big': {'a': {'b': 1}}, 'small': {'x': 2}, 'other': {'y': 2}
+        })
+        assert config.data is not base
+        assert config.data['big'] is base['big']
+        assert config.data['other'] is base['other']
+        assert config.data['small'] is not base['small']
+        compare(base['small'], expected={'x': 1})
+
+    def test_unchanged_target_returned(self):
+        base = {'a': {'b': 1}, 'c': 2}
+        config = Config(base)
+        config.merge({'a': {}})
+        assert config.data is base
+
+    def test_same_leaf_not_copied(self):
+        leaf = object()
+        base = {'a': {'b': leaf}}
+        config = Config(base)
+        config.merge({'a': {'b': leaf}})
+        assert config.data is base
+
+    def test_new_subtrees_not_shared_with_source(self):
+        source_data = {'a': {'b': {'c': 1}}}
+        config = Config()
+        config.merge(source_data)
+        compare(config.data, expected=source_data)
+        assert config.data['a'] is not source_data['a']
+        assert config.data['a']['b'] is not source_data['a']['b']
+
+    def test_in_place(self):
+        base = {'a': {'b': 1}, 'l': [1], 'c': {'d': 2}}
+        a, l, c = base['a'], base['l'], base['c']
+        config = Config(base)
+        new = {'e': {'f': 3}}
+        config.merge({'a': {'b': 2}, 'l': [2], 'x': 'y', 'new': new}, in_place=True)
+        compare(config.data, expected={
+            'a': {'b': 2}, 'l': [1, 2], 'c': {'d': 2}, 'x': 'y', 'new': {'e': {'f': 3}},
+        })
+        assert config.data is base
+        assert config.data['a'] is a
+        assert config.data['l'] is l
+        assert config.data['c'] is c
+        assert config.data['new'] is not new
+        assert config.data['new']['e'] is not new['e']
+
+    def test_in_place_same_as_copying(self):
+        base = {'a': {'b': 1, 'c': [1]}, 'd': 1, 'e': {'f': 'g'}}
+        source_data = {'a': {'b': 2, 'c': [2], 'h': {}}, 'd': {'x': 1}, 'e': 'e'}
+        expected = Config(deepcopy(base))
+        expected.merge(source_data)
+        config = Config(deepcopy(base))
+        config.merge(source_data, in_place=True)
+        compare(config.data, expected=expected.data)
+
+    def test_in_place_does_not_change_source(self):
+        source_data = {'d': {'x': 1}, 'l': [1]}
+        config = Config({'d': 1, 'l': 'x'})
+        config.merge(source_data, in_place=True)
+        config.merge({'d': {'y': 2}, 'l': [2]}, in_place=True)
+        compare(config.data, expected={'d': {'x': 1, 'y': 2}, 'l': [1, 2]})
+        compare(source_data, expected={'d': {'x': 1}, 'l': [1]})
+
+    def test_in_place_after_copy_does_not_change_source(self):
+        defaults = {'servers': ['a'], 'db': {'host': 'x'}}
+        config = Config({'servers': None, 'db': 1})
+        config.merge(defaults)
+        config.merge({'servers': ['b'], 'db': {'port': 1}}, in_place=True)
+        compare(config.data, expected={'servers': ['a', 'b'], 'db': {'host': 'x', 'port': 1}})
+        compare(defaults, expected={'servers': ['a'], 'db': {'host': 'x'}})
+
+    def test_in_place_after_merge_all_does_not_change_source(self):
+        defaults = {'servers': ['a'], 'db': {'host': 'x'}}
+        config = Config({'servers': None, 'db': 1})
+        config.merge_all({}, defaults)
+        config.merge({'servers': ['b'], 'db': {'port': 1}}, in_place=True)
+        compare(config.data, expected={'servers': ['a', 'b'], 'db': {'host': 'x', 'port': 1}})
+        compare(defaults, expected={'servers': ['a'], 'db': {'host': 'x'}})
+
+    def test_in_place_explicit_mergers(self):
+        config = Config({'x': [1, 2]})
+        def replace(context, source, target):
+            return source
+        config.merge({'x': [3]}, mergers=default_mergers+{list: replace}, in_place=True)
+        compare(config.data, expected={'x': [3]})
+
+    def test_in_place_with_mapping(self):
+        config = Config()
+        with ShouldRaise(TypeError('in_place cannot be used with a mapping')):
+            config.merge({'x': 1}, mapping={'x': 'y'}, in_place=True)
+
+    def test_in_place_push_pop(self):
+        config = Config({'a': {'b': 1}, 'l': [1]})
+        with config.push({'a': {'c': 2}}):
+            config.merge({'a': {'b': 3}, 'l': [2]}, in_place=True)
+            compare(config.data, expected={'a': {'b': 3, 'c': 2}, 'l': [1, 2]})
+        compare(config.data, expected={'a': {'b': 1}, 'l': [1]})
+
+    def test_in_place_push_empty_pop(self):
+        pushed = {'a': {'b': 1}}
+        config = Config({'x': 1})
+        config.push(pushed, empty=True)
+        config.merge({'a': {'b': 2}}, in_place=True)
+        compare(pushed, expected={'a': {'b': 1}})
+        config.pop()
+        compare(config.data, expected={'x': 1})
+
+    def test_merge_all(self):
+        config = Config({'a': {'b': 1}, 'l': [1], 'x': 1})
+        config.merge_all(
+            {'a': {'c': 2}, 'l': [2]},
+            Config({'a': {'b': 3}, 'x': {'y': 1}}),
+            {'l': [3], 'x': {'z': 2}},
+        )
+        compare(config.data, expected={
+            'a': {'b': 3, 'c': 2}, 'l': [1, 2, 3], 'x': {'y': 1, 'z': 2},
+        })
+
+    def test_merge_all_same_as_sequential(self):
+        base = {'a': {'b': 1, 'c': [1]}, 'd': 1, 'e': {'f': 'g'}, 'k': {'l': 1}}
+        sources = [
+            {'a': {'b': 2, 'c': [2], 'h': {}}, 'd': {'x': 1}, 'e': 'e'},
+            {'a': {'c': 3, 'h': {'i': 1}}, 'd': {'y': [1]}, 'e': {'f': 'h'}},
+            {'a': {'c': [4]}, 'd': {'y': [2]}, 'k': [1], 'm': {'n': 1}},
+            {'k': {'l': 2}, 'm': {'o': 2}},
+        ]
+        expected = Config(deepcopy(base))
+        for source_data in sources:
+            expected.merge(source_data)
+        config = Config(deepcopy(base))
+        config.merge_all(*sources)
+        compare(config.data, expected=expected.data)
+
+    def test_merge_all_does_not_share(self):
+        sources = [{'a': {'b': 1}, 'l': [1]}, {'a': {'c': 2}}]
+        config = Config()
+        config.merge_all(*sources)
+        compare(config.data, expected={'a': {'b': 1, 'c': 2}, 'l': [1]})
+        assert config.data['a'] is not sources[0]['a']
+        assert config.data['l'] is not sources[0]['l']
+
+    def test_merge_all_unchanged_shared(self):
+        base = {'a': {'b': 1}, 'c': {'d': 2}}
+        a, c = base['a'], base['c']
+        config = Config(base)
+        config.merge_all({'a': {'b': 1}}, {'x': 1})
+        compare(config.data, expected={'a': {'b': 1}, 'c': {'d': 2}, 'x': 1})
+        assert config.data['a'] is a
+        assert config.data['c'] is c
+
+    def test_merge_all_nothing(self):
+        data = {'x': 1}
+        config = Config(data)
+        config.merge_all()
+        assert config.data is data
+
+    def test_merge_all_wrong_type(self):
+        config = Config({'x': 1})
+        with ShouldRaise(TypeError(
+            "Cannot merge <class 'list'> with <class 'dict'>"
+        )):
+            config.merge_all({'y': 2}, [1])
+        compare(config.data, expected={'x': 1})
+
+    def test_merge_all_custom_mergers(self):
+        def replace(context, source, target):
+            return source
+        config = Config({'x': [1, 2], 'y': {'z': 1}})
+        config.merge_all(
+            {'x': [3], 'y': {'a': 2}}, {'x': [4]},
+            mergers=default_mergers+{list: replace},
+        )
+        compare(config.data, expected={'x': [4], 'y': {'z': 1, 'a': 2}})
+
+    def test_merge_all_custom_merger_type_error(self):
+        def strict(context, source, target):
+            if target:
+                raise TypeError('no')
+            return source
+        config = Config({'x': [1]})
+        config.merge_all(
+            {'x': [2]}, {'x': [3]},
+            mergers=default_mergers+{list: strict},
+        )
+        compare(config.data, expected={'x': [3]})
+
+    def test_merge_all_in_place_mergers(self):
+        base = {'a': {'b': 1}, 'l': [1]}
+        a = base['a']
+        config = Config(base)
+        config.merge_all({'a': {'c': 2}}, {'l': [2]}, mergers=in_place_mergers)
+        compare(config.data, expected={'a': {'b': 1, 'c': 2}, 'l': [1, 2]})
+        assert config.data is base
+        assert config.data['a'] is a
+
     def test_mapping_paths(self):
         config = Config({'x': 'old'})
         data = {'foo': 'bar'}
@@ -506,6 +1004,19 @@ class TestSerialization:
         config_ = pickle.loads(data)
         compare(expected=config, actual=config_)
 
+    def test_unpickle_from_3_2_0(self):
+        data = (
+            b'\x80\x02cconfigurator.config\nConfig\nq\x00)\x81q\x01}q\x02(X\n\x00'
+            b'\x00\x00_containerq\x03NX\t\x00\x00\x00_accessorq\x04NX\x04\x00\x00'
+            b'\x00dataq\x05}q\x06X\x01\x00\x00\x00aq\x07K\x01sX\t\x00\x00\x00'
+            b'_previousq\x08]q\tub.'
+        )
+        config = pickle.loads(data)
+        compare(config.data, expected={'a': 1})
+        compare(config.node('a').data, expected=1)
+        config.track_origins('x')
+        compare(config.node('a').origin, expected='x')
+
     def test_pickle_hickest_protocol(self):
         config = Config({'foo': [1, 2]})
         data = pickle.dumps(config, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,126 @@
+import pickle
+from datetime import date
+
+from testfixtures import compare, ShouldRaise
+
+from configurator import Config, source
+from configurator.frozen import freeze, view, thaw, FrozenDict, FrozenList
+from configurator.node import ConfigNode
+
+sample = {
+    'str': 'value',
+    'int': -42,
+    'big': 2**70,
+    'float': 1.5,
+    'bool': [True, False],
+    'none': None,
+    'date': date(2001, 12, 14),
+    'dict': {'b': 1, 'a': 2, 'c': {'nested': ['x', 'y']}},
+    'list': [{'name': 'one'}, {'name': 'two'}],
+    'empty': {},
+    'unicode': {u'\xa3': u'€'},
+}
+
+
+class TestFrozen:
+
+    def test_round_trip(self):
+        compare(thaw(view(freeze(sample))), expected=sample)
+
+    def test_scalar(self):
+        compare(view(freeze(1)), expected=1)
+
+    def test_types(self):
+        data = view(freeze(sample))
+        assert type(data) is FrozenDict
+        assert type(data['list']) is FrozenList
+        assert type(thaw(data)['list']) is list
+
+    def test_dict(self):
+        data = view(freeze(sample))['dict']
+        compare(data['a'], expected=2)
+        compare(list(data), expected=['b', 'a', 'c'])
+        compare(list(data.keys()), expected=['b', 'a', 'c'])
+        compare(list(data.values())[:2], expected=[1, 2])
+        compare(len(data), expected=3)
+        assert 'c' in data
+        assert 'd' not in data
+        compare(data.get('d', 'default'), expected='default')
+        with ShouldRaise(KeyError('d')):
+            data['d']
+        with ShouldRaise(KeyError(1)):
+            data[1]
+
+    def test_dict_non_string_keys(self):
+        data = view(freeze({1: 'a', 'b': 2, None: 3}))
+        compare(data[1], expected='a')
+        compare(data['b'], expected=2)
+        compare(data[None], expected=3)
+        with ShouldRaise(KeyError(2)):
+            data[2]
+
+    def test_dict_equality(self):
+        data = view(freeze(sample))
+        assert data['dict'] == sample['dict']
+        assert data['dict'] != {'b': 1}
+        assert data['dict'] == view(freeze(sample['dict']))
+
+    def test_list(self):
+        data = view(freeze(['a', 'b', 'c']))
+        compare(data[0], expected='a')
+        compare(data[-1], expected='c')
+        compare(data[1:], expected=['b', 'c'])
+        compare(len(data), expected=3)
+        assert 'b' in data
+        compare(data.index('c'), expected=2)
+        assert data == ['a', 'b', 'c']
+        assert data != ['a']
+        with ShouldRaise(IndexError('list index out of range')):
+            data[3]
+
+    def test_strings_shared(self):
+        compare(len(freeze(['long string value']*100)) < 1000, expected=True)
+
+    def test_read_only(self):
+        data = view(freeze({'x': 1}))
+        with ShouldRaise(TypeError):
+            data['x'] = 2
+
+    def test_pickle(self):
+        data = view(freeze(sample))
+        compare(pickle.loads(pickle.dumps(data)), expected=sample)
+
+    def test_not_frozen(self):
+        with ShouldRaise(ValueError('not frozen configuration data')):
+            view(b'\0'*20)
+
+
+class TestFrozenConfig:
+
+    def test_access(self):
+        config = Config(view(freeze(sample)))
+        compare(config.str, expected='value')
+        compare(config['dict']['c'].nested[1], expected='y')
+        compare(config.list[0].name, expected='one')
+        compare([item.name for item in config.list], expected=['one', 'two'])
+        compare(config.node('dict.c.nested').data, expected=['x', 'y'])
+        compare(config.node(source['list'][1]['name']).data, expected='two')
+        compare(config.get('missing', 'default'), expected='default')
+        assert isinstance(config.dict, ConfigNode)
+
+    def test_items(self):
+        config = Config(view(freeze({'a': {'b': 1}})))
+        (key, value), = config.items()
+        compare(key, expected='a')
+        compare(value.b, expected=1)
+
+    def test_write(self):
+        config = Config(view(freeze({'a': 1})))
+        with ShouldRaise(TypeError):
+            config['a'] = 2
+
+    def test_thawed_copy(self):
+        frozen = Config(view(freeze({'a': {'b': 1}})))
+        config = Config(thaw(frozen.data))
+        config.merge({'a': {'c': 2}})
+        compare(config.data, expected={'a': {'b': 1, 'c': 2}})
@@ -1,9 +1,14 @@
 from argparse import Namespace
+from copy import deepcopy
 from testfixtures import compare, ShouldRaise
 
-from configurator.mapping import source, load, convert, store, target, required, if_supplied, value
+from configurator import Config
+from configurator.mapping import (
+    source, load, convert, store, target, required, if_supplied, value, compile_mapping,
+    compile_path,
+)
 from configurator.merge import MergeContext
-from configurator.path import NotPresent
+from configurator.path import NotPresent, parse_text
 
 
 class TestSource:
@@ -320,6 +325,14 @@ class TestTarget:
         store(data, target['x'].merge(), {'z': 1}, MergeContext())
         compare(data, expected={'x': {'y': 2, 'z': 1}})
 
+    def test_merge_into_empty_does_not_share_source(self):
+        src = {'x': {'a': 1}}
+        config = Config()
+        config.merge(src, {source['x']: target['y'].merge()})
+        config.merge({'z': 2}, {source['z']: 'y.b'})
+        compare(config.data, expected={'y': {'a': 1, 'b': 2}})
+        compare(src, expected={'x': {'a': 1}})
+
     def test_merge_not_present(self):
         data = {'x': {'y': 2}}
         store(data, target['x'].merge(), NotPresent('foo'), MergeContext())
@@ -329,3 +342,512 @@ class TestTarget:
         data = {}
         with ShouldRaise(TypeError('merge() must be final operation')):
             store(data, target.merge().x, 'y', MergeContext())
+
+
+class TestCompileMapping:
+
+    def test_apply(self):
+        mapping = compile_mapping({
+            'a.b': 'x',
+            convert(source['c'], int): target['y']['z'],
+            if_supplied('d'): 'w',
+            value(1): target['l'].append(),
+        })
+        data = mapping.apply({'a': {'b': 1}, 'c': '2', 'd': ''}, {'l': []})
+        compare(data, expected={'x': 1, 'y': {'z': 2}, 'l': [1]})
+        data = mapping.apply({'a': {'b': 3}, 'c': '4', 'd': 'e'}, {'l': [0]})
+        compare(data, expected={'x': 3, 'y': {'z': 4}, 'w': 'e', 'l': [0, 1]})
+
+    def test_order_preserved(self):
+        mapping = compile_mapping({
+            value(1): target.insert(0),
+            value(2): target.insert(0),
+        })
+        compare(mapping.apply(None, []), expected=[2, 1])
+
+    def test_pairs(self):
+        mapping = compile_mapping([(source['x'], 'a'), (source['x'], 'b')])
+        compare(mapping.apply({'x': 1}, {}), expected={'a': 1, 'b': 1})
+
+    def test_pairs_not_compiled(self):
+        config = Config()
+        config.merge({'x': 1}, [(source['x'], 'a'), (source['x'], 'b')])
+        compare(config.data, expected={'a': 1, 'b': 1})
+
+    def test_entries(self):
+        mapping = compile_mapping({'a.b': target['x']})
+        compare(len(mapping), expected=1)
+        (source_path, target_path), = mapping.entries
+        compare(str(source_path), expected='a.b')
+        compare(str(target_path), expected="target['x']")
+
+    def test_repr(self):
+        compare(repr(compile_mapping({'a': target['x'], source.b: 'y'})),
+                expected="<CompiledMapping a: target['x'], source.b: y>")
+
+    def test_already_compiled(self):
+        mapping = compile_mapping({'a': 'b'})
+        assert compile_mapping(mapping) is mapping
+
+    def test_merge(self):
+        mapping = compile_mapping({source: target.merge()})
+        data = mapping.apply({'y': 2}, {'x': 1}, MergeContext())
+        compare(data, expected={'x': 1, 'y': 2})
+
+    def test_required(self):
+        mapping = compile_mapping({required('a'): 'b'})
+        with ShouldRaise(NotPresent('a')):
+            mapping.apply({}, {})
+
+    def test_source_insert(self):
+        with ShouldRaise(TypeError('Cannot use insert() in source')):
+            compile_mapping({source.x.insert(0): 'y'})
+
+    def test_source_append(self):
+        with ShouldRaise(TypeError('Cannot use append() in source')):
+            compile_mapping({source.append(): 'y'})
+
+    def test_source_merge(self):
+        with ShouldRaise(TypeError('Cannot use merge() in source')):
+            compile_mapping({source.merge(): 'y'})
+
+    def test_target_root(self):
+        with ShouldRaise(TypeError('Cannot store at root')):
+            compile_mapping({'x': target})
+
+    def test_target_convert(self):
+        with ShouldRaise(TypeError('Cannot use convert() as target')):
+            compile_mapping({'x': convert(target, int)})
+
+    def test_target_ensure_on_required(self):
+        with ShouldRaise(TypeError('Cannot use required() as target')):
+            compile_mapping({'x': required(target).x})
+
+    def test_target_value(self):
+        with ShouldRaise(TypeError('Cannot use value() as target')):
+            compile_mapping({'x': value(1)})
+
+    def test_target_merge_not_final(self):
+        with ShouldRaise(TypeError('merge() must be final operation')):
+            compile_mapping({'x': target.merge().x})
+
+    def test_checked_before_applied(self):
+        config = Config({'a': 1})
+        with ShouldRaise(TypeError('Cannot store at root')):
+            config.merge({'x': 2}, {'x': 'a', 'y': target})
+        compare(config.data, expected={'a': 1})
+
+    def test_config_merge(self):
+        mapping = compile_mapping({'x': 'a.b', 'y': target['c'].merge()})
+        config = Config({'c': {'d': 1}})
+        config.merge({'x': 1, 'y': {'e': 2}}, mapping)
+        config.merge({'x': 2}, mapping=mapping)
+        compare(config.data, expected={'a': {'b': 2}, 'c': {'d': 1, 'e': 2}})
+
+
+def interpreted(mapping, source_data, data, context=None):
+    for source_path, target_path in mapping.items():
+        data = store(data, target_path, load(source_data, source_path), context)
+    return data
+
+
+class CountingDict(dict):
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.lookups = []
+
+    def __getitem__(self, key):
+        self.lookups.append(key)
+        return super().__getitem__(key)
+
+
+class TestCompiledMappingSharing:
+
+    def check(self, mapping, source_data, data, context=None):
+        expected = interpreted(mapping, source_data, deepcopy(data), context)
+        actual = compile_mapping(mapping).apply(source_data, deepcopy(data), context)
+        compare(actual, expected=expected)
+        return actual
+
+    def test_shared_source_prefix(self):
+        services = CountingDict(api=CountingDict(host='h', port=1, path='/'))
+        source_data = CountingDict(services=services)
+        mapping = {
+            'services.api.host': 'api.host',
+            'services.api.port': 'api.port',
+            source['services']['api']['path']: 'api.path',
+            'services.api.missing': 'api.missing',
+            'services.other.x': 'other.x',
+        }
+        data = compile_mapping(mapping).apply(source_data, {})
+        compare(data, expected={'api': {'host': 'h', 'port': 1, 'path': '/'}, 'other': {}})
+        # item access is only shared with other item access:
+        compare(source_data.lookups, expected=['services', 'services'])
+        compare(services.lookups, expected=['api', 'api', 'other'])
+        compare(services['api'].lookups, expected=['host', 'port', 'path', 'missing'])
+
+    def test_shared_target_prefix(self):
+        data = CountingDict(a=CountingDict())
+        mapping = compile_mapping({'x': 'a.b.x', 'y': 'a.b.y', 'z': target['a']['b']['z']})
+        mapping.apply({'x': 1, 'y': 2, 'z': 3}, data)
+        compare(data, expected={'a': {'b': {'x': 1, 'y': 2, 'z': 3}}})
+        compare(data.lookups, expected=['a'])
+        compare(data['a'].lookups, expected=['b'])
+
+    def test_item_and_text_target_share(self):
+        self.check({'x': 'a.b', 'y': target['a']['c']}, {'x': 1, 'y': 2}, {})
+
+    def test_convert_per_entry(self):
+        calls = []
+        def record(value):
+            calls.append(value)
+            return value
+        mapping = {convert('a', record): 'x', convert(source['a'], record): 'y'}
+        self.check(mapping, {'a': 1}, {})
+        compare(calls, expected=[1, 1, 1, 1])
+
+    def test_not_present_prefix(self):
+        self.check({'a.b.c': 'x', 'a.b.d': 'y', convert('a.b', str): 'z'}, {}, {})
+
+    def test_source_attr(self):
+        self.check({source.x.y: 'a', source.x.z: 'b'},
+                   Namespace(x=Namespace(y=1, z=2)), {})
+
+    def test_replaced_then_ensured(self):
+        self.check({'x': 'a.b', 'y': 'a', 'z': 'a.c'},
+                   {'x': 1, 'y': {'new': 1}, 'z': 3}, {})
+
+    def test_replaced_by_item_then_text(self):
+        self.check({'x': 'a.b.c', 'y': target['a']['b'], 'z': 'a.b.d'},
+                   {'x': 1, 'y': {'new': 1}, 'z': 3}, {})
+
+    def test_replaced_by_scalar(self):
+        mapping = {'x': 'a.b', 'y': 'a', 'z': 'a.c'}
+        with ShouldRaise(AttributeError):
+            compile_mapping(mapping).apply({'x': 1, 'y': 2, 'z': 3}, {})
+        with ShouldRaise(AttributeError):
+            interpreted(mapping, {'x': 1, 'y': 2, 'z': 3}, {})
+
+    def test_not_present_does_not_replace(self):
+        self.check({'x': 'a.b', 'missing': 'a', 'z': 'a.c'}, {'x': 1, 'z': 3}, {})
+
+    def test_insert(self):
+        self.check({
+            'x': target['l'][0]['x'],
+            'y': target['l'].insert(0),
+            'z': target['l'][0]['z'],
+        }, {'x': 1, 'y': {}, 'z': 3}, {'l': [{}]})
+
+    def test_append(self):
+        self.check({
+            'x': target['l'][-1]['x'],
+            'y': target['l'].append(),
+            'z': target['l'][-1]['z'],
+        }, {'x': 1, 'y': {}, 'z': 3}, {'l': [{}]})
+
+    def test_merge(self):
+        self.check({
+            'x': 'a.b',
+            'y': target['a'].merge(),
+            'z': 'a.c',
+        }, {'x': 1, 'y': {'d': 2}, 'z': 3}, {}, MergeContext())
+
+    def test_merge_root(self):
+        self.check({
+            'x': 'a.b',
+            'y': target.merge(),
+            'z': 'a.c',
+        }, {'x': 1, 'y': {'a': {'d': 2}}, 'z': 3}, {}, MergeContext())
+
+    def test_attr_target(self):
+        data = Namespace(a=Namespace())
+        mapping = compile_mapping({'x': target.a.x, 'y': 'a.y', 'z': target.a.z})
+        mapping.apply({'x': 1, 'y': 2, 'z': 3}, data)
+        compare(data, expected=Namespace(a=Namespace(x=1, y=2, z=3)))
+
+    def test_attr_replaces_text(self):
+        data = Namespace(a=Namespace(b=Namespace()))
+        mapping = compile_mapping({'x': 'a.b.x', 'y': target.a.b, 'z': 'a.b.z'})
+        mapping.apply({'x': 1, 'y': Namespace(), 'z': 3}, data)
+        compare(data, expected=Namespace(a=Namespace(b=Namespace(z=3))))
+
+    def test_required_part_way(self):
+        data = {}
+        mapping = compile_mapping({'x': 'a.x', required('missing'): 'a.y', 'z': 'a.z'})
+        with ShouldRaise(NotPresent('missing')):
+            mapping.apply({'x': 1, 'z': 3}, data)
+        compare(data, expected={'a': {'x': 1}})
+
+    def test_reused(self):
+        mapping = compile_mapping({'a.b': 'x.y', 'a.c': 'x.z'})
+        compare(mapping.apply({'a': {'b': 1, 'c': 2}}, {}),
+                expected={'x': {'y': 1, 'z': 2}})
+        compare(mapping.apply({'a': {'b': 3}}, {'x': {'z': 0}}),
+                expected={'x': {'y': 3, 'z': 0}})
+
+
+class TestWildcards:
+
+    def test_load_list(self):
+        data = {'servers': [{'port': 1}, {'host': 'x'}, {'port': 2}]}
+        compare(load(data, 'servers.*.port'), expected=[1, 2])
+
+    def test_load_dict(self):
+        data = {'a': {'x': {'b': 1}, 'y': {'b': 2}, 'z': {}}}
+        compare(load(data, 'a.*.b'), expected={'x': 1, 'y': 2})
+
+    def test_load_generative(self):
+        data = {'a': [{'b': 1}, {'b': 2}]}
+        compare(load(data, source['a'].each()['b']), expected=[1, 2])
+
+    def test_load_nested(self):
+        compare(load({'a': [[1, 2], [3]]}, 'a.*.*'), expected=[[1, 2], [3]])
+
+    def test_load_not_present(self):
+        compare(load({}, 'a.*.b'), expected=NotPresent('a'))
+
+    def test_load_not_a_container(self):
+        compare(load({'a': 1}, 'a.*'), expected=NotPresent('*'))
+
+    def test_escaped_star(self):
+        data = {'a': {'*': 1, 'b': 2}}
+        compare(load(data, 'a.\\*'), expected=1)
+        data = {}
+        store(data, 'a.\\*', 1)
+        compare(data, expected={'a': {'*': 1}})
+
+    def test_convert_each(self):
+        calls = []
+        def to_int(value):
+            calls.append(value)
+            return int(value)
+        data = {'servers': [{'port': '1'}, {}, {'port': '2'}]}
+        compare(load(data, convert('servers.*.port', to_int)), expected=[1, 2])
+        compare(calls, expected=['1', '2'])
+
+    def test_required_each(self):
+        with ShouldRaise(NotPresent('port')):
+            load({'servers': [{'port': 1}, {}]}, required('servers.*.port'))
+
+    def test_if_supplied_each(self):
+        data = {'servers': [{'port': ''}, {'port': 1}]}
+        compare(load(data, if_supplied('servers.*.port')), expected=[1])
+
+    def test_store_broadcast(self):
+        data = {'servers': [{'port': 1}, {'port': 2}]}
+        compare(store(data, 'servers.*.enabled', True), expected={'servers': [
+            {'port': 1, 'enabled': True}, {'port': 2, 'enabled': True},
+        ]})
+
+    def test_store_final_wildcard(self):
+        compare(store({'a': {'x': 1, 'y': 2}}, 'a.*', 0), expected={'a': {'x': 0, 'y': 0}})
+
+    def test_store_not_a_container(self):
+        with ShouldRaise(TypeError('Cannot use each() on 1')):
+            store({'a': 1}, 'a.*.b', 2)
+
+    def test_store_not_present(self):
+        compare(store({'a': [{}]}, 'a.*.b', NotPresent('x')), expected={'a': [{}]})
+
+    def test_store_each_merge(self):
+        data = {'a': [{'x': 1}, {'y': 2}]}
+        compare(store(data, target['a'].each().merge(), {'z': 3}, MergeContext()),
+                expected={'a': [{'x': 1, 'z': 3}, {'y': 2, 'z': 3}]})
+
+    def test_map_in_place(self):
+        config = Config({'servers': [{'port': '1'}, {'host': 'x'}, {'port': '2'}]})
+        config.merge(config.data, {convert('servers.*.port', int): 'servers.*.port'})
+        compare(config.data, expected={'servers': [
+            {'port': 1}, {'host': 'x'}, {'port': 2},
+        ]})
+
+    def test_map_dict_to_new_location(self):
+        config = Config()
+        config.merge({'a': {'x': {'b': 1}, 'y': {'b': 2}}}, {'a.*.b': 'c.*.d'})
+        compare(config.data, expected={'c': {'x': {'d': 1}, 'y': {'d': 2}}})
+
+    def test_map_to_single_target(self):
+        config = Config()
+        config.merge({'servers': [{'host': 'a'}, {'host': 'b'}]}, {'servers.*.host': 'hosts'})
+        compare(config.data, expected={'hosts': ['a', 'b']})
+
+    def test_map_fewer_target_wildcards(self):
+        config = Config({'a': [{}, {}]})
+        config.merge({'b': [[1, 2], [3]]}, {'b.*.*': 'a.*.c'})
+        compare(config.data, expected={'a': [{'c': [1, 2]}, {'c': [3]}]})
+
+    def test_compiled(self):
+        mapping = compile_mapping({
+            'servers.*.port': 'ports',
+            'servers.*.host': 'servers.*.name',
+            'name': 'servers.*.group',
+        })
+        for _ in range(2):
+            data = {'servers': [{'host': 'a', 'port': 1}, {'host': 'b'}]}
+            compare(mapping.apply(data, deepcopy(data)), expected={
+                'ports': [1],
+                'servers': [{'host': 'a', 'port': 1, 'name': 'a'},
+                            {'host': 'b', 'name': 'b'}],
+            })
+
+    def test_in_text(self):
+        compare(str(parse_text('a.*.b')), expected='a.*.b')
+        compare(str(source['a'].each().b), expected="source['a'].*.b")
+
+
+    def test_store_into_shorter_list(self):
+        config = Config({'b': [{'y': 0}, {'y': 0}]})
+        config.merge({'a': [{'x': 1}, {'x': 2}, {'x': 3}]}, {'a.*.x': 'b.*.y'})
+        compare(config.data, expected={'b': [{'y': 1}, {'y': 2}, {'y': 3}]})
+
+    def test_store_into_shorter_list_final(self):
+        config = Config({'b': [0]})
+        config.merge({'a': [1, 2, 3]}, {'a.*': 'b.*'})
+        compare(config.data, expected={'b': [1, 2, 3]})
+
+    def test_store_dict_matches_in_list(self):
+        config = Config({'b': [{}]})
+        with ShouldRaise(TypeError('Cannot store values found in a dictionary in a list')):
+            config.merge({'a': {'k': {'x': 1}}}, {'a.*.x': 'b.*.y'})
+
+    def test_store_list_matches_in_missing_target(self):
+        config = Config()
+        config.merge({'a': [{'x': 1}, {'x': 2}]}, {'a.*.x': 'b.*.y', 'a.*': 'c.d.*'})
+        compare(config.data, expected={
+            'b': [{'y': 1}, {'y': 2}],
+            'c': {'d': [{'x': 1}, {'x': 2}]},
+        })
+
+    def test_store_list_matches_with_gaps_in_missing_target(self):
+        config = Config()
+        config.merge({'a': [{'x': 1}, {}, {'x': 3}]}, {'a.*.x': 'b.*'})
+        compare(config.data, expected={'b': [1, None, 3]})
+
+    def test_store_list_matches_with_gaps_in_existing_target(self):
+        config = Config({'b': [0, 0, 0]})
+        config.merge({'a': [{'x': 1}, {}, {'x': 3}]}, {'a.*.x': 'b.*'})
+        compare(config.data, expected={'b': [1, 0, 3]})
+
+    def test_store_list_matches_with_gaps_in_shorter_target(self):
+        config = Config({'b': [{'y': 0}]})
+        config.merge({'a': [{'x': 1}, {}, {'x': 3}]}, {'a.*.x': 'b.*.y'})
+        compare(config.data, expected={'b': [{'y': 1}, None, {'y': 3}]})
+
+class Attrs:
+    pass
+
+
+class TestCompilePath:
+
+    def check(self, path, data):
+        expected = load(data, path)
+        actual = compile_path(path)(data)
+        compare(actual, expected=expected, strict=True)
+        return actual
+
+    def check_raises(self, path, data):
+        try:
+            load(data, path)
+        except Exception as e:
+            expected = e
+        else:  # pragma: no cover
+            raise AssertionError('load did not raise')
+        with ShouldRaise(expected):
+            compile_path(path)(data)
+
+    def test_text(self):
+        compare(self.check('a.b', {'a': {'b': 1}}), expected=1)
+
+    def test_text_missing(self):
+        compare(self.check('a.b.c', {'a': {}}), expected=NotPresent('b'))
+
+    def test_text_attribute(self):
+        compare(self.check('a.b', {'a': Namespace(b=2)}), expected=2)
+
+    def test_text_attribute_missing(self):
+        self.check('a.b', {'a': Namespace()})
+
+    def test_text_dict_subclass(self):
+        class Defaulting(dict):
+            def __missing__(self, key):
+                return key.upper()
+        compare(self.check('a', Defaulting()), expected='A')
+
+    def test_text_list(self):
+        self.check_raises('a', [1])
+
+    def test_item(self):
+        compare(self.check(source['a'][1], {'a': [1, 2]}), expected=2)
+
+    def test_item_missing(self):
+        self.check(source['a'][2], {'a': [1, 2]})
+        self.check(source['b'][2], {'a': [1, 2]})
+
+    def test_attr(self):
+        compare(self.check(source.a.b, Namespace(a=Namespace(b=3))), expected=3)
+
+    def test_attr_missing(self):
+        self.check(source.a.b, Namespace(a=Attrs()))
+
+    def test_root(self):
+        data = {}
+        assert compile_path(source)(data) is data
+
+    def test_convert(self):
+        compare(self.check(convert('a', int), {'a': '1'}), expected=1)
+
+    def test_convert_missing(self):
+        calls = []
+        compile_path(convert('a', calls.append))({})
+        compare(calls, expected=[])
+
+    def test_convert_then_more(self):
+        self.check(convert('a', lambda x: {'b': x}).b, {'a': 1})
+
+    def test_required(self):
+        self.check(required('a'), {'a': None})
+
+    def test_required_missing(self):
+        self.check_raises(required('a.b'), {'a': {}})
+
+    def test_required_later(self):
+        self.check_raises(required(convert(source['a'], int)), {})
+
+    def test_if_supplied(self):
+        compare(self.check(if_supplied('a'), {'a': ''}), expected=NotPresent(''))
+        compare(self.check(if_supplied('a'), {'a': 0}), expected=0)
+
+    def test_if_supplied_missing(self):
+        self.check(if_supplied('a'), {})
+
+    def test_required_if_supplied(self):
+        self.check_raises(required(if_supplied('a')), {'a': None})
+
+    def test_value(self):
+        compare(self.check(value(42), None), expected=42)
+
+    def test_value_traversed(self):
+        compare(self.check(value({'a': 1})['a'], None), expected=1)
+
+    def test_each_interpreted(self):
+        compare(self.check('a.*.b', {'a': [{'b': 1}, {}]}), expected=[1])
+
+    def test_not_source(self):
+        with ShouldRaise(TypeError('Cannot use append() in source')):
+            compile_path(source.append())
+
+    def test_compiled_mapping(self):
+        mapping = {
+            'a.b': 'x',
+            convert(source['a']['c'], int): 'y',
+            if_supplied(source.missing): 'z',
+            'e.*.f': 'w',
+        }
+        source_data = {'a': {'b': 1, 'c': '2'}, 'e': {'g': {'f': 3}}}
+        compiled = compile_mapping(mapping, generate=True)
+        compare(compiled.generate, expected=True)
+        for _ in range(2):
+            compare(compiled.apply(source_data, {}),
+                    expected=compile_mapping(mapping).apply(source_data, {}))
+
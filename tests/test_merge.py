@@ -0,0 +1,491 @@
+import pickle
+import sys
+from collections import OrderedDict
+from copy import deepcopy
+
+from testfixtures import compare, ShouldRaise
+
+from configurator import Config, default_mergers
+from configurator.merge import (
+    MergeableDict, MergeContext, merge_dict, merge_list, in_place_mergers,
+    merge_list_unique, merge_list_by_key, _merged_value, _missing,
+)
+
+
+class MyDict(dict):
+    pass
+
+
+class MyList(list):
+    pass
+
+
+class TestLookup:
+
+    def test_exact(self):
+        compare(default_mergers.lookup(dict), expected=merge_dict)
+
+    def test_subclass(self):
+        compare(default_mergers.lookup(OrderedDict), expected=merge_dict)
+        compare(default_mergers.lookup(MyList), expected=merge_list)
+
+    def test_none(self):
+        compare(default_mergers.lookup(str), expected=None)
+
+    def test_most_specific(self):
+        def special(context, source, target):
+            return source
+        mergers = default_mergers + {MyDict: special}
+        compare(mergers.lookup(MyDict), expected=special)
+        compare(mergers.lookup(dict), expected=merge_dict)
+
+    def test_cached(self):
+        mergers = MergeableDict({dict: merge_dict})
+        compare(mergers.lookup(OrderedDict), expected=merge_dict)
+        compare(mergers._cache, expected={OrderedDict: merge_dict})
+
+    def test_invalidated(self):
+        def special(context, source, target):
+            return source
+        mergers = MergeableDict({dict: merge_dict})
+        mergers.lookup(MyDict)
+        mergers[MyDict] = special
+        compare(mergers.lookup(MyDict), expected=special)
+        del mergers[MyDict]
+        compare(mergers.lookup(MyDict), expected=merge_dict)
+        mergers.update({MyDict: special})
+        compare(mergers.lookup(MyDict), expected=special)
+        mergers.pop(MyDict)
+        compare(mergers.lookup(MyDict), expected=merge_dict)
+        mergers.setdefault(MyDict, special)
+        compare(mergers.lookup(MyDict), expected=special)
+        mergers.popitem()
+        compare(mergers.lookup(MyDict), expected=merge_dict)
+        mergers |= {MyDict: special}
+        compare(mergers.lookup(MyDict), expected=special)
+        mergers.clear()
+        compare(mergers.lookup(MyDict), expected=None)
+
+    def test_add(self):
+        mergers = default_mergers + {str: merge_list}
+        assert type(mergers) is MergeableDict
+        compare(mergers.lookup(str), expected=merge_list)
+        compare(default_mergers.lookup(str), expected=None)
+
+    def test_copy(self):
+        mergers = default_mergers.copy()
+        assert type(mergers) is MergeableDict
+        compare(mergers, expected=default_mergers)
+
+    def test_pickle(self):
+        mergers = MergeableDict({dict: merge_dict})
+        mergers.lookup(MyDict)
+        mergers = pickle.loads(pickle.dumps(mergers))
+        compare(mergers.lookup(MyDict), expected=merge_dict)
+
+    def test_deepcopy(self):
+        mergers = MergeableDict({dict: merge_dict})
+        mergers.lookup(MyDict)
+        mergers = deepcopy(mergers)
+        compare(mergers.lookup(MyDict), expected=merge_dict)
+
+
+class TestMergeContext:
+
+    def test_plain_dict_mergers(self):
+        context = MergeContext({dict: merge_dict})
+        assert type(context.mergers) is MergeableDict
+        compare(context.merge({'a': 1}, {'b': 2}), expected={'a': 1, 'b': 2})
+
+    def test_subclasses(self):
+        context = MergeContext()
+        compare(context.merge(OrderedDict(a=1), {'b': 2}),
+                expected={'b': 2, 'a': 1}, strict=True)
+        # the result is a copy of the target, which is a plain dict for
+        # subclasses that don't override copy():
+        compare(context.merge({'a': 1}, MyDict(b=2)),
+                expected={'b': 2, 'a': 1}, strict=True)
+
+    def test_different_mergers(self):
+        with ShouldRaise(TypeError(
+            "Cannot merge <class 'tests.test_merge.MyList'> with <class 'dict'>"
+        )):
+            MergeContext().merge(MyList(), {})
+
+    def test_no_merger(self):
+        with ShouldRaise(TypeError("Cannot merge <class 'str'> with <class 'str'>")):
+            MergeContext().merge('a', 'b')
+
+
+class TestSubclassMerging:
+
+    def test_ordered_dict_values(self):
+        config = Config({'a': {'b': 1}})
+        config.merge({'a': OrderedDict(c=2), 'd': OrderedDict(e=3)})
+        compare(config.data, expected={'a': {'b': 1, 'c': 2}, 'd': OrderedDict(e=3)})
+
+    def test_ordered_dict_source(self):
+        config = Config({'a': 1})
+        config.merge(OrderedDict(b=2))
+        compare(config.data, expected={'a': 1, 'b': 2})
+
+    def test_list_subclass(self):
+        config = Config({'a': [1]})
+        config.merge({'a': MyList([2])})
+        compare(config.data, expected={'a': [1, 2]})
+
+    def test_merge_all_mixed(self):
+        sources = [{'a': OrderedDict(b=1)}, {'a': {'c': 2}}, {'a': MyDict(d=3)}]
+        expected = Config({'a': {'x': 0}})
+        for source in sources:
+            expected.merge(source)
+        config = Config({'a': {'x': 0}})
+        config.merge_all(*sources)
+        compare(config.data, expected=expected.data)
+        compare(config.data, expected={'a': {'x': 0, 'b': 1, 'c': 2, 'd': 3}})
+
+
+def recursive_merge_dict(context, source, target):
+    # the recursive implementation merge_dict must match
+    result = None
+    for key, source_value in source.items():
+        target_value = target.get(key, _missing)
+        value = _merged_value(context, source_value, target_value)
+        if value is target_value:
+            continue
+        if result is None:
+            result = target.copy()
+        result[key] = value
+    return target if result is None else result
+
+
+def nested(depth, leaf):
+    data = leaf
+    for i in range(depth):
+        data = {'key': data, 'other{}'.format(i % 3): i}
+    return data
+
+
+def depth_of(data):
+    depth = 0
+    while isinstance(data, dict):
+        data = data['key']
+        depth += 1
+    return depth, data
+
+
+class TestIterativeMerge:
+
+    sources = [
+        {'a': {'b': 2, 'c': [2], 'h': {}}, 'd': {'x': 1}, 'e': 'e'},
+        {'a': {'c': 3, 'h': {'i': {'j': 1}}}, 'd': {'y': [1]}, 'e': {'f': 'h'}},
+        {'a': {'c': [4], 'h': {'i': {'k': 2}}}, 'd': {'y': [2]}, 'k': [1], 'm': {}},
+        {'k': {'l': 2}, 'm': {'o': OrderedDict(p=2)}, 'a': MyDict(q={'r': 1})},
+    ]
+
+    def test_same_as_recursive(self):
+        base = {'a': {'b': 1, 'c': [1], 'h': {'i': {'j': 0}}}, 'd': 1, 'k': {'l': 1}}
+        expected_context = MergeContext(default_mergers+{dict: recursive_merge_dict})
+        expected = base
+        actual = base
+        for source in self.sources:
+            expected = expected_context.merge(source, expected)
+            actual = MergeContext().merge(source, actual)
+            compare(actual, expected=expected)
+        compare(base, expected={
+            'a': {'b': 1, 'c': [1], 'h': {'i': {'j': 0}}}, 'd': 1, 'k': {'l': 1}
+        })
+
+    def test_in_place_same_as_recursive(self):
+        base = {'a': {'b': 1, 'c': [1], 'h': {'i': {'j': 0}}}, 'd': 1, 'k': {'l': 1}}
+        expected_context = MergeContext(default_mergers+{dict: recursive_merge_dict})
+        expected = deepcopy(base)
+        actual = base
+        a = base['a']
+        for source in self.sources:
+            expected = expected_context.merge(source, expected)
+            actual = MergeContext(in_place_mergers).merge(source, actual)
+            compare(actual, expected=expected)
+        assert actual is base
+        assert actual['a'] is a
+
+    def test_unchanged_shared(self):
+        target = {'a': {'b': {'c': 1}}, 'd': {'e': 1}}
+        result = MergeContext().merge({'a': {'b': {'c': 1}}}, target)
+        assert result is target
+
+    def test_partly_changed(self):
+        target = {'a': {'b': {'c': 1}, 'f': {}}, 'd': {'e': 1}}
+        result = MergeContext().merge({'a': {'b': {'c': 2}}}, target)
+        compare(result, expected={'a': {'b': {'c': 2}, 'f': {}}, 'd': {'e': 1}})
+        compare(target, expected={'a': {'b': {'c': 1}, 'f': {}}, 'd': {'e': 1}})
+        assert result['a']['f'] is target['a']['f']
+        assert result['d'] is target['d']
+
+    def test_unconstructable_subclass(self):
+        class Needy(dict):
+            def __init__(self, needed):
+                super().__init__(needed)
+        source = {'a': Needy({'b': 1})}
+        result = MergeContext().merge(source, {})
+        assert result['a'] is source['a']
+
+    def test_very_deep(self):
+        depth = sys.getrecursionlimit() * 5
+        config = Config(nested(depth, 'old'))
+        config.merge(nested(depth, 'new'))
+        compare(depth_of(config.data), expected=(depth, 'new'))
+
+    def test_very_deep_new(self):
+        depth = sys.getrecursionlimit() * 5
+        config = Config()
+        config.merge(nested(depth, 'new'))
+        compare(depth_of(config.data), expected=(depth, 'new'))
+
+    def test_very_deep_in_place(self):
+        depth = sys.getrecursionlimit() * 5
+        config = Config(nested(depth, 'old'))
+        config.merge(nested(depth, 'new'), in_place=True)
+        compare(depth_of(config.data), expected=(depth, 'new'))
+
+    def test_very_deep_merge_all(self):
+        depth = sys.getrecursionlimit() * 5
+        config = Config(nested(depth, 'old'))
+        config.merge_all(nested(depth, 'middle'), nested(depth, 'new'))
+        compare(depth_of(config.data), expected=(depth, 'new'))
+
+    def test_very_deep_merge_all_new(self):
+        depth = sys.getrecursionlimit() * 5
+        config = Config()
+        config.merge_all(nested(depth, 'middle'), nested(depth, 'new'))
+        compare(depth_of(config.data), expected=(depth, 'new'))
+
+
+class TestChangeSet:
+
+    def test_nothing_changed(self):
+        config = Config({'a': {'b': 1}, 'c': [1]})
+        changes = config.merge({'a': {'b': 1}, 'c': []}, changes=True)
+        assert not changes
+        compare(list(changes), expected=[])
+        compare(repr(changes), expected='<ChangeSet added=[] replaced=[]>')
+
+    def test_added_and_replaced(self):
+        config = Config({'a': {'b': 1, 'c': 2}, 'l': [1], 'd': {'e': 1}})
+        changes = config.merge(
+            {'a': {'b': 2, 'c': 2, 'f': 3}, 'l': [2], 'd': 'x', 'g': {'h': {'i': 1}}},
+            changes=True,
+        )
+        compare(changes.added, expected=[('a', 'f'), ('g',)])
+        compare(changes.replaced, expected=[('a', 'b'), ('l',), ('d',)])
+        compare(list(changes), expected=['a.f', 'g', 'a.b', 'l', 'd'])
+        compare(len(changes), expected=5)
+        compare(repr(changes),
+                expected="<ChangeSet added=['a.f', 'g'] replaced=['a.b', 'l', 'd']>")
+
+    def test_contains(self):
+        config = Config({'db': {'host': 'a', 'port': 1}, 'cache': {'size': 1}})
+        changes = config.merge({'db': {'host': 'b'}, 'pool': {'size': 1}}, changes=True)
+        assert 'db' in changes
+        assert 'db.host' in changes
+        assert ('db', 'host') in changes
+        assert 'db.port' not in changes
+        assert 'cache' not in changes
+        assert 'pool.size' in changes
+        assert 'pool.size.x' in changes
+        assert '' in changes
+
+    def test_equal_values(self):
+        config = Config({'a': {'b': 'x'*10, 'c': 1000, 'd': 1}})
+        changes = config.merge(
+            {'a': {'b': ''.join(['x']*10), 'c': int('1000'), 'd': True}}, changes=True
+        )
+        compare(changes.replaced, expected=[('a', 'd')])
+        compare(config.data, expected={'a': {'b': 'x'*10, 'c': 1000, 'd': True}})
+
+    def test_non_string_keys(self):
+        config = Config({1: {2: 'a'}})
+        changes = config.merge({1: {2: 'b'}}, changes=True)
+        compare(changes.replaced, expected=[(1, 2)])
+        compare(list(changes), expected=['1.2'])
+        assert (1, 2) in changes
+
+    def test_deep(self):
+        depth = sys.getrecursionlimit() * 2
+        config = Config(nested(depth, 'old'))
+        changes = config.merge(nested(depth, 'new'), changes=True)
+        compare(changes.replaced, expected=[('key',) * depth])
+
+    def test_in_place(self):
+        config = Config({'a': {'b': 1}, 'l': [1], 'm': [1]})
+        changes = config.merge(
+            {'a': {'b': 2, 'c': {'d': 1}}, 'l': [2], 'm': []},
+            in_place=True, changes=True,
+        )
+        compare(changes.added, expected=[('a', 'c')])
+        compare(changes.replaced, expected=[('a', 'b'), ('l',)])
+        compare(config.data, expected={'a': {'b': 2, 'c': {'d': 1}}, 'l': [1, 2], 'm': [1]})
+
+    def test_root_list(self):
+        config = Config([1])
+        changes = config.merge([2], changes=True)
+        compare(changes.replaced, expected=[()])
+        compare(list(changes), expected=[''])
+
+    def test_root_list_unchanged(self):
+        config = Config([1])
+        assert not config.merge([], changes=True)
+
+    def test_root_list_in_place(self):
+        config = Config([1])
+        changes = config.merge([2], in_place=True, changes=True)
+        compare(changes.replaced, expected=[()])
+
+    def test_custom_merger(self):
+        def replace(context, source, target):
+            return source
+        config = Config({'l': [1], 'm': [2]})
+        changes = config.merge(
+            {'l': [3], 'm': config.data['m']},
+            mergers=default_mergers+{list: replace}, changes=True,
+        )
+        compare(changes.replaced, expected=[('l',)])
+
+    def test_not_requested(self):
+        config = Config({'a': 1})
+        compare(config.merge({'a': 2}), expected=None)
+
+    def test_with_mapping(self):
+        config = Config()
+        with ShouldRaise(TypeError('changes cannot be used with a mapping')):
+            config.merge({'x': 1}, mapping={'x': 'y'}, changes=True)
+
+
+class TestMergeListUnique:
+
+    mergers = default_mergers + {list: merge_list_unique}
+
+    def test_scalars(self):
+        config = Config({'l': [1, 2, 3]})
+        config.merge({'l': [3, 4, 4, 1, 5]}, mergers=self.mergers)
+        compare(config.data, expected={'l': [1, 2, 3, 4, 5]})
+
+    def test_unhashable(self):
+        config = Config({'l': [{'a': [1]}, [1, {2}]]})
+        config.merge({'l': [{'a': [1]}, [1, {2}], {'a': [2]}, [1, {2}, 3]]},
+                     mergers=self.mergers)
+        compare(config.data, expected={'l': [{'a': [1]}, [1, {2}], {'a': [2]}, [1, {2}, 3]]})
+
+    def test_not_hashable_at_all(self):
+        class Unhashable:
+            __hash__ = None
+            def __init__(self, value):
+                self.value = value
+            def __eq__(self, other):
+                return self.value == other.value
+        config = Config({'l': [Unhashable(1)]})
+        config.merge({'l': [Unhashable(1), Unhashable(2), Unhashable(2)]},
+                     mergers=self.mergers)
+        compare([item.value for item in config.data['l']], expected=[1, 2])
+
+    def test_unchanged_shared(self):
+        data = {'l': [1, 2]}
+        l = data['l']
+        config = Config(data)
+        config.merge({'l': [2, 1]}, mergers=self.mergers)
+        assert config.data['l'] is l
+
+    def test_target_not_changed(self):
+        data = {'l': [1]}
+        l = data['l']
+        config = Config(data)
+        config.merge({'l': [2]}, mergers=self.mergers)
+        compare(config.data, expected={'l': [1, 2]})
+        compare(l, expected=[1])
+
+    def test_linear(self):
+        size = 100000
+        config = Config({'l': list(range(size))})
+        config.merge({'l': list(range(size // 2, size * 2))}, mergers=self.mergers)
+        compare(config.data['l'], expected=list(range(size * 2)))
+
+
+class TestMergeListByKey:
+
+    mergers = default_mergers + {list: merge_list_by_key('name')}
+
+    def test_merge(self):
+        config = Config({'servers': [
+            {'name': 'a', 'host': 'a.example.com', 'port': 80},
+            {'name': 'b', 'host': 'b.example.com'},
+        ]})
+        config.merge({'servers': [
+            {'name': 'b', 'port': 8080},
+            {'name': 'c', 'host': 'c.example.com'},
+            {'name': 'c', 'port': 81},
+        ]}, mergers=self.mergers)
+        compare(config.data, expected={'servers': [
+            {'name': 'a', 'host': 'a.example.com', 'port': 80},
+            {'name': 'b', 'host': 'b.example.com', 'port': 8080},
+            {'name': 'c', 'host': 'c.example.com', 'port': 81},
+        ]})
+
+    def test_nested_lists(self):
+        config = Config({'routes': [{'name': 'a', 'methods': [{'name': 'GET'}]}]})
+        config.merge(
+            {'routes': [{'name': 'a', 'methods': [{'name': 'GET', 'auth': True},
+                                                 {'name': 'POST'}]}]},
+            mergers=self.mergers,
+        )
+        compare(config.data, expected={'routes': [{'name': 'a', 'methods': [
+            {'name': 'GET', 'auth': True}, {'name': 'POST'},
+        ]}]})
+
+    def test_no_key_or_not_dict(self):
+        config = Config({'l': [{'x': 1}, 1, {'name': 'a'}]})
+        config.merge({'l': [{'x': 1}, 1, {'name': 'a', 'y': 2}]}, mergers=self.mergers)
+        compare(config.data, expected={'l': [
+            {'x': 1}, 1, {'name': 'a', 'y': 2}, {'x': 1}, 1,
+        ]})
+
+    def test_unhashable_key(self):
+        config = Config({'l': [{'name': {'first': 'a'}, 'x': 1}]})
+        config.merge({'l': [{'name': {'first': 'a'}, 'y': 2}]}, mergers=self.mergers)
+        compare(config.data, expected={'l': [{'name': {'first': 'a'}, 'x': 1, 'y': 2}]})
+
+    def test_unchanged_shared(self):
+        data = {'l': [{'name': 'a', 'x': 1}]}
+        l = data['l']
+        config = Config(data)
+        config.merge({'l': [{'name': 'a', 'x': 1}]}, mergers=self.mergers)
+        assert config.data['l'] is l
+
+    def test_target_not_changed(self):
+        data = {'l': [{'name': 'a', 'x': 1}]}
+        config = Config(data)
+        config.merge({'l': [{'name': 'a', 'x': 2}, {'name': 'b'}]}, mergers=self.mergers)
+        compare(config.data, expected={'l': [{'name': 'a', 'x': 2}, {'name': 'b'}]})
+        compare(data, expected={'l': [{'name': 'a', 'x': 1}]})
+
+    def test_in_place(self):
+        data = {'l': [{'name': 'a', 'x': 1}]}
+        a = data['l'][0]
+        config = Config(data)
+        config.merge({'l': [{'name': 'a', 'x': 2}]},
+                     mergers=in_place_mergers + {list: merge_list_by_key('name')},
+                     in_place=True)
+        compare(config.data, expected={'l': [{'name': 'a', 'x': 2}]})
+        assert config.data['l'][0] is a
+
+    def test_merge_all(self):
+        sources = [{'l': [{'name': 'a', 'x': 1}]}, {'l': [{'name': 'a', 'y': 2}]}]
+        config = Config()
+        config.merge_all(*sources, mergers=self.mergers)
+        compare(config.data, expected={'l': [{'name': 'a', 'x': 1, 'y': 2}]})
+
+    def test_linear(self):
+        size = 100000
+        config = Config({'l': [{'name': i, 'x': i} for i in range(size)]})
+        config.merge({'l': [{'name': i, 'y': i} for i in range(size)]},
+                     mergers=self.mergers)
+        compare(config.data['l'][-1], expected={'name': size-1, 'x': size-1, 'y': size-1})
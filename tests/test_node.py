@@ -1,8 +1,10 @@
+from argparse import Namespace
 from textwrap import dedent
 
 from testfixtures import compare, ShouldRaise
 
-from configurator import source, convert
+from configurator import Config, source, target, convert
+from configurator.mapping import store
 from configurator.node import ConfigNode
 from configurator.path import NotPresent
 
@@ -315,3 +317,158 @@ class TestNodeActions:
     def test_node_and_get_nested(self):
         node = ConfigNode({'a': {'b': 2}})
         compare(node.node('a').get(), expected={'b': 2})
+
+
+class TestNodes:
+
+    def test_list(self):
+        node = ConfigNode({'servers': [{'port': 1}, {'host': 'x'}, {'port': 2}]})
+        compare([child.data for child in node.nodes('servers.*.port')], expected=[1, 2])
+
+    def test_dict(self):
+        node = ConfigNode({'a': {'x': {'b': 1}, 'y': {'b': 2}}})
+        compare([child.data for child in node.nodes('a.*.b')], expected=[1, 2])
+
+    def test_set(self):
+        node = ConfigNode({'servers': [{'port': '1'}, {'port': '2'}]})
+        for child in node.nodes('servers.*.port'):
+            child.set(int(child.data))
+        compare(node.data, expected={'servers': [{'port': 1}, {'port': 2}]})
+
+    def test_final_wildcard(self):
+        node = ConfigNode({'a': [1, 2]})
+        for child in node.nodes('a.*'):
+            child.set(child.data * 10)
+        compare(node.data, expected={'a': [10, 20]})
+
+    def test_nested(self):
+        node = ConfigNode([[{'a': 1}, {'a': 2}], [{'a': 3}]])
+        compare([child.data for child in node.nodes(source.each().each()['a'])],
+                expected=[1, 2, 3])
+
+    def test_no_wildcard(self):
+        node = ConfigNode({'a': {'b': 1}})
+        compare([child.data for child in node.nodes('a.b')], expected=[1])
+
+    def test_not_present(self):
+        node = ConfigNode({'a': 1})
+        compare(list(node.nodes('b.*.c')), expected=[])
+
+    def test_not_a_container(self):
+        node = ConfigNode({'a': 1})
+        compare(list(node.nodes('a.*')), expected=[])
+
+    def test_invalid_path(self):
+        node = ConfigNode({'a': [1]})
+        with ShouldRaise(TypeError("invalid path: convert(a.*, int)")):
+            list(node.nodes(convert('a.*', int)))
+
+    def test_node_with_wildcard(self):
+        node = ConfigNode({'a': [1]})
+        with ShouldRaise(TypeError('Cannot use each() where a single value is required')):
+            node.node('a.*')
+
+
+class TestSetMany:
+
+    def test_dotted(self):
+        node = ConfigNode({'a': {'x': 1}})
+        node.set_many({'a.b': 2, 'a.c.d': 3, 'a.c.e': 4, 'f': 5})
+        compare(node.data, expected={'a': {'x': 1, 'b': 2, 'c': {'d': 3, 'e': 4}}, 'f': 5})
+
+    def test_same_as_store(self):
+        values = {
+            'a.b.c': 1,
+            'a.b': {'new': 1},
+            'a.b.d': 2,
+            'a.x': 3,
+            'a': {'replaced': True},
+            'a.y.z': 4,
+            target['a']['y']['w']: 5,
+            'a.y.v': 6,
+        }
+        expected = {}
+        for path, value in values.items():
+            expected = store(expected, path, value)
+        node = ConfigNode({})
+        node.set_many(values)
+        compare(node.data, expected=expected)
+
+    def test_ensured_once(self):
+        class CountingDict(dict):
+            lookups = 0
+            def __getitem__(self, key):
+                CountingDict.lookups += 1
+                return super().__getitem__(key)
+        node = ConfigNode(CountingDict(a=CountingDict(b=CountingDict())))
+        node.set_many({'a.b.c': 1, 'a.b.d': 2, 'a.e': 3, 'a.b.f': 4})
+        compare(node.data, expected={'a': {'b': {'c': 1, 'd': 2, 'f': 4}, 'e': 3}})
+        compare(CountingDict.lookups, expected=2)
+
+    def test_replaced_by_scalar(self):
+        node = ConfigNode({})
+        with ShouldRaise(AttributeError("'int' object has no attribute 'c'")):
+            node.set_many({'a.b': 1, 'a': 2, 'a.c': 3})
+
+    def test_insert_and_append(self):
+        node = ConfigNode({'l': [{'x': 1}]})
+        node.set_many({
+            target['l'][0]['y']: 2,
+            target['l'].insert(0): {'z': 3},
+            target['l'][0]['w']: 4,
+            target['l'].append(): 5,
+        })
+        compare(node.data, expected={'l': [{'z': 3, 'w': 4}, {'x': 1, 'y': 2}, 5]})
+
+    def test_merge(self):
+        node = ConfigNode({'a': {'b': {'c': 1}}, 'l': [1]})
+        node.set_many({
+            'a.b.d': 2,
+            target['a']['b'].merge(): {'e': 3},
+            'a.b.f': 4,
+            target['l'].merge(): [2],
+        })
+        # as with mappings, the existing value is merged into the new one:
+        compare(node.data, expected={'a': {'b': {'c': 1, 'd': 2, 'e': 3, 'f': 4}},
+                                     'l': [2, 1]})
+
+    def test_mergers(self):
+        node = ConfigNode({'l': [1]})
+        node.set_many({target['l'].merge(): [2]}, mergers={list: lambda c, s, t: t})
+        compare(node.data, expected={'l': [2]})
+
+    def test_merge_root(self):
+        config = Config({'a': 1})
+        data = config.data
+        config.set_many({target.merge(): {'b': 2}, 'c': 3})
+        compare(config.data, expected={'a': 1, 'b': 2, 'c': 3})
+        assert config.data is not data
+
+    def test_merge_root_of_child(self):
+        config = Config({'a': {'b': 1}})
+        node = config.a
+        node.set_many({target.merge(): {'c': 2}, 'd': 3})
+        compare(config.data, expected={'a': {'b': 1, 'c': 2, 'd': 3}})
+        compare(node.data, expected={'b': 1, 'c': 2, 'd': 3})
+
+    def test_child(self):
+        config = Config({'servers': [{'host': 'a'}]})
+        config.node(source['servers'][0]).set_many({'port': 1, 'tls.cert': 'x'})
+        compare(config.data, expected={'servers': [{'host': 'a', 'port': 1,
+                                                    'tls': {'cert': 'x'}}]})
+
+    def test_wildcard(self):
+        node = ConfigNode({'servers': [{}, {}]})
+        node.set_many({'servers.*.port': 1, target['servers'][0]['host']: 'a'})
+        compare(node.data, expected={'servers': [{'port': 1, 'host': 'a'}, {'port': 1}]})
+
+    def test_attribute(self):
+        node = ConfigNode(Namespace(a=Namespace()))
+        node.set_many({'a.b': 1, source.a.c: 2})
+        compare(node.data, expected=Namespace(a=Namespace(b=1, c=2)))
+
+    def test_checked_first(self):
+        node = ConfigNode({})
+        with ShouldRaise(TypeError('Cannot store at root')):
+            node.set_many({'a': 1, target: 2})
+        compare(node.data, expected={})
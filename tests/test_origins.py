@@ -0,0 +1,299 @@
+import json
+import pickle
+from copy import deepcopy
+
+from testfixtures import compare, Replace
+
+from configurator import Config, source, target
+from configurator.node import ConfigNode, TrackedNode
+from configurator.origins import Origins, path_keys
+from configurator.patterns import load_with_extends
+
+
+class Mixin:
+    def extra(self):
+        return 'extra'
+
+
+class MixedConfig(Mixin, Config):
+    pass
+
+
+class TestOrigins:
+
+    def test_root(self):
+        origins = Origins('base')
+        compare(origins.lookup(()), expected='base')
+        compare(origins.lookup(('a', 'b')), expected='base')
+
+    def test_default(self):
+        compare(Origins().lookup(('a',)), expected=None)
+
+    def test_record(self):
+        origins = Origins('base')
+        origins.record(('a', 'b'), 'override')
+        compare(origins.lookup(('a', 'b')), expected='override')
+        compare(origins.lookup(('a', 'b', 'c')), expected='override')
+        compare(origins.lookup(('a',)), expected='base')
+        compare(origins.lookup(('a', 'c')), expected='base')
+
+    def test_record_replaces_subtree(self):
+        origins = Origins('base')
+        origins.record(('a', 'b'), 'one')
+        origins.record(('a',), 'two')
+        compare(origins.lookup(('a', 'b')), expected='two')
+        compare(origins.children['a'].children, expected=None)
+
+    def test_record_none(self):
+        origins = Origins('base')
+        origins.record(('a',), None)
+        compare(origins.lookup(('a',)), expected=None)
+
+    def test_graft(self):
+        other = Origins('other')
+        other.record(('x', 'y'), 'deep')
+        origins = Origins('base')
+        origins.record(('a', 'b'), 'one')
+        origins.graft(('x',), other)
+        compare(origins.lookup(('x',)), expected='other')
+        compare(origins.lookup(('x', 'y')), expected='deep')
+        compare(origins.lookup(('a', 'b')), expected='one')
+        other.record(('x', 'y'), 'changed')
+        compare(origins.lookup(('x', 'y')), expected='deep')
+
+    def test_graft_missing(self):
+        other = Origins('other')
+        origins = Origins('base')
+        origins.graft(('x', 'y'), other)
+        compare(origins.lookup(('x', 'y')), expected='other')
+        compare(origins.lookup(('x',)), expected='base')
+
+    def test_copy(self):
+        origins = Origins('base')
+        origins.record(('a', 'b'), 'one')
+        copy = origins.copy()
+        copy.record(('a', 'b'), 'two')
+        compare(origins.lookup(('a', 'b')), expected='one')
+        compare(copy.lookup(('a', 'b')), expected='two')
+        compare(copy.lookup(('a',)), expected='base')
+
+    def test_push_pop(self):
+        config = Config({'a': 1, 'b': 1})
+        config.track_origins('file1')
+        pushed = Config({'b': 2})
+        pushed.track_origins('pushed')
+        with config.push(pushed):
+            compare(config.node('a').origin, expected='file1')
+            compare(config.node('b').origin, expected='pushed')
+            config.push({'a': 3})
+            compare(config.node('a').origin, expected=None)
+            compare(config.node('b').origin, expected='pushed')
+            config.pop()
+            compare(config.node('a').origin, expected='file1')
+        compare(config.node('b').data, expected=1)
+        compare(config.node('b').origin, expected='file1')
+
+    def test_push_empty(self):
+        config = Config({'a': 1})
+        config.track_origins('file1')
+        config.push({'b': 2}, empty=True)
+        compare(config.node('b').origin, expected=None)
+        config.pop()
+        compare(config.node('a').origin, expected='file1')
+
+    def test_pickle(self):
+        origins = Origins()
+        origins.record(('a', 'b'), 'one')
+        origins = pickle.loads(pickle.dumps(origins))
+        compare(origins.lookup(('a',)), expected=None)
+        compare(origins.lookup(('a', 'b')), expected='one')
+
+    def test_path_keys(self):
+        compare(path_keys(target['a'].b[0]), expected=('a', 'b', 0))
+        compare(path_keys(target['a'].merge()), expected=('a',))
+
+
+class TestConfigOrigins:
+
+    def test_not_tracked(self):
+        config = Config({'a': {'b': 1}})
+        node = config.node('a.b')
+        assert type(node) is ConfigNode
+        assert not hasattr(node, 'origin')
+
+    def test_merge(self):
+        config = Config({'db': {'host': 'a', 'port': 1}})
+        config.track_origins('defaults')
+        config.merge({'db': {'host': 'b'}, 'x': {'y': 1}}, origin='app.yaml')
+        config.merge({'db': {'port': 1}}, origin='same.yaml')
+        node = config.node('db.host')
+        assert type(node) is TrackedNode
+        compare(node.data, expected='b')
+        compare(node.origin, expected='app.yaml')
+        compare(config.node('db.port').origin, expected='defaults')
+        compare(config.node('db').origin, expected='defaults')
+        compare(config.node('x.y').origin, expected='app.yaml')
+        compare(config.node().origin, expected='defaults')
+
+    def test_merge_tracked_config(self):
+        layer = Config({'a': {'b': 1, 'c': 2}})
+        layer.track_origins('one')
+        layer.merge({'a': {'c': 3}}, origin='two')
+        config = Config({'a': {'d': 4}})
+        config.track_origins('base')
+        config.merge(layer, origin='ignored')
+        compare(config.node('a.b').origin, expected='one')
+        compare(config.node('a.c').origin, expected='two')
+        compare(config.node('a.d').origin, expected='base')
+
+    def test_merge_untracked_config(self):
+        config = Config()
+        config.track_origins()
+        config.merge(Config({'a': 1}), origin='layer')
+        compare(config.node('a').origin, expected='layer')
+
+    def test_merge_mapping(self):
+        config = Config({'a': {'b': 1}})
+        config.track_origins('base')
+        config.merge({'x': 2, 'y': {'z': 3}}, mapping={
+            'x': 'a.b',
+            source['y']: target['c'].merge(),
+            'missing': 'd',
+        }, origin='mapped')
+        compare(config.node('a.b').origin, expected='mapped')
+        compare(config.node('c.z').origin, expected='mapped')
+        compare(config.node('a').origin, expected='base')
+
+    def test_nodes(self):
+        config = Config({'servers': {'a': {'port': 1}, 'b': {'port': 2}}})
+        config.track_origins('base')
+        config.merge({'servers': {'c': {'port': 3}}}, origin='extra')
+        nodes = list(config.nodes('servers.*.port'))
+        compare([node.data for node in nodes], expected=[1, 2, 3])
+        compare([node.origin for node in nodes], expected=['base', 'base', 'extra'])
+
+    def test_nodes_not_tracked(self):
+        config = Config({'a': [1]})
+        node, = config.nodes('a.*')
+        assert type(node) is ConfigNode
+
+    def test_merge_all(self):
+        config = Config()
+        config.track_origins()
+        config.merge_all(Config.from_text('{"a": 1}', 'json'), {'b': 2})
+        compare(config.data, expected={'a': 1, 'b': 2})
+        compare(config.node('a').origin, expected=None)
+
+    def test_in_place(self):
+        config = Config({'a': {'b': 1}, 'l': [1]})
+        config.track_origins('base')
+        config.merge({'a': {'c': 2}, 'l': [2]}, in_place=True, origin='more')
+        compare(config.node('a.b').origin, expected='base')
+        compare(config.node('a.c').origin, expected='more')
+        compare(config.node('l').origin, expected='more')
+
+    def test_clone(self):
+        config = Config({'a': 1})
+        config.track_origins('base')
+        clone = config.clone()
+        clone.merge({'a': 2}, origin='clone')
+        compare(config.node('a').origin, expected='base')
+        compare(clone.node('a').origin, expected='clone')
+
+    def test_add(self):
+        one = Config({'a': 1, 'b': 1})
+        one.track_origins('one')
+        two = Config({'b': 2})
+        two.track_origins('two')
+        result = one + two
+        compare(result.node('a').origin, expected='one')
+        compare(result.node('b').origin, expected='two')
+
+    def test_pickle(self):
+        config = Config({'a': 1})
+        config.track_origins('base')
+        config = pickle.loads(pickle.dumps(config))
+        compare(config.node('a').origin, expected='base')
+
+    def test_pickle_protocols(self):
+        config = Config({'a': 1})
+        config.track_origins('base')
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(config, protocol))
+            compare(loaded.node('a').origin, expected='base')
+
+    def test_deepcopy(self):
+        config = Config({'a': 1})
+        config.track_origins('base')
+        copied = deepcopy(config)
+        copied.merge({'a': 2}, origin='copy')
+        compare(config.node('a').origin, expected='base')
+        compare(copied.node('a').origin, expected='copy')
+
+    def test_not_tracked_access_not_wrapped(self):
+        config = Config({'a': 1})
+        assert type(config).node is ConfigNode.node
+        assert type(config).nodes is ConfigNode.nodes
+
+    def test_tracked_looks_the_same(self):
+        config = Config({'a': 1})
+        config.track_origins('base')
+        assert isinstance(config, Config)
+        compare(repr(config), expected="configurator.config.Config({'a': 1})")
+        config.track_origins('again')
+        compare(type(config)._untracked, expected=Config)
+
+    def test_tracked_subclass_with_mixin_pickles(self):
+        config = MixedConfig({'a': 1})
+        config.track_origins('base')
+        for loaded in pickle.loads(pickle.dumps(config)), deepcopy(config):
+            assert isinstance(loaded, MixedConfig)
+            compare(loaded.node('a').origin, expected='base')
+            compare(loaded.extra(), expected='extra')
+
+    def test_tracked_subclass(self):
+        class MyConfig(Config):
+            pass
+        config = MyConfig({'a': 1})
+        config.track_origins('base')
+        assert isinstance(config, MyConfig)
+        compare(config.node('a').origin, expected='base')
+
+    def test_from_path(self, dir):
+        path = dir.write('app.json', '{"a": {"b": 1}}')
+        config = Config.from_path(path, track_origins=True)
+        compare(config.node('a.b').origin, expected=path)
+
+    def test_from_path_lazy(self, dir):
+        path = dir.write('app.json', '{"a": {"b": 1}}')
+        config = Config.from_path(path, lazy=True, track_origins=True)
+        compare(config.node('a.b').origin, expected=path)
+
+    def test_from_paths(self, dir):
+        path1 = dir.write('1.json', '{"a": {"b": 1, "c": 1}}')
+        path2 = dir.write('2.json', '{"a": {"c": 2}}')
+        config = Config.from_paths([path1, path2], track_origins=True)
+        compare(config.node('a.b').origin, expected=path1)
+        compare(config.node('a.c').origin, expected=path2)
+
+    def test_from_directory(self, dir):
+        path1 = dir.write('1.json', '{"a": 1}')
+        path2 = dir.write('2.json', '{"b": 2}')
+        config = Config.from_directory(dir.path, track_origins=True)
+        compare(config.node('a').origin, expected=path1)
+        compare(config.node('b').origin, expected=path2)
+
+    def test_from_env(self):
+        with Replace('os.environ', {'APP_HOST': 'h', 'APP_PORT': '1', 'OTHER': 'x'}):
+            config = Config.from_env({'APP_': 'db'}, track_origins=True)
+        compare(config.data, expected={'db': {'host': 'h', 'port': '1'}})
+        compare(config.node('db.host').origin, expected='APP_HOST')
+        compare(config.node('db.port').origin, expected='APP_PORT')
+
+    def test_load_with_extends(self, dir):
+        base = dir.write('base.json', '{"db": {"host": "a", "port": 1}}')
+        path = dir.write('app.json', json.dumps({'db': {'host': 'b'}, 'extends': base}))
+        config = load_with_extends(path, track_origins=True)
+        compare(config.data, expected={'db': {'host': 'b', 'port': 1}})
+        compare(config.node('db.host').origin, expected=dir.getpath('app.json'))
+        compare(config.node('db.port').origin, expected=dir.getpath('base.json'))
@@ -0,0 +1,103 @@
+import json
+from io import BytesIO, StringIO
+
+import pytest
+from testfixtures import compare, ShouldRaise
+
+from configurator.parsers import Parsers, ParseError
+
+
+class TestBackendSelection:
+
+    def test_first_available(self):
+        parsers = Parsers()
+        parsers.supported = {'x': (('json', 'loads'), ('json', 'load'))}
+        assert parsers['x'] is json.loads
+        compare(parsers.backend('x'), expected='json.loads')
+
+    def test_missing_module(self):
+        parsers = Parsers()
+        parsers.supported = {'x': (('configurator._nope', 'load'), ('json', 'load'))}
+        assert parsers['x'] is json.load
+        compare(parsers.backend('x'), expected='json.load')
+
+    def test_missing_attribute(self):
+        parsers = Parsers()
+        parsers.supported = {'x': (('json', 'nope'), ('json', 'load'))}
+        compare(parsers.backend('x'), expected='json.load')
+
+    def test_none_available(self):
+        parsers = Parsers()
+        parsers.supported = {'x': (('json', 'nope'), ('configurator._nope', 'load'))}
+        with ShouldRaise(ModuleNotFoundError):
+            parsers['x']
+
+    def test_single_backend(self):
+        parsers = Parsers()
+        parsers.supported = {'x': ('json', 'load')}
+        assert parsers['x'] is json.load
+        compare(parsers.backend('x'), expected='json.load')
+
+    def test_unknown_extension(self):
+        with ShouldRaise(ParseError("No parser found for 'nope'")):
+            Parsers().backend('nope')
+
+    def test_selection_cached(self):
+        parsers = Parsers()
+        parser = parsers['json']
+        parsers.supported = {}
+        assert parsers['json'] is parser
+
+    def test_explicitly_set(self):
+        parsers = Parsers()
+        parsers['x'] = json.load
+        compare(parsers.backend('x'), expected=None)
+
+
+json_samples = [
+    b'{"x": 1, "y": [1.5, "two", null, true]}',
+    b'{"big": 123456789012345678901234567890}',
+    b'{"nan": NaN}',
+    '{"uni": "£€"}'.encode('utf-8'),
+    b'{"dupe": 1, "dupe": 2}',
+]
+
+yaml_samples = [
+    b'x: 1\ny: [1.5, two, null, true]\n',
+    b'when: 2001-12-14\n',
+    b'anchored: &a {k: v}\nref: *a\n',
+    '£: €\n'.encode('utf-8'),
+]
+
+
+def backends(extension):
+    parsers = []
+    for backend in Parsers.supported[extension]:
+        candidate = Parsers()
+        candidate.supported = {extension: (backend,)}
+        try:
+            parsers.append(candidate[extension])
+        except ImportError:
+            pass
+    return parsers
+
+
+class TestBackendsEquivalent:
+
+    @pytest.mark.parametrize('sample', json_samples)
+    def test_json(self, sample):
+        # repr so that NaN compares equal:
+        for parser in backends('json'):
+            compare(repr(parser(BytesIO(sample))), expected=repr(json.loads(sample)))
+
+    @pytest.mark.parametrize('sample', json_samples)
+    def test_json_text(self, sample):
+        text = sample.decode('utf-8')
+        for parser in backends('json'):
+            compare(repr(parser(StringIO(text))), expected=repr(json.loads(text)))
+
+    @pytest.mark.parametrize('sample', yaml_samples)
+    def test_yaml(self, sample, skip_no_yaml):
+        import yaml
+        for parser in backends('yaml'):
+            compare(parser(BytesIO(sample)), expected=yaml.safe_load(sample))
@@ -1,7 +1,15 @@
-from testfixtures import compare
+import pickle
+from copy import copy, deepcopy
 
-from configurator.mapping import source, target, required, convert, value
-from configurator.path import parse_text
+from testfixtures import compare, ShouldRaise
+
+from configurator.mapping import (
+    source, target, required, convert, value, if_supplied,
+)
+from configurator.path import (
+    Path, TextOp, parse_text, parse_cache_info, clear_parse_cache, set_parse_cache_size,
+    DEFAULT_PARSE_CACHE_SIZE
+)
 
 
 class TestPaths:
@@ -34,8 +42,135 @@ class TestPaths:
     def test_text_op(self):
         compare(str(parse_text('x.y.z')), expected='x.y.z')
 
+    def test_text_op_escaped_star(self):
+        path = parse_text('x.\\*.z')
+        compare(path, expected=Path('', TextOp('x'), TextOp('*'), TextOp('z')))
+        compare(str(path), expected='x.\\*.z')
+        compare(parse_text(str(path)), expected=path)
+
     def test_convert_no_name(self):
         o = object()
         compare(str(convert(source, o)), expected=(
             "convert(source, {!r})".format(o)
         ))
+
+
+class TestPathEquality:
+
+    def test_equal(self):
+        path = required(convert(source['foo'].y, int)).insert(0).append().merge()
+        compare(path == required(convert(source['foo'].y, int)).insert(0).append().merge(),
+                expected=True)
+
+    def test_hash(self):
+        compare(hash(source['foo'].y), expected=hash(source['foo'].y))
+        compare(hash(parse_text('x.y')), expected=hash(Path('', TextOp('x'), TextOp('y'))))
+
+    def test_different_op_types(self):
+        compare(source['x'] == source.x, expected=False)
+        compare(source['x'] != source.x, expected=True)
+
+    def test_different_names(self):
+        compare(source['x'] == target['x'], expected=False)
+
+    def test_different_parameters(self):
+        compare(if_supplied('x') == if_supplied('x', false_values=('',)), expected=False)
+
+    def test_other_types(self):
+        compare(source == 'source', expected=False)
+        compare(source != 'source', expected=True)
+
+    def test_dict_key(self):
+        mapping = {source['x']: 1, parse_text('y.z'): 2}
+        compare(mapping[source['x']], expected=1)
+        compare(mapping[parse_text('y.z')], expected=2)
+
+    def test_parsed_not_cached(self):
+        clear_parse_cache()
+        set_parse_cache_size(0)
+        try:
+            compare(parse_text('x.y') == parse_text('x.y'), expected=True)
+            compare(parse_text('x.y') is parse_text('x.y'), expected=False)
+        finally:
+            set_parse_cache_size()
+
+    def test_unhashable_value(self):
+        one = [1]
+        compare(value(one) == value(one), expected=True)
+        compare(hash(value(one)), expected=hash(value(one)))
+        # compared by identity, as a list could be changed:
+        compare(value(one) == value([1]), expected=False)
+
+    def test_unhashable_false_values(self):
+        false_values = ['']
+        compare(if_supplied('x', false_values) == if_supplied('x', false_values),
+                expected=True)
+        compare(if_supplied('x', false_values) == if_supplied('x', ['']), expected=False)
+
+    def test_immutable(self):
+        path = source['x']
+        with ShouldRaise(AttributeError('Path is immutable')):
+            path.name = 'foo'
+        with ShouldRaise(AttributeError('Path is immutable')):
+            del path.ops
+        with ShouldRaise(AttributeError('ItemOp is immutable')):
+            path.ops[0].text = 'y'
+
+    def test_slots(self):
+        path = convert(source['x'], int).merge()
+        for obj in (path,) + path.ops:
+            compare(type(obj).__dictoffset__, expected=0)
+
+    def test_copy(self):
+        path = required(convert(source['foo'].y, int)).insert(0).append()
+        assert copy(path) is path
+        assert deepcopy(path) is path
+
+    def test_pickle(self):
+        path = if_supplied(value(42)['x'].y).insert(0).append().merge()
+        compare(pickle.loads(pickle.dumps(path)), expected=path)
+
+
+class TestParseCache:
+
+    def setup_method(self):
+        clear_parse_cache()
+
+    def teardown_method(self):
+        set_parse_cache_size()
+
+    def test_hit(self):
+        path = parse_text('a.b.c')
+        assert parse_text('a.b.c') is path
+        info = parse_cache_info()
+        compare(info.hits, expected=1)
+        compare(info.misses, expected=1)
+        compare(info.currsize, expected=1)
+
+    def test_clear(self):
+        path = parse_text('a.b')
+        clear_parse_cache()
+        assert parse_text('a.b') is not path
+        compare(parse_cache_info().hits, expected=0)
+
+    def test_bounded(self):
+        set_parse_cache_size(2)
+        parse_text('a')
+        parse_text('b')
+        parse_text('c')
+        info = parse_cache_info()
+        compare(info.maxsize, expected=2)
+        compare(info.currsize, expected=2)
+
+    def test_disabled(self):
+        set_parse_cache_size(0)
+        assert parse_text('a') is not parse_text('a')
+        compare(str(parse_text('a.b')), expected='a.b')
+
+    def test_default_size(self):
+        compare(parse_cache_info().maxsize, expected=DEFAULT_PARSE_CACHE_SIZE)
+
+    def test_non_text_not_cached(self):
+        parse_text(0)
+        parse_text(source)
+        compare(parse_cache_info().currsize, expected=0)
@@ -1,9 +1,10 @@
 import json
 
-from testfixtures import compare
+from testfixtures import compare, ShouldRaise
+from testfixtures.mock import Mock
 
 from configurator import Config
-from configurator.patterns import load_with_extends
+from configurator.patterns import load_with_extends, ExtendsResolver
 
 
 class TestLoadWithExtends:
@@ -22,3 +23,56 @@ class TestLoadWithExtends:
             'f1key': 'k1value',
             'f2key': 'f2value',
         }))
+
+    def test_chain(self, dir):
+        path1 = dir.write('base.json', '{"x": 1, "y": [1]}')
+        path2 = dir.write('middle.json', json.dumps({'x': 2, 'y': [2], 'extends': path1}))
+        path3 = dir.write('leaf.json', json.dumps({'z': 3, 'y': [3], 'extends': path2}))
+        compare(load_with_extends(path3).data, expected={'x': 2, 'y': [1, 2, 3], 'z': 3})
+
+    def test_cycle(self, dir):
+        path1 = dir.getpath('one.json')
+        path2 = dir.write('two.json', json.dumps({'extends': path1}))
+        dir.write('one.json', json.dumps({'extends': path2}))
+        with ShouldRaise(ValueError(
+            'extends cycle: {} -> {} -> {}'.format(path1, path2, path1)
+        )):
+            load_with_extends(path1)
+
+    def test_extends_self(self, dir):
+        path = dir.getpath('one.json')
+        dir.write('one.json', json.dumps({'extends': path}))
+        with ShouldRaise(ValueError('extends cycle: {} -> {}'.format(path, path))):
+            load_with_extends(path)
+
+
+class TestExtendsResolver:
+
+    def test_shared_bases_parsed_once(self, dir):
+        base = dir.write('base.json', '{"x": 1, "y": [1]}')
+        leaf1 = dir.write('leaf1.json', json.dumps({'a': 1, 'y': [2], 'extends': base}))
+        leaf2 = dir.write('leaf2.json', json.dumps({'b': 2, 'extends': base}))
+        resolver = ExtendsResolver()
+        resolver._layer = layer = Mock(side_effect=resolver._layer)
+        compare(resolver.load(leaf1).data, expected={'a': 1, 'x': 1, 'y': [1, 2]})
+        compare(resolver.load(leaf2).data, expected={'b': 2, 'x': 1, 'y': [1]})
+        compare(resolver.load(leaf1).data, expected={'a': 1, 'x': 1, 'y': [1, 2]})
+        compare(layer.call_count, expected=3)
+
+    def test_results_independent(self, dir):
+        base = dir.write('base.json', '{"x": {"y": [1]}}')
+        leaf = dir.write('leaf.json', json.dumps({'extends': base}))
+        resolver = ExtendsResolver()
+        config = resolver.load(leaf)
+        config.data['x']['y'].append(2)
+        compare(resolver.load(leaf).data, expected={'x': {'y': [1]}})
+        compare(resolver.load(base).data, expected={'x': {'y': [1]}})
+
+    def test_root(self, dir):
+        base = dir.write('base.json', '{"root": {"x": 1}}')
+        leaf = dir.write('leaf.json', json.dumps({'root': {'y': 2, 'ext': base}}))
+        resolver = ExtendsResolver(key='ext', root='root')
+        compare(resolver.load(leaf).data, expected={'x': 1, 'y': 2})
+
+    def test_no_path(self):
+        compare(ExtendsResolver().load(None).data, expected={})
@@ -0,0 +1,71 @@
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from testfixtures import compare, ShouldRaise
+
+from configurator import Config
+from configurator.shared import SharedConfig, save_frozen, load_mapped
+
+pytest.importorskip('multiprocessing.shared_memory')
+
+
+@pytest.fixture()
+def shared():
+    shared = SharedConfig.create(Config({'db': {'host': 'localhost', 'ports': [1, 2]}}))
+    yield shared
+    shared.close()
+    shared.unlink()
+
+
+def read_host(shared):
+    return shared.config.db.host
+
+
+class TestSharedConfig:
+
+    def test_access(self, shared):
+        compare(shared.config.db.host, expected='localhost')
+        compare(shared.config.node('db.ports').data, expected=[1, 2])
+
+    def test_attach(self, shared):
+        with SharedConfig.attach(shared.name) as attached:
+            compare(attached.config.db.ports[1], expected=2)
+
+    def test_pickle_sends_name(self, shared):
+        data = pickle.dumps(shared)
+        assert len(data) < 200
+        with pickle.loads(data) as attached:
+            compare(attached.name, expected=shared.name)
+            compare(attached.config.db.host, expected='localhost')
+
+    def test_create_from_data(self):
+        with SharedConfig.create({'x': 1}) as shared:
+            compare(shared.config.x, expected=1)
+            shared.unlink()
+
+    def test_closed(self):
+        shared = SharedConfig.create({'x': 1})
+        shared.close()
+        shared.unlink()
+        with ShouldRaise(ValueError('{} is closed'.format(shared.name))):
+            shared.config
+
+    def test_other_process(self, shared):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            compare(executor.submit(read_host, shared).result(), expected='localhost')
+        # the segment is still available after the worker has exited:
+        with SharedConfig.attach(shared.name) as attached:
+            compare(attached.config.db.host, expected='localhost')
+
+
+class TestMapped:
+
+    def test_round_trip(self, dir):
+        path = dir.getpath('config.frozen')
+        save_frozen(Config({'x': {'y': [1, 2]}}), path)
+        config = load_mapped(path)
+        compare(config.x.y[1], expected=2)
+        compare(config.node('x.y').data, expected=[1, 2])
@@ -0,0 +1,121 @@
+import os
+import pickle
+from datetime import date
+from zlib import crc32
+
+from testfixtures import compare, ShouldRaise
+
+from configurator import Config
+from configurator.snapshot import MAGIC, SnapshotError, VERSION, _header
+
+
+class TestSnapshot:
+
+    def test_round_trip(self, dir):
+        config = Config({'x': {'y': [1, 2.5, None, True]}, 'when': date(2001, 12, 14)})
+        path = dir.getpath('config.snapshot')
+        config.save_snapshot(path)
+        compare(Config.load_snapshot(path), expected=config)
+
+    def test_list(self, dir):
+        path = dir.getpath('config.snapshot')
+        Config([1, 2]).save_snapshot(path)
+        compare(Config.load_snapshot(path).data, expected=[1, 2])
+
+    def test_sources_unchanged(self, dir):
+        source = dir.write('config.json', '{"x": 1}')
+        path = dir.getpath('config.snapshot')
+        Config.from_path(source).save_snapshot(path, sources=[source])
+        compare(Config.load_snapshot(path).data, expected={'x': 1})
+
+    def test_stale(self, dir):
+        source = dir.write('config.json', '{"x": 1}')
+        path = dir.getpath('config.snapshot')
+        Config.from_path(source).save_snapshot(path, sources=[source])
+        dir.write('config.json', '{"x": 12}')
+        with ShouldRaise(SnapshotError('{}: stale as {} has changed'.format(path, source))):
+            Config.load_snapshot(path)
+
+    def test_source_removed(self, dir):
+        source = dir.write('config.json', '{"x": 1}')
+        path = dir.getpath('config.snapshot')
+        Config.from_path(source).save_snapshot(path, sources=[source])
+        os.remove(source)
+        with ShouldRaise(SnapshotError):
+            Config.load_snapshot(path)
+
+    def test_corrupt(self, dir):
+        path = dir.getpath('config.snapshot')
+        Config({'x': 1}).save_snapshot(path)
+        with open(path, 'rb') as f:
+            content = bytearray(f.read())
+        content[-2] ^= 0xff
+        with open(path, 'wb') as f:
+            f.write(content)
+        with ShouldRaise(SnapshotError('{}: checksum mismatch'.format(path))):
+            Config.load_snapshot(path)
+
+    def test_truncated(self, dir):
+        path = dir.getpath('config.snapshot')
+        Config({'x': 1}).save_snapshot(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        with open(path, 'wb') as f:
+            f.write(content[:-1])
+        with ShouldRaise(SnapshotError('{}: checksum mismatch'.format(path))):
+            Config.load_snapshot(path)
+
+    def write_payload(self, path, payload):
+        with open(path, 'wb') as f:
+            f.write(_header.pack(MAGIC, VERSION, len(payload), crc32(payload)))
+            f.write(payload)
+
+    def test_corrupt_payload_valid_checksum(self, dir):
+        path = dir.getpath('config.snapshot')
+        self.write_payload(path, b'not a pickle')
+        with ShouldRaise(SnapshotError) as s:
+            Config.load_snapshot(path)
+        assert str(s.raised).startswith('{}: invalid payload: '.format(path))
+        assert isinstance(s.raised.__cause__, pickle.UnpicklingError)
+
+    def test_truncated_payload_valid_checksum(self, dir):
+        path = dir.getpath('config.snapshot')
+        self.write_payload(path, pickle.dumps(([], {'x': 1}))[:-3])
+        with ShouldRaise(SnapshotError):
+            Config.load_snapshot(path)
+
+    def test_unsupported_protocol_valid_checksum(self, dir):
+        path = dir.getpath('config.snapshot')
+        self.write_payload(path, b'\x80\xff' + pickle.dumps(([], {}))[2:])
+        with ShouldRaise(SnapshotError):
+            Config.load_snapshot(path)
+
+    def test_wrong_shape_valid_checksum(self, dir):
+        path = dir.getpath('config.snapshot')
+        self.write_payload(path, pickle.dumps({'x': 1}))
+        with ShouldRaise(SnapshotError):
+            Config.load_snapshot(path)
+
+    def test_truncated_header(self, dir):
+        path = dir.write('config.snapshot', 'CFG')
+        with ShouldRaise(SnapshotError('{}: truncated header'.format(path))):
+            Config.load_snapshot(path)
+
+    def test_not_snapshot(self, dir):
+        path = dir.write('config.snapshot', '{"x": 1}' * 10)
+        with ShouldRaise(SnapshotError('{}: not a snapshot'.format(path))):
+            Config.load_snapshot(path)
+
+    def test_wrong_version(self, dir):
+        path = dir.getpath('config.snapshot')
+        Config({'x': 1}).save_snapshot(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        magic, version, length, checksum = _header.unpack_from(content)
+        with open(path, 'wb') as f:
+            f.write(_header.pack(magic, version+1, length, checksum))
+            f.write(content[_header.size:])
+        with ShouldRaise(SnapshotError('{}: version {} is not {}'.format(
+                path, VERSION+1, VERSION
+        ))):
+            Config.load_snapshot(path)